@@ -6,13 +6,13 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
 import logging
 
 from ..users.models import User
-from ..bookings.models import Booking, BookingStatus
+from ..bookings.models import Booking, BookingStatus, BookingSummary
 from ..listings.models import ParkingListing
 from ..disputes.models import Dispute
 
@@ -189,21 +189,17 @@ def dashboard_stats(request):
             in_review_disputes = 0
             closed_disputes = 0
         
-        # Revenue statistics (simplified) - Using proper enum constants
+        # Revenue statistics - total from the precomputed guest summaries,
+        # the last month as a single aggregate
         try:
             from decimal import Decimal
-            total_revenue = sum(
-                booking.total_amount for booking in 
-                Booking.objects.filter(status=BookingStatus.COMPLETED) 
-                if booking.total_amount
-            )
-            monthly_revenue = sum(
-                booking.total_amount for booking in 
-                Booking.objects.filter(
-                    status=BookingStatus.COMPLETED,
-                    created_at__gte=one_month_ago
-                ) if booking.total_amount
-            )
+            total_revenue = BookingSummary.objects.filter(
+                role=BookingSummary.Role.GUEST
+            ).aggregate(total=Sum('completed_amount'))['total'] or Decimal('0.00')
+            monthly_revenue = Booking.objects.filter(
+                status=BookingStatus.COMPLETED,
+                created_at__gte=one_month_ago
+            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
         except:
             total_revenue = Decimal('0.00')
             monthly_revenue = Decimal('0.00')
@@ -3,7 +3,8 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.shortcuts import redirect
 from django.http import HttpResponseRedirect
-from .models import Booking, BookingReview
+from .models import Booking, BookingHold, BookingReview
+from .search import filter_bookings
 
 
 @admin.register(Booking)
@@ -13,8 +14,8 @@ class BookingAdmin(admin.ModelAdmin):
         'start_time', 'end_time', 'total_amount', 'view_booking_detail', 'created_at'
     ]
     list_filter = ['status', 'created_at', 'start_time']
-    search_fields = ['booking_id', 'user__email', 'user__first_name', 'user__last_name', 
-                    'parking_space__title', 'vehicle_license_plate']
+    # Searched through the token index, see get_search_results
+    search_fields = ['booking_id', 'vehicle_license_plate', 'user__email', 'user__first_name', 'user__last_name']
     readonly_fields = ['booking_id', 'duration_hours', 'total_amount', 'platform_fee', 
                       'created_at', 'updated_at', 'actual_start_time', 'actual_end_time', 'view_booking_detail_link']
     date_hierarchy = 'created_at'
@@ -79,25 +80,22 @@ class BookingAdmin(admin.ModelAdmin):
     view_booking_details_action.short_description = 'View booking detail page'
     
     def get_search_results(self, request, queryset, search_term):
-        """Enhanced search to handle reservation number format"""
-        queryset, use_distinct = super().get_search_results(request, queryset, search_term)
-        
-        # If search term looks like a reservation number (e.g., BK679E4363 or #BK679E4363)
-        if search_term:
-            # Remove # if present and normalize
-            clean_term = search_term.replace('#', '').replace('Reservation', '').strip()
-            
-            # Search for exact booking_id match
-            if clean_term:
-                exact_match = self.model.objects.filter(booking_id__iexact=clean_term)
-                if exact_match.exists():
-                    queryset = exact_match
-                    use_distinct = True
-        
-        return queryset, use_distinct
+        """Search the booking token index (booking ID, plate, guest email/name)"""
+        return filter_bookings(queryset, search_term), False
 
 
 
+@admin.register(BookingHold)
+class BookingHoldAdmin(admin.ModelAdmin):
+    list_display = [
+        'hold_id', 'user', 'parking_space', 'start_time', 'end_time', 'expires_at', 'booking'
+    ]
+    list_filter = ['expires_at']
+    search_fields = ['hold_id', 'user__email', 'parking_space__title', 'stripe_payment_intent_id']
+    readonly_fields = ['hold_id', 'booking', 'created_at']
+    raw_id_fields = ['user', 'parking_space']
+
+
 @admin.register(BookingReview)
 class BookingReviewAdmin(admin.ModelAdmin):
     list_display = [
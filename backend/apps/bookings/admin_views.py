@@ -3,11 +3,11 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.urls import reverse
-from django.db.models import Q
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from .models import Booking
+from .search import find_by_booking_id, search_bookings
 
 
 @staff_member_required
@@ -28,26 +28,18 @@ def booking_search_view(request):
         context['search_performed'] = True
         
         if search_term:
-            # Clean the search term - remove common prefixes
-            clean_term = search_term.replace('#', '').replace('Reservation', '').replace('reservation', '').strip()
+            # A full reservation number goes straight to its booking
+            exact_match = find_by_booking_id(search_term)
+            bookings = [exact_match] if exact_match else search_bookings(search_term)
             
-            try:
-                # Try to find booking by booking_id
-                booking = Booking.objects.get(
-                    Q(booking_id__iexact=clean_term) | Q(booking_id__icontains=clean_term)
-                )
-                context['booking'] = booking
-                messages.success(request, f'Booking found: {booking.booking_id}')
-                
-            except Booking.DoesNotExist:
-                messages.error(request, f'No booking found with reservation number: {search_term}')
-            except Booking.MultipleObjectsReturned:
-                # If multiple results, get all matches
-                bookings = Booking.objects.filter(
-                    Q(booking_id__icontains=clean_term)
-                ).order_by('-created_at')
+            if len(bookings) == 1:
+                context['booking'] = bookings[0]
+                messages.success(request, f'Booking found: {bookings[0].booking_id}')
+            elif bookings:
                 context['multiple_bookings'] = bookings
                 messages.warning(request, f'Multiple bookings found matching: {search_term}')
+            else:
+                messages.error(request, f'No booking found with reservation number: {search_term}')
         else:
             messages.error(request, 'Please enter a reservation number to search.')
     
@@ -65,11 +57,10 @@ def quick_booking_lookup(request):
         if not search_term:
             return JsonResponse({'error': 'No search term provided'}, status=400)
         
-        # Clean the search term
-        clean_term = search_term.replace('#', '').replace('Reservation', '').replace('reservation', '').strip()
-        
         try:
-            booking = Booking.objects.get(booking_id__iexact=clean_term)
+            booking = find_by_booking_id(search_term)
+            if booking is None:
+                raise Booking.DoesNotExist
             
             return JsonResponse({
                 'success': True,
@@ -138,19 +129,11 @@ def admin_booking_search_api(request):
             'error': 'No search term provided'
         }, status=400)
     
-    # Clean the search term
-    clean_term = search_term.replace('#', '').replace('Reservation', '').replace('reservation', '').strip()
-    
     try:
-        # Search for bookings by booking_id, user name, or user email
-        bookings = Booking.objects.filter(
-            Q(booking_id__icontains=clean_term) |
-            Q(user__first_name__icontains=clean_term) |
-            Q(user__last_name__icontains=clean_term) |
-            Q(user__email__icontains=clean_term)
-        ).select_related('user', 'parking_space').order_by('-created_at')[:10]  # Limit to 10 results
+        # Ranked search over booking ID, license plate and guest email/name
+        bookings = search_bookings(search_term, limit=10)
         
-        if bookings.exists():
+        if bookings:
             results = []
             for booking in bookings:
                 user_name = f"{booking.user.first_name} {booking.user.last_name}".strip() if booking.user else 'N/A'
@@ -0,0 +1,170 @@
+"""
+Batch availability checks for many listings and time windows.
+
+Search results need a verdict for every card at once, so instead of one
+``check_availability`` round trip per listing this resolves a whole set of
+listings and windows with a single overlap query (grouped by
+``parking_space_id``) and the compiled availability schedules. Active
+booking holds (see bookings.holds) count as conflicts with status "held".
+"""
+from datetime import datetime
+
+from django.db.models import CharField, Q, Value
+from django.utils import timezone
+
+from apps.listings.models import ParkingListing
+from apps.listings.schedule import get_compiled_schedule
+from .models import Booking, BookingHold, BookingStatus
+
+# Statuses that block a new booking (same set check_availability uses)
+CONFLICTING_STATUSES = [BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.ACTIVE]
+
+MAX_BATCH_LISTINGS = 100
+MAX_BATCH_WINDOWS = 10
+
+
+def parse_request_datetime(value):
+    """Parse an ISO 8601 string (``Z`` suffix allowed) into an aware datetime."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def window_error(start_time, end_time):
+    """Return the reason a window can never be booked, or None."""
+    if start_time >= end_time:
+        return 'End time must be after start time'
+    if start_time <= timezone.now():
+        return 'Start time must be in the future'
+    return None
+
+
+def conflicting_bookings_by_listing(listing_ids, windows, exclude_holds_of=None):
+    """
+    Load bookings and active holds overlapping any of the windows for the given listings
+    with one query, returning {parking_space_id: [(start, end, status)]}.
+    Holds placed by ``exclude_holds_of`` are left out.
+    """
+    overlap = Q()
+    for start_time, end_time in windows:
+        overlap |= Q(start_time__lt=end_time, end_time__gt=start_time)
+
+    bookings = Booking.objects.filter(
+        overlap,
+        parking_space_id__in=listing_ids,
+        status__in=CONFLICTING_STATUSES,
+    ).values_list('parking_space_id', 'start_time', 'end_time', 'status')
+    holds = BookingHold.objects.filter(
+        overlap,
+        parking_space_id__in=listing_ids,
+        expires_at__gt=timezone.now(),
+        booking__isnull=True,
+    )
+    if exclude_holds_of is not None:
+        holds = holds.exclude(user=exclude_holds_of)
+    holds = holds.annotate(
+        hold_status=Value('held', output_field=CharField())
+    ).values_list('parking_space_id', 'start_time', 'end_time', 'hold_status')
+    rows = bookings.order_by().union(holds.order_by(), all=True).order_by('parking_space_id', 'start_time')
+
+    grouped = {}
+    for parking_space_id, start_time, end_time, booking_status in rows:
+        grouped.setdefault(parking_space_id, []).append((start_time, end_time, booking_status))
+    return grouped
+
+
+def requires_host_approval(start_time, end_time, parking_space):
+    """
+    Return True if a booking must be approved by the host: the listing has
+    no schedule, or the window falls outside it (invalid days included).
+    """
+    if not getattr(parking_space, 'availability_schedule', None):
+        return True
+    try:
+        return not get_compiled_schedule(parking_space).check(start_time, end_time, strict=True).fits
+    except Exception:
+        # If any error occurs in checking, require approval for safety
+        return True
+
+
+def check_batch_availability(listing_ids, windows):
+    """
+    Resolve availability for every (listing, window) pair.
+
+    Returns a list of per-listing verdicts in the order of ``listing_ids``.
+    Each verdict is available only if every window is.
+    """
+    listings = ParkingListing.objects.only(
+        'id', 'title', 'hourly_rate', 'availability_schedule', 'updated_at'
+    ).in_bulk(listing_ids)
+
+    bookable_windows = [window for window in windows if window_error(*window) is None]
+    conflicts = conflicting_bookings_by_listing(list(listings), bookable_windows) if bookable_windows else {}
+
+    results = []
+    for listing_id in listing_ids:
+        listing = listings.get(listing_id)
+        if listing is None:
+            results.append({
+                'parking_space_id': listing_id,
+                'available': False,
+                'reason': 'Parking space not found',
+            })
+            continue
+
+        compiled = get_compiled_schedule(listing) if listing.availability_schedule else None
+        listing_bookings = conflicts.get(listing_id, [])
+        window_results = [
+            _window_verdict(start_time, end_time, compiled, listing_bookings)
+            for start_time, end_time in windows
+        ]
+
+        results.append({
+            'parking_space_id': listing_id,
+            'available': all(window['available'] for window in window_results),
+            'parking_space': {
+                'id': listing.id,
+                'title': listing.title,
+                'hourly_rate': float(listing.hourly_rate),
+            },
+            'windows': window_results,
+        })
+
+    return results
+
+
+def _window_verdict(start_time, end_time, compiled, listing_bookings):
+    verdict = {
+        'start_time': start_time.isoformat(),
+        'end_time': end_time.isoformat(),
+        'available': False,
+    }
+
+    reason = window_error(start_time, end_time)
+    if reason:
+        verdict['reason'] = reason
+        return verdict
+
+    overlapping = [
+        {
+            'start_time': booking_start.isoformat(),
+            'end_time': booking_end.isoformat(),
+            'status': booking_status,
+        }
+        for booking_start, booking_end, booking_status in listing_bookings
+        if booking_start < end_time and booking_end > start_time
+    ]
+    if overlapping:
+        verdict['reason'] = 'Time slot conflicts with existing bookings'
+        verdict['conflicts'] = overlapping
+        return verdict
+
+    if compiled is not None:
+        schedule_check = compiled.check(start_time, end_time)
+        if not schedule_check.fits:
+            verdict['reason'] = schedule_check.reason
+            return verdict
+
+    verdict['available'] = True
+    return verdict
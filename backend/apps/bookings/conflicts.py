@@ -0,0 +1,377 @@
+"""
+Database-enforced booking conflict engine.
+
+Two bookings for the same parking space may not overlap while both are
+pending, confirmed or active, and neither may overlap another user's
+unconverted booking hold (bookings.holds). Rather than locking the
+ParkingListing row and re-running an overlap query before every insert,
+the database rejects an overlapping row itself.
+
+Bookings and holds live in separate tables, so the slots they take are
+mirrored into one table, ``bookings_bookingslot`` (BookingSlot), by
+triggers on both tables: a booking has a slot while its status blocks,
+a hold until it is converted or deleted. The guard sits on that table:
+
+- PostgreSQL: an exclusion constraint over
+  ``(parking_space_id WITH =, tstzrange(start_time, end_time) WITH &&)``
+  (needs the ``btree_gist`` extension). Concurrent inserts for different
+  time slots never wait on each other.
+- SQLite: a BEFORE INSERT trigger that aborts the statement when an
+  overlapping slot exists. SQLite serializes writers, so the check and
+  the write are atomic.
+
+Either way an overlapping booking or hold fails with an IntegrityError
+that ``save_booking`` turns into BookingConflict. Holds stop blocking at
+``expires_at``, which a trigger cannot see: ``release_hold_slots`` drops
+the slots of expired holds (and of the booking user's own holds) over a
+window just before it is written, and the hold rows themselves are left
+for ``expire_holds``. On other backends, or if the guard could not be
+installed (e.g. PostgreSQL with overlapping rows already present),
+callers fall back to the row-lock path.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BOOKINGS_TABLE = 'bookings_booking'
+HOLDS_TABLE = 'bookings_bookinghold'
+SLOTS_TABLE = 'bookings_bookingslot'
+CONFLICT_GUARD_NAME = 'bookings_no_overlap'
+
+# Statuses that hold a slot (must match the SQL below)
+BLOCKING_STATUSES = ('pending', 'confirmed', 'active')
+
+_statuses_sql = ', '.join(f"'{status}'" for status in BLOCKING_STATUSES)
+
+# Slot column -> (source table, condition for a row to take a slot, columns that move the slot)
+SLOT_SOURCES = {
+    'booking': (BOOKINGS_TABLE, f"NEW.status IN ({_statuses_sql})", ('parking_space_id', 'start_time', 'end_time', 'status')),
+    'hold': (HOLDS_TABLE, "NEW.booking_id IS NULL", ('parking_space_id', 'start_time', 'end_time', 'booking_id')),
+}
+
+
+def _insert_slot_sql(column, when=None):
+    """INSERT the slot of the trigger's NEW row (only if ``when`` holds)."""
+    insert = f"INSERT INTO {SLOTS_TABLE} (parking_space_id, start_time, end_time, {column}_id)"
+    values = "NEW.parking_space_id, NEW.start_time, NEW.end_time, NEW.id"
+    if when is None:
+        return f"{insert} VALUES ({values})"
+    return f"{insert} SELECT {values} WHERE {when}"
+
+
+def _moved_sql(columns, distinct):
+    return ' OR '.join(f"OLD.{column} {distinct} NEW.{column}" for column in columns)
+
+
+def _postgres_slot_sql(column, table, blocks, moves):
+    function = f"{SLOTS_TABLE}_{column}_sync"
+    install = [
+        f"""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM {SLOTS_TABLE} WHERE {column}_id = OLD.id;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                IF {blocks} THEN
+                    {_insert_slot_sql(column)};
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"DROP TRIGGER IF EXISTS {function} ON {table}",
+        f"DROP TRIGGER IF EXISTS {SLOTS_TABLE}_{column}_move ON {table}",
+        f"""
+        CREATE TRIGGER {function}
+        AFTER INSERT OR DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {function}()
+        """,
+        f"""
+        CREATE TRIGGER {SLOTS_TABLE}_{column}_move
+        AFTER UPDATE OF {', '.join(moves)} ON {table}
+        FOR EACH ROW WHEN ({_moved_sql(moves, 'IS DISTINCT FROM')})
+        EXECUTE FUNCTION {function}()
+        """,
+    ]
+    uninstall = [
+        f"DROP TRIGGER IF EXISTS {function} ON {table}",
+        f"DROP TRIGGER IF EXISTS {SLOTS_TABLE}_{column}_move ON {table}",
+        f"DROP FUNCTION IF EXISTS {function}()",
+    ]
+    return install, uninstall
+
+
+def _sqlite_slot_sql(column, table, blocks, moves):
+    install = [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {SLOTS_TABLE}_{column}_insert
+        AFTER INSERT ON {table}
+        WHEN {blocks}
+        BEGIN
+            {_insert_slot_sql(column)};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {SLOTS_TABLE}_{column}_move
+        AFTER UPDATE OF {', '.join(moves)} ON {table}
+        WHEN {_moved_sql(moves, 'IS NOT')}
+        BEGIN
+            DELETE FROM {SLOTS_TABLE} WHERE {column}_id = OLD.id;
+            {_insert_slot_sql(column, when=blocks)};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {SLOTS_TABLE}_{column}_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM {SLOTS_TABLE} WHERE {column}_id = OLD.id;
+        END
+        """,
+    ]
+    uninstall = [f"DROP TRIGGER IF EXISTS {SLOTS_TABLE}_{column}_{event}" for event in ('insert', 'move', 'delete')]
+    return install, uninstall
+
+
+# Rebuild every slot from the bookings and holds tables (parameter: now)
+SYNC_SLOTS_SQL = [
+    f"DELETE FROM {SLOTS_TABLE}",
+    f"""
+    INSERT INTO {SLOTS_TABLE} (parking_space_id, start_time, end_time, booking_id)
+    SELECT parking_space_id, start_time, end_time, id FROM {BOOKINGS_TABLE}
+    WHERE status IN ({_statuses_sql})
+    """,
+    f"""
+    INSERT INTO {SLOTS_TABLE} (parking_space_id, start_time, end_time, hold_id)
+    SELECT parking_space_id, start_time, end_time, id FROM {HOLDS_TABLE}
+    WHERE booking_id IS NULL AND expires_at > %s
+    """,
+]
+
+POSTGRES_SLOT_TRIGGERS_SQL = ["CREATE EXTENSION IF NOT EXISTS btree_gist"]
+POSTGRES_UNINSTALL_SQL = [f"ALTER TABLE {SLOTS_TABLE} DROP CONSTRAINT IF EXISTS {CONFLICT_GUARD_NAME}"]
+SQLITE_SLOT_TRIGGERS_SQL = []
+SQLITE_UNINSTALL_SQL = [f"DROP TRIGGER IF EXISTS {CONFLICT_GUARD_NAME}"]
+for column, source in SLOT_SOURCES.items():
+    install, uninstall = _postgres_slot_sql(column, *source)
+    POSTGRES_SLOT_TRIGGERS_SQL += install
+    POSTGRES_UNINSTALL_SQL += uninstall
+    install, uninstall = _sqlite_slot_sql(column, *source)
+    SQLITE_SLOT_TRIGGERS_SQL += install
+    SQLITE_UNINSTALL_SQL += uninstall
+del column, source, install, uninstall
+
+POSTGRES_GUARD_SQL = [
+    f"""
+    ALTER TABLE {SLOTS_TABLE} ADD CONSTRAINT {CONFLICT_GUARD_NAME}
+    EXCLUDE USING gist (
+        parking_space_id WITH =,
+        tstzrange(start_time, end_time, '[)') WITH &&
+    )
+    """,
+]
+
+SQLITE_GUARD_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CONFLICT_GUARD_NAME}
+    BEFORE INSERT ON {SLOTS_TABLE}
+    WHEN EXISTS (
+        SELECT 1 FROM {SLOTS_TABLE} AS existing
+        WHERE existing.parking_space_id = NEW.parking_space_id
+          AND existing.start_time < NEW.end_time
+          AND existing.end_time > NEW.start_time
+    )
+    BEGIN
+        SELECT RAISE(ABORT, '{CONFLICT_GUARD_NAME}');
+    END
+    """,
+]
+
+# The bookings-only guard installed by migration 0006
+LEGACY_UNINSTALL_SQL = {
+    'postgresql': [f"ALTER TABLE {BOOKINGS_TABLE} DROP CONSTRAINT IF EXISTS {CONFLICT_GUARD_NAME}"],
+    'sqlite': [
+        f"DROP TRIGGER IF EXISTS {CONFLICT_GUARD_NAME}_insert",
+        f"DROP TRIGGER IF EXISTS {CONFLICT_GUARD_NAME}_update",
+    ],
+}
+
+_guard_available = {}
+
+
+class BookingConflict(Exception):
+    """Raised when a booking or hold overlaps a blocking booking or another hold."""
+
+    def __init__(self, conflicts):
+        super().__init__('Booking overlaps an existing booking')
+        self.conflicts = conflicts
+
+
+def _existing_overlaps(connection):
+    """Return True if taken slots already overlap (PostgreSQL)."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT 1 FROM {SLOTS_TABLE} a
+            JOIN {SLOTS_TABLE} b
+              ON a.parking_space_id = b.parking_space_id
+             AND a.id < b.id
+             AND a.start_time < b.end_time
+             AND a.end_time > b.start_time
+            LIMIT 1
+        """)
+        return cursor.fetchone() is not None
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def sync_slots(connection):
+    """Rebuild the slots table from the bookings and holds tables."""
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        for statement in SYNC_SLOTS_SQL:
+            cursor.execute(statement, [now] if '%s' in statement else None)
+
+
+def install_conflict_guard(connection):
+    """
+    Create (or repair) the overlap guard for this connection's backend:
+    the slot triggers, the slots themselves and the guard on them.
+    Drops the bookings-only guard of migration 0006 if present.
+
+    Returns False if the guard could not be installed.
+    """
+    _guard_available.pop(connection.alias, None)
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return False
+    _execute(connection, LEGACY_UNINSTALL_SQL[connection.vendor])
+    if connection.vendor == 'postgresql':
+        if conflict_guard_available(connection):
+            return True
+        _execute(connection, POSTGRES_SLOT_TRIGGERS_SQL)
+        sync_slots(connection)
+        if _existing_overlaps(connection):
+            logger.warning(
+                "Not installing %s: overlapping bookings or holds already exist. "
+                "Resolve them and re-run install_conflict_guard.", CONFLICT_GUARD_NAME
+            )
+            return False
+        _execute(connection, POSTGRES_GUARD_SQL)
+    else:
+        # Table rebuilds drop triggers, so slots may be stale: resync before guarding
+        _execute(connection, [f"DROP TRIGGER IF EXISTS {CONFLICT_GUARD_NAME}"])
+        _execute(connection, SQLITE_SLOT_TRIGGERS_SQL)
+        sync_slots(connection)
+        _execute(connection, SQLITE_GUARD_SQL)
+    _guard_available.pop(connection.alias, None)
+    return True
+
+
+def uninstall_conflict_guard(connection):
+    """Drop the overlap guard and the slot triggers for this connection's backend."""
+    if connection.vendor == 'postgresql':
+        _execute(connection, POSTGRES_UNINSTALL_SQL)
+    elif connection.vendor == 'sqlite':
+        _execute(connection, SQLITE_UNINSTALL_SQL)
+    _guard_available.pop(connection.alias, None)
+
+
+def conflict_guard_available(connection):
+    """Return True if the database enforces non-overlapping bookings and holds."""
+    if connection.alias not in _guard_available:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_constraint WHERE conname = %s AND conrelid = %s::regclass",
+                    [CONFLICT_GUARD_NAME, SLOTS_TABLE]
+                )
+                available = cursor.fetchone() is not None
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s",
+                    [CONFLICT_GUARD_NAME]
+                )
+                available = cursor.fetchone() is not None
+        else:
+            available = False
+        _guard_available[connection.alias] = available
+    return _guard_available[connection.alias]
+
+
+def is_conflict_error(error):
+    """Return True if an IntegrityError came from the overlap guard."""
+    return CONFLICT_GUARD_NAME in str(error)
+
+
+def find_conflicts(parking_space_id, start_time, end_time, exclude_id=None):
+    """Blocking bookings overlapping [start_time, end_time) for a space."""
+    from .models import Booking
+
+    conflicts = Booking.objects.filter(
+        parking_space_id=parking_space_id,
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+    )
+    if exclude_id is not None:
+        conflicts = conflicts.exclude(pk=exclude_id)
+    return [
+        {
+            'start_time': start.isoformat(),
+            'end_time': end.isoformat(),
+            'status': status,
+        }
+        for start, end, status in conflicts.order_by('start_time').values_list('start_time', 'end_time', 'status')
+    ]
+
+
+def release_hold_slots(parking_space_id, windows, user_id=None, now=None):
+    """
+    Free the slots that holds no longer block over [(start, end)] windows
+    on a listing: those of expired holds and, with ``user_id``, of that
+    user's own holds. The hold rows are kept for ``expire_holds``.
+    """
+    from .models import BookingSlot
+
+    overlapping = Q()
+    for start_time, end_time in windows:
+        overlapping |= Q(start_time__lt=end_time, end_time__gt=start_time)
+    stale = Q(hold__expires_at__lte=now or timezone.now())
+    if user_id is not None:
+        stale |= Q(hold__user_id=user_id)
+    BookingSlot.objects.filter(overlapping, stale, parking_space_id=parking_space_id, hold__isnull=False).delete()
+
+
+def save_booking(booking, **kwargs):
+    """
+    Save a booking, raising BookingConflict if the database rejects it
+    as overlapping a booking or another user's hold. Runs in a savepoint
+    so callers' transactions survive.
+    """
+    from .holds import hold_conflicts, overlapping_holds
+
+    try:
+        with transaction.atomic():
+            if booking.status in BLOCKING_STATUSES:
+                release_hold_slots(
+                    booking.parking_space_id, [(booking.start_time, booking.end_time)], user_id=booking.user_id
+                )
+            booking.save(**kwargs)
+    except IntegrityError as error:
+        if not is_conflict_error(error):
+            raise
+        raise BookingConflict(find_conflicts(
+            booking.parking_space_id, booking.start_time, booking.end_time, exclude_id=booking.pk
+        ) + hold_conflicts(overlapping_holds(
+            booking.parking_space_id, booking.start_time, booking.end_time, exclude_user=booking.user_id
+        )))
+    return booking
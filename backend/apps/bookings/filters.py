@@ -1,3 +1,5 @@
+from datetime import datetime, time, timedelta
+
 import django_filters
 from django.utils import timezone
 from .models import Booking, BookingStatus
@@ -34,4 +36,32 @@ class BookingFilter(django_filters.FilterSet):
         if value:
             now = timezone.now()
             return queryset.filter(start_time__lte=now, end_time__gte=now)
-        return queryset
\ No newline at end of file
+        return queryset
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+class BookingExportFilter(django_filters.FilterSet):
+    """Filters for the booking export (see bookings.exports)"""
+    date_from = django_filters.DateFilter(method='filter_date_from')
+    date_to = django_filters.DateFilter(method='filter_date_to')
+    listing = django_filters.NumberFilter(field_name='parking_space_id')
+    host = django_filters.NumberFilter(field_name='parking_space__host_id')
+    status = CharInFilter(field_name='status')
+    
+    class Meta:
+        model = Booking
+        fields = []
+    
+    # Compare start_time with local midnights rather than start_time__date,
+    # so the (parking_space, start_time) index stays usable
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(start_time__gte=local_midnight(value))
+    
+    def filter_date_to(self, queryset, name, value):
+        return queryset.filter(start_time__lt=local_midnight(value + timedelta(days=1)))
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,205 @@
+"""
+Short-lived booking holds.
+
+Checkout used to create a PENDING Booking before payment, and abandoned
+checkouts kept blocking the slot until something cleaned them up. A hold
+reserves [start_time, end_time) on a listing for ``HOLD_TTL`` instead:
+
+- holds live in their own small table (indexed on ``expires_at``), so the
+  bookings table and its overlap queries only see real bookings;
+- an unexpired, unconverted hold blocks the slot for everyone else, both
+  in availability checks and when booking or holding. Holds take their
+  slot in the same guarded table as bookings (bookings.conflicts), so the
+  database rejects a hold or booking over another user's hold without
+  any listing row lock;
+- once expired, a hold's slot is freed by the next booking or hold over
+  it, and ``expire_holds`` deletes expired holds that were never
+  converted, cancelling their payment intents first;
+- when the payment intent succeeds, ``convert_hold`` turns the hold into a
+  confirmed booking atomically. Converted holds are kept with a link to
+  the booking so webhook retries resolve to the same booking. A payment
+  for a hold that can no longer be booked is refunded (see
+  payments.services.HoldPaymentService);
+- placing, releasing, converting or expiring a hold bumps the listing's
+  calendar version, so cached free slots show the change.
+
+On backends without the guard, placing or converting a hold locks the
+listing row instead.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from apps.listings.free_slots import bump_calendar_version
+from apps.listings.models import ParkingListing
+from .availability import requires_host_approval
+from .conflicts import (
+    BookingConflict, conflict_guard_available, find_conflicts, is_conflict_error,
+    release_hold_slots, save_booking,
+)
+from .models import Booking, BookingHold, BookingStatus
+
+HOLD_TTL = timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+
+
+class HoldUnavailable(Exception):
+    """Raised when a hold has expired or does not exist."""
+
+
+def active_holds(now=None):
+    """Holds that currently block their slot."""
+    return BookingHold.objects.filter(expires_at__gt=now or timezone.now(), booking__isnull=True)
+
+
+def overlapping_holds(parking_space_id, start_time, end_time, exclude_user=None, now=None):
+    """Active holds overlapping [start_time, end_time) on a listing."""
+    holds = active_holds(now).filter(
+        parking_space_id=parking_space_id,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+    )
+    if exclude_user is not None:
+        holds = holds.exclude(user=exclude_user)
+    return holds
+
+
+def hold_conflicts(holds):
+    """Describe holds the same way find_conflicts describes bookings."""
+    return [
+        {
+            'start_time': start.isoformat(),
+            'end_time': end.isoformat(),
+            'status': 'held',
+        }
+        for start, end in holds.order_by('start_time').values_list('start_time', 'end_time')
+    ]
+
+
+def _lock_listing_without_guard(parking_space_id):
+    """Lock the listing row if the database does not guard overlaps itself."""
+    if not conflict_guard_available(connections[BookingHold.objects.db]):
+        ParkingListing.objects.select_for_update().filter(pk=parking_space_id).first()
+
+
+@transaction.atomic
+def create_hold(user, parking_space, start_time, end_time, **details):
+    """
+    Hold a slot for ``HOLD_TTL``. Raises BookingConflict if a booking or
+    another user's hold overlaps it; the user's own overlapping holds are
+    replaced.
+    """
+    now = timezone.now()
+    _lock_listing_without_guard(parking_space.pk)
+
+    conflicts = find_conflicts(parking_space.pk, start_time, end_time)
+    conflicts += hold_conflicts(overlapping_holds(parking_space.pk, start_time, end_time, exclude_user=user, now=now))
+    if conflicts:
+        raise BookingConflict(conflicts)
+
+    overlapping_holds(parking_space.pk, start_time, end_time, now=now).filter(user=user).delete()
+
+    try:
+        with transaction.atomic():
+            release_hold_slots(parking_space.pk, [(start_time, end_time)], now=now)
+            hold = BookingHold.objects.create(
+                user=user,
+                parking_space=parking_space,
+                start_time=start_time,
+                end_time=end_time,
+                expires_at=now + HOLD_TTL,
+                hourly_rate=parking_space.hourly_rate,
+                **details
+            )
+    except IntegrityError as error:
+        if not is_conflict_error(error):
+            raise
+        raise BookingConflict(find_conflicts(parking_space.pk, start_time, end_time) + hold_conflicts(
+            overlapping_holds(parking_space.pk, start_time, end_time, exclude_user=user)
+        ))
+    bump_calendar_version(parking_space.pk)
+    return hold
+
+
+def release_hold(hold_id, user):
+    """Give up an unconverted hold. Returns True if one was released."""
+    hold = BookingHold.objects.filter(hold_id=hold_id, user=user, booking__isnull=True).first()
+    if hold is None:
+        return False
+    deleted, _ = BookingHold.objects.filter(pk=hold.pk, booking__isnull=True).delete()
+    bump_calendar_version(hold.parking_space_id)
+    return bool(deleted)
+
+
+@transaction.atomic
+def convert_hold(hold_id, stripe_payment_intent_id=''):
+    """
+    Turn a paid hold into a booking.
+
+    Idempotent: converting the same hold again returns the same booking.
+    A hold that expired but has not been purged yet is still converted if
+    nobody else has claimed the slot in the meantime. The booking takes
+    over the hold's slot (save_booking frees the user's own hold slots).
+    """
+    hold = BookingHold.objects.select_for_update().select_related('parking_space').filter(hold_id=hold_id).first()
+    if hold is None:
+        raise HoldUnavailable(f'Hold {hold_id} has expired')
+    if hold.booking_id:
+        return hold.booking
+
+    _lock_listing_without_guard(hold.parking_space_id)
+    if hold.is_expired and overlapping_holds(hold.parking_space_id, hold.start_time, hold.end_time).exists():
+        raise BookingConflict(hold_conflicts(
+            overlapping_holds(hold.parking_space_id, hold.start_time, hold.end_time)
+        ))
+
+    booking = Booking(
+        user_id=hold.user_id,
+        parking_space=hold.parking_space,
+        start_time=hold.start_time,
+        end_time=hold.end_time,
+        hourly_rate=hold.hourly_rate,
+        vehicle_license_plate=hold.vehicle_license_plate,
+        vehicle_state=hold.vehicle_state,
+        special_instructions=hold.special_instructions,
+    )
+    if requires_host_approval(hold.start_time, hold.end_time, hold.parking_space):
+        booking.status = BookingStatus.PENDING
+    else:
+        booking.status = BookingStatus.CONFIRMED
+        booking.confirmed_at = timezone.now()
+    save_booking(booking)
+
+    hold.booking = booking
+    if stripe_payment_intent_id:
+        hold.stripe_payment_intent_id = stripe_payment_intent_id
+    hold.save(update_fields=['booking', 'stripe_payment_intent_id'])
+    bump_calendar_version(hold.parking_space_id)
+    return booking
+
+
+def expire_holds(now=None):
+    """
+    Delete expired holds that were never converted. Returns the count.
+
+    Holds without a payment intent go in one statement. A hold whose
+    checkout started is only deleted once its payment intent is cancelled,
+    so an abandoned checkout cannot be charged later; if that fails the
+    hold is kept for the next run.
+    """
+    from apps.payments.services import HoldPaymentService
+
+    expired = BookingHold.objects.filter(expires_at__lte=now or timezone.now(), booking__isnull=True)
+    unpaid = expired.filter(stripe_payment_intent_id='')
+    listing_ids = set(unpaid.values_list('parking_space_id', flat=True))
+    _, deleted = unpaid.delete()
+    count = deleted.get(BookingHold._meta.label, 0)
+    for hold in expired.exclude(stripe_payment_intent_id='').order_by('pk'):
+        if HoldPaymentService.cancel_hold_payment(hold):
+            _, deleted = BookingHold.objects.filter(pk=hold.pk, booking__isnull=True).delete()
+            count += deleted.get(BookingHold._meta.label, 0)
+            listing_ids.add(hold.parking_space_id)
+    for listing_id in listing_ids:
+        bump_calendar_version(listing_id)
+    return count
@@ -0,0 +1,243 @@
+"""
+Durable scheduled notifications for bookings.
+
+Check-in reminders and expiration warnings used to be one Celery ETA task
+per booking, which sat in broker memory until due (and was re-queued on
+every save), with a polling command as a backup that checked each booking
+for a recent reminder. Instead each notification is a ScheduledJob row:
+
+- ``schedule_job`` upserts the job for (booking, kind); that pair is the
+  idempotency key, so re-scheduling moves the due time and a delivered
+  job is never sent again unless the due time changes. Bookings created
+  already confirmed (one at a time or in bulk) get their jobs from
+  ``schedule_new_bookings`` in one INSERT.
+- ``dispatch_due_jobs`` (run every minute from beat) claims due jobs in
+  batches with ``SELECT ... FOR UPDATE SKIP LOCKED``, so several workers
+  can dispatch without waiting on or double-sending each other's jobs.
+  Each batch loads its bookings with one query and records the outcome
+  with one UPDATE per state.
+- Claims older than ``CLAIM_TIMEOUT`` are picked up again, so a worker
+  dying mid-batch delays its jobs rather than losing them.
+"""
+import logging
+from datetime import timedelta
+from operator import attrgetter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.notifications.services import NotificationService
+from .models import Booking, BookingStatus, ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_REMINDER_LEAD = timedelta(minutes=15)
+EXPIRATION_WARNING_LEAD = timedelta(minutes=30)
+
+DISPATCH_BATCH_SIZE = 200
+CLAIM_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(minutes=1)
+
+
+def schedule_job(booking, kind, due_at):
+    """
+    Make sure ``kind`` is sent for ``booking`` at ``due_at``.
+
+    Returns the job. A job already delivered for the same due time is left
+    alone, so saving a booking again never re-sends its notifications; a
+    skipped one (the booking was not eligible at the time) is re-armed.
+    """
+    job, created = ScheduledJob.objects.get_or_create(
+        booking=booking, kind=kind, defaults={'due_at': due_at}
+    )
+    if not created and (job.due_at != due_at or job.state == ScheduledJob.State.SKIPPED):
+        ScheduledJob.objects.filter(pk=job.pk).exclude(state=ScheduledJob.State.CLAIMED).update(
+            due_at=due_at, state=ScheduledJob.State.PENDING, attempts=0, last_error=''
+        )
+    return job
+
+
+def confirmed_booking_jobs(booking, now):
+    """(kind, due_at) of the notifications a confirmed booking still needs."""
+    jobs = []
+    if booking.start_time > now:
+        # Bookings starting within the lead time are reminded right away
+        jobs.append((ScheduledJob.Kind.CHECKIN_REMINDER, max(booking.start_time - CHECKIN_REMINDER_LEAD, now)))
+    warning_time = booking.end_time - EXPIRATION_WARNING_LEAD
+    if warning_time > now:
+        jobs.append((ScheduledJob.Kind.EXPIRATION_WARNING, warning_time))
+    return jobs
+
+
+def schedule_new_bookings(bookings, now=None):
+    """
+    Schedule the notifications of bookings created already confirmed,
+    with one INSERT. Returns the number of jobs scheduled.
+    """
+    now = now or timezone.now()
+    jobs = [
+        ScheduledJob(booking_id=booking.pk, kind=kind, due_at=due_at)
+        for booking in bookings if booking.status == BookingStatus.CONFIRMED
+        for kind, due_at in confirmed_booking_jobs(booking, now)
+    ]
+    ScheduledJob.objects.bulk_create(jobs, ignore_conflicts=True)
+    return len(jobs)
+
+
+def delivered_booking_ids(kind, booking_ids):
+    """IDs of the given bookings whose ``kind`` notification was already sent."""
+    return set(ScheduledJob.objects.filter(
+        kind=kind, booking_id__in=booking_ids, state=ScheduledJob.State.DONE
+    ).values_list('booking_id', flat=True))
+
+
+def record_delivery(booking, kind, now=None):
+    """Mark ``kind`` as sent for a booking notified outside the dispatcher."""
+    now = now or timezone.now()
+    ScheduledJob.objects.update_or_create(
+        booking=booking, kind=kind,
+        defaults={'due_at': now, 'state': ScheduledJob.State.DONE, 'completed_at': now},
+    )
+
+
+def checkin_reminder_context(booking, now):
+    minutes_until = int((booking.start_time - now).total_seconds() / 60)
+    return {
+        'user_name': booking.user.first_name or booking.user.email.split('@')[0],
+        'parking_space_title': booking.parking_space.title,
+        'booking_date_time': booking.start_time.strftime('%B %d at %I:%M %p'),
+        'start_time': booking.start_time.strftime('%I:%M %p'),
+        'address': booking.parking_space.address,
+        'booking_id': booking.booking_id,
+        'minutes_until': minutes_until,
+        'action_url': f'/bookings/{booking.booking_id}',
+    }
+
+
+def expiration_warning_context(booking, now):
+    minutes_until = int((booking.end_time - now).total_seconds() / 60)
+    return {
+        'user_name': booking.user.first_name or booking.user.email.split('@')[0],
+        'parking_space_title': booking.parking_space.title,
+        'booking_id': booking.booking_id,
+        'end_time': booking.end_time.strftime('%I:%M %p'),
+        'minutes_until_expiration': minutes_until,
+        'action_url': f'/bookings/{booking.booking_id}',
+        'extend_url': f'/bookings/{booking.booking_id}/extend',
+    }
+
+
+# kind -> (statuses still worth notifying, moment after which it is pointless,
+#          template, context builder, channels)
+JOB_KINDS = {
+    ScheduledJob.Kind.CHECKIN_REMINDER: (
+        (BookingStatus.CONFIRMED,),
+        attrgetter('start_time'),
+        'CHECKIN_REMINDER',
+        checkin_reminder_context,
+        ['IN_APP', 'PUSH'],
+    ),
+    ScheduledJob.Kind.EXPIRATION_WARNING: (
+        (BookingStatus.CONFIRMED, BookingStatus.ACTIVE),
+        attrgetter('end_time'),
+        'PARKING_EXPIRATION_WARNING',
+        expiration_warning_context,
+        ['IN_APP', 'PUSH', 'SMS'],
+    ),
+}
+
+
+def deliver(kind, booking, now=None):
+    """
+    Send one notification. Returns True if sent, False if the booking no
+    longer needs it (cancelled, already started/ended, ...).
+    """
+    now = now or timezone.now()
+    statuses, deadline, template_type, build_context, channels = JOB_KINDS[kind]
+    if booking.status not in statuses or deadline(booking) <= now:
+        return False
+    NotificationService.send_notification(
+        user=booking.user,
+        template_type=template_type,
+        context=build_context(booking, now),
+        channels=channels,
+    )
+    return True
+
+
+def claim_due_jobs(now=None, batch_size=DISPATCH_BATCH_SIZE, kinds=None):
+    """
+    Claim up to ``batch_size`` due jobs for this worker and return them.
+
+    Rows locked by another dispatcher are skipped rather than waited on.
+    """
+    now = now or timezone.now()
+    due = Q(state=ScheduledJob.State.PENDING) | Q(
+        state=ScheduledJob.State.CLAIMED, claimed_at__lt=now - CLAIM_TIMEOUT
+    )
+    with transaction.atomic():
+        jobs = ScheduledJob.objects.select_for_update(skip_locked=True).filter(due, due_at__lte=now)
+        if kinds:
+            jobs = jobs.filter(kind__in=kinds)
+        job_ids = list(jobs.order_by('due_at').values_list('id', flat=True)[:batch_size])
+        if not job_ids:
+            return []
+        ScheduledJob.objects.filter(id__in=job_ids).update(
+            state=ScheduledJob.State.CLAIMED, claimed_at=now, attempts=F('attempts') + 1
+        )
+    return list(ScheduledJob.objects.filter(id__in=job_ids).order_by('due_at'))
+
+
+def dispatch_due_jobs(now=None, batch_size=DISPATCH_BATCH_SIZE, kinds=None):
+    """
+    Deliver every due job, a batch at a time.
+
+    Returns a dict of counts per outcome.
+    """
+    now = now or timezone.now()
+    counts = {'sent': 0, 'skipped': 0, 'retried': 0, 'failed': 0}
+
+    while True:
+        jobs = claim_due_jobs(now, batch_size, kinds)
+        if not jobs:
+            return counts
+
+        bookings = Booking.objects.select_related('user', 'parking_space').in_bulk(
+            {job.booking_id for job in jobs}
+        )
+        outcomes = {state: [] for state in ('sent', 'skipped', 'retried', 'failed')}
+        errors = {}
+        for job in jobs:
+            booking = bookings.get(job.booking_id)
+            try:
+                sent = booking is not None and deliver(job.kind, booking, now)
+                outcomes['sent' if sent else 'skipped'].append(job.id)
+            except Exception as e:
+                logger.error(f"Error delivering {job.kind} for booking {job.booking_id}: {str(e)}")
+                errors[job.id] = str(e)
+                outcomes['retried' if job.attempts < MAX_ATTEMPTS else 'failed'].append(job.id)
+
+        finished = timezone.now()
+        ScheduledJob.objects.filter(id__in=outcomes['sent']).update(
+            state=ScheduledJob.State.DONE, completed_at=finished
+        )
+        ScheduledJob.objects.filter(id__in=outcomes['skipped']).update(
+            state=ScheduledJob.State.SKIPPED, completed_at=finished
+        )
+        ScheduledJob.objects.filter(id__in=outcomes['retried']).update(
+            state=ScheduledJob.State.PENDING, due_at=now + RETRY_DELAY
+        )
+        ScheduledJob.objects.filter(id__in=outcomes['failed']).update(
+            state=ScheduledJob.State.FAILED, completed_at=finished
+        )
+        for job_id, error in errors.items():
+            ScheduledJob.objects.filter(id=job_id).update(last_error=error)
+
+        for outcome, job_ids in outcomes.items():
+            counts[outcome] += len(job_ids)
+        logger.info(
+            f"Dispatched {len(jobs)} scheduled jobs: "
+            + ', '.join(f'{outcome} {len(job_ids)}' for outcome, job_ids in outcomes.items())
+        )
@@ -0,0 +1,51 @@
+import gzip
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.bookings.exports import EXPORT_FORMATS, export_bookings, export_queryset
+
+
+class Command(BaseCommand):
+    help = 'Export bookings to a gzipped CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument(
+            '--output',
+            help='File to write (default: MEDIA_ROOT/exports/bookings_<timestamp>.<format>.gz)',
+        )
+        parser.add_argument('--from', dest='date_from', help='First start date to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last start date to include (YYYY-MM-DD)')
+        parser.add_argument('--listing', type=int, help='Only bookings of this listing id')
+        parser.add_argument('--host', type=int, help='Only bookings of this host id')
+        parser.add_argument('--status', help='Comma-separated statuses to include')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format']
+        filters = {
+            name: str(options[name])
+            for name in ('date_from', 'date_to', 'listing', 'host', 'status')
+            if options[name] is not None
+        }
+        try:
+            bookings = export_queryset(filters)
+        except ValueError as e:
+            raise CommandError(f'Invalid filters: {e.args[0]}')
+
+        if options['output']:
+            output = Path(options['output'])
+        else:
+            timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+            output = Path(settings.MEDIA_ROOT) / 'exports' / f'bookings_{timestamp}.{file_format}.gz'
+        output.parent.mkdir(parents=True, exist_ok=True)
+
+        self.stdout.write(f'Exporting bookings to {output}...')
+
+        with gzip.open(output, 'wt', encoding='utf-8', newline='') as export_file:
+            for chunk in export_bookings(bookings, file_format):
+                export_file.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'Bookings exported to {output}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from apps.bookings.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the admin booking search tokens from bookings and users'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding booking search index...')
+
+        token_count = rebuild_search_index()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Booking search index rebuilt: {token_count} tokens')
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.bookings.summary import rebuild_booking_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed per-user booking summaries from the bookings table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild this user id (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        scope = f'{len(user_ids)} user(s)' if user_ids else 'all users'
+        self.stdout.write(f'Rebuilding booking summaries for {scope}...')
+
+        row_count = rebuild_booking_summaries(user_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Booking summaries rebuilt: {row_count} rows')
+        )
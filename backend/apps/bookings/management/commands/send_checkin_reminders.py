@@ -6,7 +6,8 @@ import logging
 from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from apps.bookings.models import Booking, BookingStatus
+from apps.bookings.jobs import delivered_booking_ids, record_delivery
+from apps.bookings.models import Booking, BookingStatus, ScheduledJob
 from apps.notifications.services import NotificationService
 
 logger = logging.getLogger(__name__)
@@ -86,10 +87,15 @@ class Command(BaseCommand):
         skipped_count = 0
         error_count = 0
         
+        # One query for the reminders already sent (by the dispatcher or an earlier run)
+        already_sent = delivered_booking_ids(
+            ScheduledJob.Kind.CHECKIN_REMINDER, [booking.id for booking in bookings_needing_reminders]
+        )
+        
         for booking in bookings_needing_reminders:
             try:
-                # Check if we've already sent a reminder recently
-                if self.has_recent_reminder(booking):
+                # Check if we've already sent a reminder
+                if booking.id in already_sent:
                     self.stdout.write(f'Skipping {booking.booking_id} - reminder already sent recently')
                     skipped_count += 1
                     continue
@@ -110,6 +116,7 @@ class Command(BaseCommand):
                 success = self.send_reminder(booking, channels, minutes_until)
                 
                 if success:
+                    record_delivery(booking, ScheduledJob.Kind.CHECKIN_REMINDER)
                     self.stdout.write(
                         self.style.SUCCESS(
                             f'Sent reminder for booking {booking.booking_id} '
@@ -206,24 +213,3 @@ class Command(BaseCommand):
         except Exception as e:
             logger.error(f"Error sending reminder for booking {booking.booking_id}: {str(e)}")
             return False
-    
-    def has_recent_reminder(self, booking):
-        """Check if reminder was sent recently for this booking"""
-        try:
-            from apps.notifications.models import Notification
-            
-            # Check for notifications sent in the last 30 minutes
-            recent_time = timezone.now() - timedelta(minutes=30)
-            
-            recent_reminders = Notification.objects.filter(
-                user=booking.user,
-                content__icontains=booking.booking_id,
-                created_at__gte=recent_time,
-                subject__icontains='Parking Starts Soon'
-            ).exists()
-            
-            return recent_reminders
-            
-        except Exception as e:
-            logger.error(f"Error checking recent reminders: {str(e)}")
-            return False  # If we can't check, assume no recent reminder
\ No newline at end of file
@@ -15,7 +15,8 @@ import logging
 from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from apps.bookings.models import Booking, BookingStatus
+from apps.bookings.jobs import delivered_booking_ids
+from apps.bookings.models import Booking, BookingStatus, ScheduledJob
 from apps.bookings.tasks import send_expiration_warning
 from apps.notifications.services import NotificationService
 
@@ -104,18 +105,21 @@ class Command(BaseCommand):
                 
                 self.stdout.write(f'📊 Found {bookings.count()} bookings expiring between {start_time.strftime("%H:%M")} and {end_time.strftime("%H:%M")}')
                 
+                # One query for the warnings already sent (by the dispatcher or an earlier run)
+                already_sent = delivered_booking_ids(
+                    ScheduledJob.Kind.EXPIRATION_WARNING, [booking.id for booking in bookings]
+                )
+                
                 for booking in bookings:
                     time_until_end = booking.end_time - now
                     minutes_until = int(time_until_end.total_seconds() / 60)
                     
                     self.stdout.write(f'📝 Booking {booking.booking_id}: expires in {minutes_until} minutes')
                     
-                    # Check if we've already sent a warning recently
-                    if not force_booking_id:
-                        from apps.bookings.tasks import _check_recent_expiration_warning
-                        if _check_recent_expiration_warning(booking):
-                            self.stdout.write(f'⏭️  Skipping {booking.booking_id} - warning sent recently')
-                            continue
+                    # Check if we've already sent a warning
+                    if booking.id in already_sent:
+                        self.stdout.write(f'⏭️  Skipping {booking.booking_id} - warning already sent')
+                        continue
                     
                     if self._process_booking(booking, channels, dry_run):
                         count += 1
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0005_booking_auto_checkout"),
+    ]
+
+    # This installed the bookings-only overlap guard. It is superseded by
+    # 0011, which guards bookings and holds together (and drops this guard
+    # where it was installed).
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, migrations.RunPython.noop),
+    ]
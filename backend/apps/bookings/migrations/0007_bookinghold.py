@@ -0,0 +1,81 @@
+# Generated by Django 4.2.8 on 2026-10-16 19:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0013_parkinglisting_amenity_mask"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("bookings", "0006_booking_conflict_guard"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingHold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "hold_id",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                ("start_time", models.DateTimeField()),
+                ("end_time", models.DateTimeField()),
+                ("expires_at", models.DateTimeField(db_index=True)),
+                ("hourly_rate", models.DecimalField(decimal_places=2, max_digits=8)),
+                ("vehicle_license_plate", models.CharField(max_length=20)),
+                ("vehicle_state", models.CharField(default="NY", max_length=2)),
+                ("special_instructions", models.TextField(blank=True)),
+                (
+                    "stripe_payment_intent_id",
+                    models.CharField(blank=True, db_index=True, max_length=255),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "booking",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hold",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "parking_space",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_holds",
+                        to="listings.parkinglisting",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_holds",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["parking_space", "start_time"],
+                        name="bookings_bo_parking_cfec73_idx",
+                    )
+                ],
+            },
+        ),
+    ]
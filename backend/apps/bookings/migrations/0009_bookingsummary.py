@@ -0,0 +1,71 @@
+# Generated by Django 4.2.8 on 2026-10-16 19:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_summaries(apps, schema_editor):
+    """Build summaries from existing bookings."""
+    from apps.bookings.summary import rebuild_booking_summaries
+
+    rebuild_booking_summaries(app_registry=apps)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("bookings", "0008_scheduledjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "role",
+                    models.CharField(
+                        choices=[("guest", "Guest"), ("host", "Host")], max_length=5
+                    ),
+                ),
+                ("total_bookings", models.PositiveIntegerField(default=0)),
+                ("pending_bookings", models.PositiveIntegerField(default=0)),
+                ("confirmed_bookings", models.PositiveIntegerField(default=0)),
+                ("active_bookings", models.PositiveIntegerField(default=0)),
+                ("completed_bookings", models.PositiveIntegerField(default=0)),
+                ("cancelled_bookings", models.PositiveIntegerField(default=0)),
+                ("no_show_bookings", models.PositiveIntegerField(default=0)),
+                (
+                    "completed_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_summaries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "booking summaries",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="bookingsummary",
+            constraint=models.UniqueConstraint(
+                fields=("user", "role"), name="bookings_summary_once_per_role"
+            ),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.8 on 2026-10-16 19:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def install_trigram_index(apps, schema_editor):
+    """Add the pg_trgm index on PostgreSQL."""
+    from apps.bookings.search import install_trigram_index
+
+    install_trigram_index(schema_editor.connection)
+
+
+def uninstall_trigram_index(apps, schema_editor):
+    from apps.bookings.search import uninstall_trigram_index
+
+    uninstall_trigram_index(schema_editor.connection)
+
+
+def backfill_search_tokens(apps, schema_editor):
+    """Tokenize existing bookings and users."""
+    from apps.bookings.search import rebuild_search_index
+
+    rebuild_search_index(app_registry=apps)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("bookings", "0009_bookingsummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=100)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("booking_id", "Booking ID"),
+                            ("plate", "License plate"),
+                            ("email", "Email"),
+                            ("name", "Name"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "booking",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_search_tokens",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["token"], name="bookings_bo_token_6c9519_idx")
+                ],
+            },
+        ),
+        migrations.RunPython(install_trigram_index, uninstall_trigram_index),
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.8 on 2026-10-16 20:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def install_conflict_guard(apps, schema_editor):
+    """
+    Move the overlap guard from the bookings table to the slots table,
+    which bookings and holds both fill (see bookings.conflicts).
+    """
+    from apps.bookings.conflicts import install_conflict_guard
+
+    install_conflict_guard(schema_editor.connection)
+
+
+def uninstall_conflict_guard(apps, schema_editor):
+    from apps.bookings.conflicts import uninstall_conflict_guard
+
+    uninstall_conflict_guard(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0013_parkinglisting_amenity_mask"),
+        ("bookings", "0010_bookingsearchtoken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_time", models.DateTimeField()),
+                ("end_time", models.DateTimeField()),
+                (
+                    "booking",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slot",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "hold",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slot",
+                        to="bookings.bookinghold",
+                    ),
+                ),
+                (
+                    "parking_space",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_slots",
+                        to="listings.parkinglisting",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["parking_space", "start_time"],
+                        name="bookings_bo_parking_45200f_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(install_conflict_guard, uninstall_conflict_guard),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from apps.common.tracking import FieldTrackerMixin
 import uuid
 
 User = get_user_model()
@@ -16,7 +17,7 @@ class BookingStatus(models.TextChoices):
     NO_SHOW = 'no_show', 'No Show'
 
 
-class Booking(models.Model):
+class Booking(FieldTrackerMixin, models.Model):
     # Core booking information
     booking_id = models.CharField(max_length=20, unique=True, db_index=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
@@ -50,6 +51,9 @@ class Booking(models.Model):
     actual_end_time = models.DateTimeField(null=True, blank=True, help_text="When user actually checked out")
     auto_checkout = models.BooleanField(default=False, help_text="Whether checkout was performed automatically")
     
+    # Signals compare these with their loaded values instead of re-fetching the row
+    tracked_fields = ('status', 'vehicle_license_plate')
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -94,6 +98,178 @@ class Booking(models.Model):
         return None
 
 
+class BookingHold(models.Model):
+    """
+    Short-lived reservation of a time slot while the guest pays.
+    
+    Holds block the slot like a booking until ``expires_at`` and are
+    deleted in bulk once expired (see bookings.holds).
+    """
+    hold_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='booking_holds')
+    parking_space = models.ForeignKey('listings.ParkingListing', on_delete=models.CASCADE, related_name='booking_holds')
+    
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    
+    # Booking details copied onto the booking on conversion
+    hourly_rate = models.DecimalField(max_digits=8, decimal_places=2)
+    vehicle_license_plate = models.CharField(max_length=20)
+    vehicle_state = models.CharField(max_length=2, default='NY')
+    special_instructions = models.TextField(blank=True)
+    
+    stripe_payment_intent_id = models.CharField(max_length=255, blank=True, db_index=True)
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, null=True, blank=True, related_name='hold')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['parking_space', 'start_time']),
+        ]
+    
+    def __str__(self):
+        return f"Hold {self.hold_id} on {self.parking_space_id} until {self.expires_at}"
+    
+    @property
+    def total_amount(self):
+        duration_hours = (self.end_time - self.start_time).total_seconds() / 3600
+        return round(float(self.hourly_rate) * duration_hours, 2)
+    
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
+class BookingSlot(models.Model):
+    """
+    A time slot taken on a listing by a blocking booking or an unconverted hold.
+    
+    Rows are written by database triggers on the bookings and holds tables
+    so one overlap guard covers both (see bookings.conflicts).
+    """
+    parking_space = models.ForeignKey('listings.ParkingListing', on_delete=models.CASCADE, related_name='booking_slots')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, null=True, blank=True, related_name='slot')
+    hold = models.OneToOneField(BookingHold, on_delete=models.CASCADE, null=True, blank=True, related_name='slot')
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['parking_space', 'start_time']),
+        ]
+    
+    def __str__(self):
+        return f"Slot {self.start_time} - {self.end_time} on {self.parking_space_id}"
+
+
+
+class ScheduledJob(models.Model):
+    """
+    A notification due for a booking at ``due_at`` (see bookings.jobs).
+    
+    There is at most one job per booking and kind, so scheduling again
+    only moves the due time and a delivered job is never sent twice.
+    """
+    
+    class Kind(models.TextChoices):
+        CHECKIN_REMINDER = 'checkin_reminder', 'Check-in reminder'
+        EXPIRATION_WARNING = 'expiration_warning', 'Expiration warning'
+    
+    class State(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        CLAIMED = 'claimed', 'Claimed'
+        DONE = 'done', 'Done'
+        SKIPPED = 'skipped', 'Skipped'
+        FAILED = 'failed', 'Failed'
+    
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='scheduled_jobs')
+    kind = models.CharField(max_length=30, choices=Kind.choices)
+    due_at = models.DateTimeField()
+    state = models.CharField(max_length=10, choices=State.choices, default=State.PENDING)
+    
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['due_at', 'state']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'kind'], name='bookings_scheduledjob_once_per_kind'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} for booking {self.booking_id} at {self.due_at} ({self.state})"
+
+
+class BookingSummary(models.Model):
+    """
+    Per-user booking counts and completed amount, as guest or as host.
+    
+    Kept current on every booking status change (see bookings.summary) and
+    rebuilt by the ``rebuild_booking_summaries`` command.
+    """
+    
+    class Role(models.TextChoices):
+        GUEST = 'guest', 'Guest'
+        HOST = 'host', 'Host'
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='booking_summaries')
+    role = models.CharField(max_length=5, choices=Role.choices)
+    
+    total_bookings = models.PositiveIntegerField(default=0)
+    pending_bookings = models.PositiveIntegerField(default=0)
+    confirmed_bookings = models.PositiveIntegerField(default=0)
+    active_bookings = models.PositiveIntegerField(default=0)
+    completed_bookings = models.PositiveIntegerField(default=0)
+    cancelled_bookings = models.PositiveIntegerField(default=0)
+    no_show_bookings = models.PositiveIntegerField(default=0)
+    completed_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name_plural = 'booking summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'role'], name='bookings_summary_once_per_role'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_role_display()} summary for {self.user_id}"
+
+
+class BookingSearchToken(models.Model):
+    """
+    A normalized token the admin booking lookup matches against (see
+    bookings.search): a booking's ID and license plate, or a guest's
+    email and names. Guest tokens belong to the user, not each booking.
+    """
+    
+    class Kind(models.TextChoices):
+        BOOKING_ID = 'booking_id', 'Booking ID'
+        PLATE = 'plate', 'License plate'
+        EMAIL = 'email', 'Email'
+        NAME = 'name', 'Name'
+    
+    token = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    booking = models.ForeignKey(
+        Booking, on_delete=models.CASCADE, null=True, blank=True, related_name='search_tokens'
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='booking_search_tokens'
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['token']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} token {self.token}"
+
 
 class BookingReview(models.Model):
     RATING_CHOICES = [(i, str(i)) for i in range(1, 6)]
@@ -0,0 +1,271 @@
+"""
+Indexed booking lookup for support staff.
+
+The admin search views used ``icontains`` over booking and joined user
+columns, which scans every booking. Instead, BookingSearchToken holds
+normalized tokens (lowercase, punctuation stripped):
+
+- per booking: the booking ID with and without its ``BK`` prefix, and the
+  license plate (``ABC-1234`` and ``abc 1234`` both become ``abc1234``);
+- per guest: their email and each word of their first and last name.
+
+Tokens are matched by prefix with a range scan on the token index. On
+PostgreSQL a ``pg_trgm`` GIN index on the same column also allows
+substring matches for terms of three characters or more.
+
+``search_bookings`` ranks matches (booking ID, then plate, then guest, then
+recency) and returns at most ``limit`` bookings; ``filter_bookings`` only
+narrows a queryset, for the Django admin changelist.
+
+Tokens are written by bookings.signals when bookings or users are saved,
+and rebuilt by migration 0010 and ``rebuild_booking_search_index``.
+"""
+import re
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .models import Booking, BookingSearchToken
+
+TOKENS_TABLE = 'bookings_bookingsearchtoken'
+TRIGRAM_INDEX = 'bookings_search_token_trgm'
+
+POSTGRES_INSTALL_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {TOKENS_TABLE} USING gin (token gin_trgm_ops)",
+]
+
+POSTGRES_UNINSTALL_SQL = [
+    f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}",
+]
+
+MAX_TOKEN_LENGTH = 100
+MAX_SEARCH_TERMS = 4
+MIN_TRIGRAM_TERM = 3
+MAX_CANDIDATES = 200
+DEFAULT_LIMIT = 20
+
+# Words staff paste along with reservation numbers
+IGNORED_TERMS = {'reservation', 'booking'}
+
+NON_TOKEN_RE = re.compile(r'[^a-z0-9@._+-]')
+NON_ALNUM_RE = re.compile(r'[^a-z0-9]')
+
+Kind = BookingSearchToken.Kind
+
+# Relevance of a match: (exact, prefix/substring) per kind
+KIND_SCORES = {
+    Kind.BOOKING_ID: (100, 60),
+    Kind.PLATE: (50, 30),
+    Kind.EMAIL: (20, 10),
+    Kind.NAME: (8, 4),
+}
+
+
+def install_trigram_index(connection):
+    """Create the trigram index on PostgreSQL; other backends need nothing."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_INSTALL_SQL:
+            cursor.execute(statement)
+
+
+def uninstall_trigram_index(connection):
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_UNINSTALL_SQL:
+            cursor.execute(statement)
+
+
+def normalize(value):
+    """Lowercase and strip everything but letters, digits and email punctuation."""
+    return NON_TOKEN_RE.sub('', (value or '').lower())[:MAX_TOKEN_LENGTH]
+
+
+def normalize_plate(value):
+    return NON_ALNUM_RE.sub('', (value or '').lower())[:MAX_TOKEN_LENGTH]
+
+
+def booking_tokens(booking_id, license_plate):
+    """(kind, token) pairs for a booking."""
+    tokens = set()
+    normalized_id = normalize(booking_id)
+    if normalized_id:
+        tokens.add((Kind.BOOKING_ID, normalized_id))
+        if normalized_id.startswith('bk') and len(normalized_id) > 2:
+            tokens.add((Kind.BOOKING_ID, normalized_id[2:]))
+    plate = normalize_plate(license_plate)
+    if plate:
+        tokens.add((Kind.PLATE, plate))
+    return tokens
+
+
+def user_tokens(email, first_name, last_name):
+    """(kind, token) pairs for a guest."""
+    tokens = set()
+    if normalize(email):
+        tokens.add((Kind.EMAIL, normalize(email)))
+    for word in f'{first_name or ""} {last_name or ""}'.split():
+        if normalize(word):
+            tokens.add((Kind.NAME, normalize(word)))
+    return tokens
+
+
+def index_bookings(bookings, Token=BookingSearchToken):
+    """Replace the tokens of the given bookings."""
+    bookings = list(bookings)
+    with transaction.atomic():
+        Token.objects.filter(booking_id__in=[booking.pk for booking in bookings]).delete()
+        Token.objects.bulk_create([
+            Token(booking_id=booking.pk, kind=kind, token=token)
+            for booking in bookings
+            for kind, token in booking_tokens(booking.booking_id, booking.vehicle_license_plate)
+        ], batch_size=1000)
+
+
+def index_users(users, Token=BookingSearchToken):
+    """Replace the tokens of the given users."""
+    users = list(users)
+    with transaction.atomic():
+        Token.objects.filter(user_id__in=[user.pk for user in users]).delete()
+        Token.objects.bulk_create([
+            Token(user_id=user.pk, kind=kind, token=token)
+            for user in users
+            for kind, token in user_tokens(user.email, user.first_name, user.last_name)
+        ], batch_size=1000)
+
+
+def rebuild_search_index(app_registry=None, chunk_size=2000):
+    """Re-tokenize every booking and user. Returns the number of tokens."""
+    registry = app_registry or django_apps
+    Token = registry.get_model('bookings', 'BookingSearchToken')
+    BookingModel = registry.get_model('bookings', 'Booking')
+    UserModel = registry.get_model(settings.AUTH_USER_MODEL)
+
+    Token.objects.all().delete()
+    bookings = BookingModel.objects.only('id', 'booking_id', 'vehicle_license_plate').order_by('pk')
+    users = UserModel.objects.only('id', 'email', 'first_name', 'last_name').order_by('pk')
+    for queryset, index in ((bookings, index_bookings), (users, index_users)):
+        chunk = []
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(instance)
+            if len(chunk) >= chunk_size:
+                index(chunk, Token)
+                chunk = []
+        if chunk:
+            index(chunk, Token)
+    return Token.objects.count()
+
+
+def parse_terms(value):
+    """Split staff input into normalized search terms."""
+    terms = [normalize(word) for word in (value or '').replace('#', ' ').split()]
+    return [term for term in terms if term and term not in IGNORED_TERMS][:MAX_SEARCH_TERMS]
+
+
+def _token_match(term, connection):
+    if connection.vendor == 'postgresql':
+        if len(term) >= MIN_TRIGRAM_TERM:
+            return Q(token__contains=term)
+        return Q(token__startswith=term)
+    # Range scan instead of LIKE so SQLite can use the token index
+    return Q(token__gte=term, token__lt=term + '\U0010ffff')
+
+
+def _variants(term):
+    # Plates are indexed without punctuation, so also try the term that way
+    return {term, normalize_plate(term)} - {''}
+
+
+def _term_filter(term, connection):
+    match = Q()
+    for variant in _variants(term):
+        match |= _token_match(variant, connection)
+    tokens = BookingSearchToken.objects.filter(match)
+    return (
+        Q(id__in=tokens.filter(booking__isnull=False).values('booking_id'))
+        | Q(user_id__in=tokens.filter(user__isnull=False).values('user_id'))
+    )
+
+
+def search_filter(value, connection=None):
+    """
+    A Q matching bookings where every term matches one of their tokens, or
+    None if ``value`` has no terms. Several terms are also tried joined
+    together, so a plate typed as ``abc 1234`` still matches.
+    """
+    terms = parse_terms(value)
+    if not terms:
+        return None
+    connection = connection or connections[Booking.objects.db]
+
+    condition = Q()
+    for term in terms:
+        condition &= _term_filter(term, connection)
+    if len(terms) > 1:
+        condition |= _term_filter(normalize_plate(''.join(terms)), connection)
+    return condition
+
+
+def find_by_booking_id(value):
+    """The booking whose ID is ``value`` (``BK`` prefix optional), or None."""
+    terms = parse_terms(value)
+    if len(terms) != 1:
+        return None
+    return Booking.objects.filter(
+        search_tokens__kind=Kind.BOOKING_ID, search_tokens__token=terms[0]
+    ).select_related('user', 'parking_space').first()
+
+
+def filter_bookings(queryset, value):
+    """Narrow a Booking queryset to the bookings matching ``value``."""
+    condition = search_filter(value, connections[queryset.db])
+    return queryset if condition is None else queryset.filter(condition)
+
+
+def _score(terms, booking_id, plate, email, first_name, last_name):
+    tokens = booking_tokens(booking_id, plate) | user_tokens(email, first_name, last_name)
+    score = 0
+    for term in terms:
+        best = 0
+        for kind, token in tokens:
+            exact, partial = KIND_SCORES[kind]
+            for variant in _variants(term):
+                if token == variant:
+                    best = max(best, exact)
+                elif variant in token:
+                    best = max(best, partial if token.startswith(variant) else partial // 2)
+        score += best
+    return score
+
+
+def search_bookings(value, limit=DEFAULT_LIMIT, queryset=None):
+    """
+    The best ``limit`` bookings matching ``value``, most relevant first.
+
+    Up to MAX_CANDIDATES of the newest matches are ranked; ties keep the
+    newest first.
+    """
+    queryset = Booking.objects.all() if queryset is None else queryset
+    condition = search_filter(value, connections[queryset.db])
+    if condition is None:
+        return []
+
+    terms = parse_terms(value)
+    if len(terms) > 1:
+        terms = [normalize_plate(''.join(terms))] + terms
+    candidates = queryset.filter(condition).order_by('-created_at').values_list(
+        'id', 'booking_id', 'vehicle_license_plate', 'user__email', 'user__first_name', 'user__last_name'
+    )[:MAX_CANDIDATES]
+    ranked = sorted(
+        enumerate(candidates),
+        key=lambda item: (-_score(terms, *item[1][1:]), item[0]),
+    )
+    booking_ids = [row[0] for _, row in ranked[:limit]]
+
+    bookings = Booking.objects.select_related('user', 'parking_space').in_bulk(booking_ids)
+    return [bookings[booking_id] for booking_id in booking_ids if booking_id in bookings]
@@ -1,8 +1,14 @@
 from rest_framework import serializers
 from django.utils import timezone
-from django.db import transaction
+from django.db import connections, transaction
 from django.core.exceptions import ValidationError as DjangoValidationError
-from .models import Booking, BookingReview, BookingStatus
+from apps.listings.models import ParkingListing
+from apps.listings.schedule import DAY_NAMES, get_compiled_schedule
+from .availability import requires_host_approval
+from .conflicts import BookingConflict, conflict_guard_available, save_booking
+from .holds import create_hold, overlapping_holds
+from .series import FREQUENCIES, MAX_SERIES_WINDOWS, create_booking_series, expand_recurrence
+from .models import Booking, BookingHold, BookingReview, BookingStatus
 
 
 class BookingSerializer(serializers.ModelSerializer):
@@ -79,190 +85,195 @@ class CreateBookingSerializer(serializers.ModelSerializer):
                 "There may be pending or confirmed bookings that conflict with your request."
             )
         
+        # Slots other users are paying for are held until their hold expires
+        request = self.context.get('request')
+        user = request.user if request and request.user.is_authenticated else None
+        if overlapping_holds(parking_space.pk, start_time, end_time, exclude_user=user).exists():
+            raise serializers.ValidationError(
+                "This time slot is being booked by another user. Please select a different time."
+            )
+        
         # Additional validation: Check against parking space availability schedule
         if hasattr(parking_space, 'availability_schedule') and parking_space.availability_schedule:
-            self._validate_against_schedule(start_time, end_time, parking_space.availability_schedule)
+            self._validate_against_schedule(start_time, end_time, parking_space)
         
         return data
     
-    def _validate_against_schedule(self, start_time, end_time, availability_schedule):
+    def _validate_against_schedule(self, start_time, end_time, parking_space):
         """Validate booking times against parking space availability schedule"""
-        from datetime import datetime, time
-        import pytz
-        from django.conf import settings
-        
-        # Get day names mapping
-        day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-        
-        # Get the local timezone
-        local_tz = pytz.timezone(settings.TIME_ZONE)
-        
-        # Convert booking times to local timezone for comparison
-        local_start_time = start_time.astimezone(local_tz)
-        local_end_time = end_time.astimezone(local_tz)
-        
-        # Check each day the booking spans
-        current_datetime = local_start_time
-        while current_datetime.date() <= local_end_time.date():
-            day_name = day_names[current_datetime.weekday()]
-            
-            if day_name not in availability_schedule:
-                raise serializers.ValidationError(
-                    f"Parking space schedule not configured for {day_name.title()}."
-                )
-            
-            day_schedule = availability_schedule[day_name]
-            
-            if not day_schedule.get('available', False):
-                raise serializers.ValidationError(
-                    f"Parking space is not available on {day_name.title()}."
-                )
-            
-            # Parse schedule times
-            try:
-                schedule_start = datetime.strptime(day_schedule['start'], '%H:%M').time()
-                schedule_end = datetime.strptime(day_schedule['end'], '%H:%M').time()
-            except (KeyError, ValueError):
-                # Skip validation if schedule format is invalid
-                current_datetime = current_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-                current_datetime += timezone.timedelta(days=1)
-                continue
-            
-            # Check if booking times fall within available hours for this day
-            if current_datetime.date() == local_start_time.date():
-                # First day - check start time
-                if local_start_time.time() < schedule_start:
-                    raise serializers.ValidationError(
-                        f"Parking space opens at {day_schedule['start']} on {day_name.title()}."
-                    )
-            
-            if current_datetime.date() == local_end_time.date():
-                # Last day - check end time
-                if local_end_time.time() > schedule_end:
-                    raise serializers.ValidationError(
-                        f"Parking space closes at {day_schedule['end']} on {day_name.title()}."
-                    )
-            
-            # Move to next day
-            current_datetime = current_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-            current_datetime += timezone.timedelta(days=1)
+        result = get_compiled_schedule(parking_space).check(start_time, end_time)
+        if not result.fits:
+            raise serializers.ValidationError(f"{result.reason}.")
     
     def _requires_host_approval(self, start_time, end_time, parking_space):
         """
         Determine if booking requires host approval based on availability schedule
         Returns True if booking is outside the allowed time/date parameters
         """
-        if not hasattr(parking_space, 'availability_schedule') or not parking_space.availability_schedule:
-            # If no schedule is set, require approval for all bookings
-            return True
-        
-        try:
-            import pytz
-            from django.conf import settings
-            from datetime import datetime
-            
-            availability_schedule = parking_space.availability_schedule
-            day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-            
-            # Get the local timezone
-            local_tz = pytz.timezone(settings.TIME_ZONE)
-            
-            # Convert booking times to local timezone for comparison
-            local_start_time = start_time.astimezone(local_tz)
-            local_end_time = end_time.astimezone(local_tz)
-            
-            # Check each day the booking spans
-            current_datetime = local_start_time
-            while current_datetime.date() <= local_end_time.date():
-                day_name = day_names[current_datetime.weekday()]
-                
-                # If day is not in schedule, requires approval
-                if day_name not in availability_schedule:
-                    return True
-                
-                day_schedule = availability_schedule[day_name]
-                
-                # If day is not available, requires approval
-                if not day_schedule.get('available', False):
-                    return True
-                
-                # Parse schedule times
-                try:
-                    schedule_start = datetime.strptime(day_schedule['start'], '%H:%M').time()
-                    schedule_end = datetime.strptime(day_schedule['end'], '%H:%M').time()
-                except (KeyError, ValueError):
-                    # If schedule format is invalid, require approval
-                    return True
-                
-                # Check if booking times fall outside available hours
-                if current_datetime.date() == local_start_time.date():
-                    # First day - check start time
-                    if local_start_time.time() < schedule_start:
-                        return True
-                
-                if current_datetime.date() == local_end_time.date():
-                    # Last day - check end time
-                    if local_end_time.time() > schedule_end:
-                        return True
-                
-                # Move to next day
-                current_datetime = current_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-                current_datetime += timezone.timedelta(days=1)
-            
-            # If we get here, booking is within allowed parameters
-            return False
-            
-        except Exception:
-            # If any error occurs in checking, require approval for safety
-            return True
+        return requires_host_approval(start_time, end_time, parking_space)
 
     @transaction.atomic
     def create(self, validated_data):
         """Create booking with atomic transaction and determine approval status"""
+        if not conflict_guard_available(connections[Booking.objects.db]):
+            # No database overlap guard on this backend; serialize on the listing row
+            return self._create_with_row_lock(validated_data)
+        
+        # The database rejects overlapping bookings itself (see bookings.conflicts),
+        # so no listing row lock is needed and inserts for other slots don't wait.
+        self._set_rate_and_status(validated_data, validated_data['parking_space'])
+        try:
+            return save_booking(Booking(**validated_data))
+        except BookingConflict:
+            raise serializers.ValidationError(
+                "This time slot was just booked by another user. Please select a different time."
+            )
+    
+    def _create_with_row_lock(self, validated_data):
+        """Fallback: lock the parking space row and re-check for conflicts"""
         parking_space = validated_data['parking_space']
         start_time = validated_data['start_time']
         end_time = validated_data['end_time']
         
-        # Final conflict check within transaction with row-level locking
-        with transaction.atomic():
-            # Lock the parking space for update to prevent concurrent bookings
-            locked_parking_space = parking_space.__class__.objects.select_for_update().get(
-                id=parking_space.id
+        # Lock the parking space for update to prevent concurrent bookings
+        locked_parking_space = parking_space.__class__.objects.select_for_update().get(
+            id=parking_space.id
+        )
+        
+        # Re-check for conflicts within the locked transaction
+        conflicting_bookings = Booking.objects.filter(
+            parking_space=locked_parking_space,
+            status__in=[BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.ACTIVE],
+            start_time__lt=end_time,
+            end_time__gt=start_time
+        )
+        
+        if conflicting_bookings.exists():
+            raise serializers.ValidationError(
+                "This time slot was just booked by another user. Please select a different time."
             )
-            
-            # Re-check for conflicts within the locked transaction
-            conflicting_bookings = Booking.objects.filter(
-                parking_space=locked_parking_space,
-                status__in=[BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.ACTIVE],
-                start_time__lt=end_time,
-                end_time__gt=start_time
+        
+        self._set_rate_and_status(validated_data, locked_parking_space)
+        return super().create(validated_data)
+    
+    def _set_rate_and_status(self, validated_data, parking_space):
+        """Set the hourly rate and the initial status based on approval requirements"""
+        validated_data['hourly_rate'] = parking_space.hourly_rate
+        
+        requires_approval = self._requires_host_approval(
+            validated_data['start_time'], validated_data['end_time'], parking_space
+        )
+        
+        if requires_approval:
+            # Booking is outside allowed parameters, needs host approval
+            validated_data['status'] = BookingStatus.PENDING
+        else:
+            # Booking is within allowed parameters, auto-confirm
+            validated_data['status'] = BookingStatus.CONFIRMED
+            validated_data['confirmed_at'] = timezone.now()
+
+
+
+class BookingHoldSerializer(serializers.ModelSerializer):
+    parking_space_title = serializers.CharField(source='parking_space.title', read_only=True)
+    total_amount = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = BookingHold
+        fields = [
+            'hold_id', 'parking_space', 'parking_space_title',
+            'start_time', 'end_time', 'expires_at',
+            'hourly_rate', 'total_amount',
+            'vehicle_license_plate', 'vehicle_state', 'special_instructions',
+            'created_at'
+        ]
+        read_only_fields = fields
+
+
+class CreateBookingHoldSerializer(CreateBookingSerializer):
+    """Validates a checkout the same way as a booking, then holds the slot"""
+    
+    class Meta(CreateBookingSerializer.Meta):
+        model = BookingHold
+    
+    def create(self, validated_data):
+        parking_space = validated_data.pop('parking_space')
+        start_time = validated_data.pop('start_time')
+        end_time = validated_data.pop('end_time')
+        user = validated_data.pop('user')
+        try:
+            return create_hold(user, parking_space, start_time, end_time, **validated_data)
+        except BookingConflict:
+            raise serializers.ValidationError(
+                "This time slot was just booked by another user. Please select a different time."
             )
-            
-            if conflicting_bookings.exists():
-                raise serializers.ValidationError(
-                    "This time slot was just booked by another user. Please select a different time."
-                )
-            
-            # Set the hourly rate from the parking space
-            validated_data['hourly_rate'] = locked_parking_space.hourly_rate
-            
-            # Determine initial status based on approval requirements
-            requires_approval = self._requires_host_approval(start_time, end_time, locked_parking_space)
-            
-            if requires_approval:
-                # Booking is outside allowed parameters, needs host approval
-                validated_data['status'] = BookingStatus.PENDING
-            else:
-                # Booking is within allowed parameters, auto-confirm
-                validated_data['status'] = BookingStatus.CONFIRMED
-                validated_data['confirmed_at'] = timezone.now()
-            
-            # Create the booking
-            booking = super().create(validated_data)
-            
-            return booking
 
 
+class BookingWindowSerializer(serializers.Serializer):
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+
+
+class RecurrenceSerializer(serializers.Serializer):
+    """A repeating window: the first occurrence plus how it repeats"""
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    frequency = serializers.ChoiceField(choices=FREQUENCIES)
+    weekdays = serializers.ListField(
+        child=serializers.ChoiceField(choices=DAY_NAMES), required=False, allow_empty=False
+    )
+    count = serializers.IntegerField(min_value=1, required=False)
+    until = serializers.DateField(required=False)
+    
+    def validate(self, data):
+        if ('count' in data) == ('until' in data):
+            raise serializers.ValidationError("Provide exactly one of count or until.")
+        return data
+
+
+class CreateBookingSeriesSerializer(serializers.Serializer):
+    """
+    Book several slots of one parking space at once, given either explicit
+    windows or a recurrence rule. All slots are booked or none are.
+    """
+    parking_space = serializers.PrimaryKeyRelatedField(queryset=ParkingListing.objects.all())
+    windows = BookingWindowSerializer(many=True, required=False, allow_empty=False)
+    recurrence = RecurrenceSerializer(required=False)
+    vehicle_license_plate = serializers.CharField(max_length=20)
+    vehicle_state = serializers.CharField(max_length=2, required=False, default='NY')
+    special_instructions = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate(self, data):
+        if ('windows' in data) == ('recurrence' in data):
+            raise serializers.ValidationError("Provide exactly one of windows or recurrence.")
+        
+        if 'recurrence' in data:
+            rule = data.pop('recurrence')
+            windows = expand_recurrence(
+                rule['start_time'], rule['end_time'], rule['frequency'],
+                weekdays=rule.get('weekdays'), count=rule.get('count'), until=rule.get('until'),
+            )
+        else:
+            windows = [(window['start_time'], window['end_time']) for window in data.pop('windows')]
+        
+        if not windows:
+            raise serializers.ValidationError("The recurrence does not produce any slots.")
+        if len(windows) > MAX_SERIES_WINDOWS:
+            raise serializers.ValidationError(f"A series can have at most {MAX_SERIES_WINDOWS} slots.")
+        
+        data['windows'] = windows
+        return data
+    
+    def create(self, validated_data):
+        parking_space = validated_data.pop('parking_space')
+        windows = validated_data.pop('windows')
+        user = validated_data.pop('user')
+        # Availability is checked by create_booking_series with one overlap
+        # query for the whole series (and again by the database on insert)
+        try:
+            return create_booking_series(user, parking_space, windows, **validated_data)
+        except BookingConflict as conflict:
+            raise serializers.ValidationError({'unavailable_slots': conflict.conflicts})
 
 
 class BookingReviewSerializer(serializers.ModelSerializer):
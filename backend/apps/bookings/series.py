@@ -0,0 +1,197 @@
+"""
+Multi-slot and recurring bookings.
+
+Commuters book the same spot every weekday; posting each slot separately
+repeats the validation queries, the row lock and the notification fan-out
+per slot. A series is validated and created in one go instead:
+
+- ``expand_recurrence`` turns a rule (daily/weekly, optional weekdays,
+  ``count`` or ``until``) into windows that keep their local wall-clock
+  time across DST changes;
+- ``series_verdicts`` checks every window against the listing schedule and
+  against existing bookings and holds with a single overlap query
+  (bookings.availability), plus overlaps between the windows themselves;
+- ``create_booking_series`` inserts all bookings with one ``bulk_create``
+  inside a transaction. The database overlap guard (bookings.conflicts)
+  still rejects a slot taken concurrently, in which case nothing is
+  created. Hosts and guests get one grouped notification per series, and
+  receivers of ``bookings_created`` refresh occupancy and summaries once.
+
+``bulk_create`` skips ``Booking.save()`` and per-row signals, so this
+module fills in the booking ID, duration and amounts itself.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from apps.listings.models import ParkingListing
+from apps.listings.schedule import DAY_NAMES, get_compiled_schedule
+from apps.notifications.services import NotificationService
+from .availability import _window_verdict, conflicting_bookings_by_listing, requires_host_approval
+from .conflicts import BookingConflict, conflict_guard_available, is_conflict_error, release_hold_slots
+from .models import Booking, BookingStatus
+from .transitions import bookings_created
+
+MAX_SERIES_WINDOWS = 60
+MAX_WINDOW_DURATION = timedelta(days=7)
+
+FREQUENCIES = ('daily', 'weekly')
+
+
+def expand_recurrence(start_time, end_time, frequency, weekdays=None, count=None, until=None):
+    """
+    Expand a recurrence rule into [(start, end)] windows.
+
+    The first window is ``start_time``-``end_time``; later ones repeat it
+    every day (``daily``) or every week (``weekly``), restricted to
+    ``weekdays`` (names, e.g. ``['monday', 'friday']``) when given. Stops
+    after ``count`` windows or on the last window starting on or before
+    the date ``until``, and never returns more than MAX_SERIES_WINDOWS + 1
+    windows so callers can reject oversized rules.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f'Unknown frequency: {frequency}')
+    if count is None and until is None:
+        raise ValueError('Either count or until is required')
+
+    local_start = timezone.localtime(start_time)
+    duration = end_time - start_time
+    tz = local_start.tzinfo
+    allowed_days = {DAY_NAMES.index(day) for day in weekdays} if weekdays else None
+    if frequency == 'weekly' and allowed_days is None:
+        allowed_days = {local_start.weekday()}
+
+    windows = []
+    day = local_start.date()
+    limit = MAX_SERIES_WINDOWS + 1 if count is None else min(count, MAX_SERIES_WINDOWS + 1)
+    while len(windows) < limit and (until is None or day <= until):
+        if allowed_days is None or day.weekday() in allowed_days:
+            window_start = timezone.make_aware(datetime.combine(day, local_start.time()), tz)
+            windows.append((window_start, window_start + duration))
+        day += timedelta(days=1)
+    return windows
+
+
+def series_verdicts(parking_space, windows, user=None):
+    """
+    Check every window of a series, returning one verdict per window in the
+    shape ``check_availability_batch`` uses. Holds placed by ``user`` do not
+    count as conflicts.
+    """
+    windows = sorted(windows)
+    conflicts = conflicting_bookings_by_listing([parking_space.pk], windows, exclude_holds_of=user)
+    listing_bookings = conflicts.get(parking_space.pk, [])
+    compiled = get_compiled_schedule(parking_space) if parking_space.availability_schedule else None
+
+    verdicts = []
+    previous_end = None
+    for start_time, end_time in windows:
+        verdict = _window_verdict(start_time, end_time, compiled, listing_bookings)
+        if verdict['available'] and end_time - start_time > MAX_WINDOW_DURATION:
+            verdict.update(available=False, reason='Booking duration cannot exceed 7 days')
+        elif verdict['available'] and previous_end is not None and start_time < previous_end:
+            verdict.update(available=False, reason='Time slot overlaps another slot in this series')
+        previous_end = max(previous_end or end_time, end_time)
+        verdicts.append(verdict)
+    return verdicts
+
+
+def _build_booking(user, parking_space, start_time, end_time, now, **details):
+    duration_hours = Decimal((end_time - start_time).total_seconds()) / Decimal(3600)
+    total_amount = (duration_hours * parking_space.hourly_rate).quantize(Decimal('0.01'))
+    booking = Booking(
+        user=user,
+        parking_space=parking_space,
+        start_time=start_time,
+        end_time=end_time,
+        duration_hours=duration_hours.quantize(Decimal('0.01')),
+        hourly_rate=parking_space.hourly_rate,
+        total_amount=total_amount,
+        platform_fee=(total_amount * Decimal('0.05')).quantize(Decimal('0.01')),
+        **details
+    )
+    booking.booking_id = booking.generate_booking_id()
+    if requires_host_approval(start_time, end_time, parking_space):
+        booking.status = BookingStatus.PENDING
+    else:
+        booking.status = BookingStatus.CONFIRMED
+        booking.confirmed_at = now
+    return booking
+
+
+@transaction.atomic
+def create_booking_series(user, parking_space, windows, **details):
+    """
+    Create one booking per window with a single INSERT.
+
+    Raises BookingConflict (and creates nothing) if any window is taken.
+    ``details`` are extra Booking fields (vehicle, special instructions).
+    """
+    connection = connections[Booking.objects.db]
+    if not conflict_guard_available(connection):
+        # No database overlap guard on this backend; serialize on the listing row
+        parking_space = ParkingListing.objects.select_for_update().get(pk=parking_space.pk)
+
+    verdicts = series_verdicts(parking_space, windows, user=user)
+    unavailable = [verdict for verdict in verdicts if not verdict['available']]
+    if unavailable:
+        raise BookingConflict(unavailable)
+
+    now = timezone.now()
+    bookings = [
+        _build_booking(user, parking_space, start_time, end_time, now, **details)
+        for start_time, end_time in sorted(windows)
+    ]
+    try:
+        with transaction.atomic():
+            release_hold_slots(parking_space.pk, windows, user_id=user.pk, now=now)
+            Booking.objects.bulk_create(bookings)
+    except IntegrityError as error:
+        if not is_conflict_error(error):
+            raise
+        raise BookingConflict([
+            verdict for verdict in series_verdicts(parking_space, windows, user=user)
+            if not verdict['available']
+        ])
+
+    if bookings[0].pk is None:
+        # Backends that can't return IDs from a bulk insert
+        bookings = list(Booking.objects.filter(
+            booking_id__in=[booking.booking_id for booking in bookings]
+        ).order_by('start_time'))
+
+    transaction.on_commit(lambda: notify_series_created(bookings))
+    bookings_created.send(
+        sender=Booking,
+        booking_ids=[booking.pk for booking in bookings],
+        parking_space_ids=[parking_space.pk],
+    )
+    return bookings
+
+
+def notify_series_created(bookings):
+    """Send the host and the guest one notification for a whole series."""
+    first, last = bookings[0], bookings[-1]
+    parking_space = first.parking_space
+    context = {
+        'booking_count': len(bookings),
+        'parking_space_title': parking_space.title,
+        'first_date_time': f"{first.start_time.strftime('%B %d, %Y')} at {first.start_time.strftime('%-I:%M %p')}",
+        'last_date': last.start_time.strftime('%B %d, %Y'),
+        'action_url': '/bookings',
+    }
+
+    NotificationService.send_notification(
+        user=parking_space.host,
+        template_type='NEW_BOOKING_SERIES',
+        context={**context, 'renter_name': first.user.get_full_name() or first.user.username},
+        channels=['IN_APP', 'EMAIL']
+    )
+    NotificationService.send_notification(
+        user=first.user,
+        template_type='BOOKING_SERIES_CONFIRMED',
+        context=context,
+        channels=['IN_APP', 'EMAIL']
+    )
@@ -1,29 +1,42 @@
-from django.db.models.signals import post_save, pre_save
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from datetime import timedelta
-from .models import Booking, BookingStatus
+from .conflicts import SLOTS_TABLE, install_conflict_guard
+from .jobs import CHECKIN_REMINDER_LEAD, EXPIRATION_WARNING_LEAD, schedule_job, schedule_new_bookings
+from .models import Booking, BookingStatus, ScheduledJob
+from .search import index_bookings, index_users
+from .summary import rebuild_for_bookings, record_status_change
+from .transitions import bookings_created, bookings_transitioned
 from apps.notifications.services import NotificationService
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+@receiver(post_migrate)
+def ensure_booking_conflict_guard(sender, using='default', **kwargs):
+    """
+    Repair the SQLite overlap triggers after migrations.
+
+    SQLite table rebuilds drop triggers; PostgreSQL's exclusion constraint
+    is managed by migration 0011 alone.
+    """
+    if getattr(sender, 'name', None) != 'apps.bookings':
+        return
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and SLOTS_TABLE in connection.introspection.table_names():
+        install_conflict_guard(connection)
+
+
 @receiver(pre_save, sender=Booking)
 def update_booking_timestamps(sender, instance, **kwargs):
     """Update booking timestamps when status changes"""
-    if instance.pk:
-        try:
-            old_instance = Booking.objects.get(pk=instance.pk)
-            
-            # Set confirmed_at when status changes to confirmed
-            if (old_instance.status != BookingStatus.CONFIRMED and 
-                instance.status == BookingStatus.CONFIRMED and 
-                not instance.confirmed_at):
-                instance.confirmed_at = timezone.now()
-                
-        except Booking.DoesNotExist:
-            pass
+    if instance.pk and instance.has_changed('status'):
+        # Set confirmed_at when status changes to confirmed
+        if instance.status == BookingStatus.CONFIRMED and not instance.confirmed_at:
+            instance.confirmed_at = timezone.now()
 
 
 @receiver(post_save, sender=Booking)
@@ -76,9 +89,13 @@ def handle_booking_creation(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=Booking)
-def handle_booking_status_change(sender, instance, **kwargs):
+def handle_booking_status_change(sender, instance, created, **kwargs):
     """Handle actions when booking status changes"""
-    if not kwargs.get('created'):
+    if created:
+        # Auto-confirmed and converted bookings are confirmed from the start
+        schedule_new_bookings([instance])
+    # Re-saving a booking without a status transition must not re-schedule reminders
+    elif 'status' in instance.changed_fields:
         # Check if booking was just confirmed
         if instance.status == BookingStatus.CONFIRMED:
             # Schedule check-in reminder
@@ -92,83 +109,90 @@ def handle_booking_status_change(sender, instance, **kwargs):
             schedule_expiration_warning(instance)
 
 
+@receiver(post_save, sender=Booking)
+def update_booking_summary(sender, instance, created, **kwargs):
+    """Keep the guest's and host's BookingSummary counters in step"""
+    if created:
+        record_status_change(instance, None, instance.status)
+    elif 'status' in instance.changed_fields:
+        record_status_change(instance, instance.original_value('status'), instance.status)
+
+
+@receiver(post_delete, sender=Booking)
+def remove_from_booking_summary(sender, instance, **kwargs):
+    """Take a deleted booking out of its guest's and host's summaries"""
+    record_status_change(instance, instance.original_value('status') or instance.status, None)
+
+
+@receiver(bookings_transitioned)
+@receiver(bookings_created)
+def rebuild_summaries_on_bulk_transition(sender, booking_ids, **kwargs):
+    """Recompute the summaries of everyone involved in a bulk transition or insert"""
+    rebuild_for_bookings(booking_ids)
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_search_tokens(sender, instance, created, **kwargs):
+    """Index new bookings and changed license plates for the admin lookup"""
+    if created or 'vehicle_license_plate' in instance.changed_fields:
+        index_bookings([instance])
+
+
+@receiver(bookings_created)
+def schedule_created_bookings(sender, booking_ids, **kwargs):
+    """Schedule the notifications of confirmed bookings inserted in bulk"""
+    schedule_new_bookings(
+        Booking.objects.filter(id__in=booking_ids, status=BookingStatus.CONFIRMED).only('id', 'status', 'start_time', 'end_time')
+    )
+
+
+@receiver(bookings_created)
+def index_created_bookings(sender, booking_ids, **kwargs):
+    """Index bookings inserted in bulk"""
+    index_bookings(Booking.objects.filter(id__in=booking_ids).only('id', 'booking_id', 'vehicle_license_plate'))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_guest_search_tokens(sender, instance, update_fields=None, **kwargs):
+    """Re-index a user's email and names for the admin booking lookup"""
+    if update_fields is not None and not {'email', 'first_name', 'last_name'} & set(update_fields):
+        return
+    index_users([instance])
+
+
 def schedule_checkin_reminder(booking):
     """
-    Schedule a check-in reminder for a confirmed booking.
-    Uses Celery if available, otherwise relies on periodic task.
+    Schedule a check-in reminder 15 minutes before a confirmed booking starts.
+    Stored as a ScheduledJob and sent by the dispatcher (see bookings.jobs).
     """
     try:
-        # Only schedule if booking starts more than 15 minutes from now
-        now = timezone.now()
-        time_until_start = booking.start_time - now
-        
-        if time_until_start <= timedelta(minutes=15):
-            logger.info(f"Booking {booking.booking_id} starts too soon to schedule reminder")
+        if booking.start_time <= timezone.now():
+            logger.info(f"Booking {booking.booking_id} has already started; no reminder scheduled")
             return
         
-        # Calculate when to send the reminder (15 minutes before start)
-        reminder_time = booking.start_time - timedelta(minutes=15)
+        # Bookings starting within 15 minutes are reminded right away
+        reminder_time = max(booking.start_time - CHECKIN_REMINDER_LEAD, timezone.now())
+        schedule_job(booking, ScheduledJob.Kind.CHECKIN_REMINDER, reminder_time)
+        logger.info(f"Scheduled check-in reminder for booking {booking.booking_id} at {reminder_time}")
         
-        # Try to use Celery for precise scheduling
-        try:
-            from .tasks import send_scheduled_checkin_reminder
-            
-            # Schedule the task to run at the exact reminder time
-            send_scheduled_checkin_reminder.apply_async(
-                args=[booking.id],
-                eta=reminder_time
-            )
-            
-            logger.info(f"Scheduled check-in reminder for booking {booking.booking_id} at {reminder_time}")
-            
-        except ImportError:
-            # Celery not available, will rely on periodic task
-            logger.info(f"Celery not available, check-in reminder for booking {booking.booking_id} will be handled by periodic task")
-            
-        except Exception as e:
-            logger.error(f"Error scheduling check-in reminder for booking {booking.booking_id}: {str(e)}")
-            # Fall back to periodic task processing
-            
     except Exception as e:
         logger.error(f"Error in schedule_checkin_reminder: {str(e)}")
 
 
 def schedule_expiration_warning(booking):
     """
-    Schedule an expiration warning for an active booking.
-    Uses Celery if available, otherwise relies on periodic task.
+    Schedule an expiration warning 30 minutes before a booking ends.
+    Stored as a ScheduledJob and sent by the dispatcher (see bookings.jobs).
     """
     try:
         # Only schedule if booking ends more than 30 minutes from now
-        now = timezone.now()
-        time_until_end = booking.end_time - now
-        
-        if time_until_end <= timedelta(minutes=30):
+        warning_time = booking.end_time - EXPIRATION_WARNING_LEAD
+        if warning_time <= timezone.now():
             logger.info(f"Booking {booking.booking_id} ends too soon to schedule expiration warning")
             return
         
-        # Calculate when to send the warning (30 minutes before end)
-        warning_time = booking.end_time - timedelta(minutes=30)
+        schedule_job(booking, ScheduledJob.Kind.EXPIRATION_WARNING, warning_time)
+        logger.info(f"Scheduled expiration warning for booking {booking.booking_id} at {warning_time}")
         
-        # Try to use Celery for precise scheduling
-        try:
-            from .tasks import send_scheduled_expiration_warning
-            
-            # Schedule the task to run at the exact warning time
-            send_scheduled_expiration_warning.apply_async(
-                args=[booking.id],
-                eta=warning_time
-            )
-            
-            logger.info(f"Scheduled expiration warning for booking {booking.booking_id} at {warning_time}")
-            
-        except ImportError:
-            # Celery not available, will rely on periodic task
-            logger.info(f"Celery not available, expiration warning for booking {booking.booking_id} will be handled by periodic task")
-            
-        except Exception as e:
-            logger.error(f"Error scheduling expiration warning for booking {booking.booking_id}: {str(e)}")
-            # Fall back to periodic task processing
-            
     except Exception as e:
-        logger.error(f"Error in schedule_expiration_warning: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error in schedule_expiration_warning: {str(e)}")
@@ -0,0 +1,175 @@
+"""
+Precomputed booking summaries per user, as guest and as host.
+
+``BookingViewSet.stats`` used to run five COUNTs and sum ``total_amount``
+in Python over every completed booking on each call. BookingSummary keeps
+those numbers instead:
+
+- ``record_status_change`` adjusts a guest's and a host's row with
+  ``F()`` updates whenever a booking is created, changes status or is
+  deleted (wired up in bookings.signals);
+- bulk transitions (bookings.transitions) don't know each row's previous
+  status, so their affected users are rebuilt from the bookings table;
+- ``rebuild_booking_summaries`` recomputes rows with one GROUP BY per role
+  and backs the ``rebuild_booking_summaries`` reconciliation command.
+
+A host's own bookings of their listings only count in their guest row, so
+adding a user's two rows matches the distinct bookings the stats endpoint
+used to count.
+"""
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.listings.models import ParkingListing
+from .models import BookingStatus, BookingSummary
+
+# Booking status -> counter column
+STATUS_COLUMNS = {
+    BookingStatus.PENDING: 'pending_bookings',
+    BookingStatus.CONFIRMED: 'confirmed_bookings',
+    BookingStatus.ACTIVE: 'active_bookings',
+    BookingStatus.COMPLETED: 'completed_bookings',
+    BookingStatus.CANCELLED: 'cancelled_bookings',
+    BookingStatus.NO_SHOW: 'no_show_bookings',
+}
+
+# Summary role -> path from a booking to the user it belongs to
+ROLE_USER_FIELDS = {
+    BookingSummary.Role.GUEST: 'user_id',
+    BookingSummary.Role.HOST: 'parking_space__host_id',
+}
+
+SUMMARY_FIELDS = ('total_bookings', *STATUS_COLUMNS.values(), 'completed_amount')
+
+
+def _amount(booking):
+    return Decimal(str(booking.total_amount or 0)).quantize(Decimal('0.01'))
+
+
+def record_status_change(booking, old_status, new_status):
+    """
+    Move a booking between counters for its guest and its host.
+
+    ``old_status`` is None for a new booking and ``new_status`` is None for
+    a deleted one.
+    """
+    if old_status == new_status:
+        return
+
+    updates = {}
+    if old_status is None:
+        updates['total_bookings'] = F('total_bookings') + 1
+    if new_status is None:
+        updates['total_bookings'] = F('total_bookings') - 1
+    if old_status in STATUS_COLUMNS:
+        column = STATUS_COLUMNS[old_status]
+        updates[column] = F(column) - 1
+    if new_status in STATUS_COLUMNS:
+        column = STATUS_COLUMNS[new_status]
+        updates[column] = F(column) + 1
+    if BookingStatus.COMPLETED in (old_status, new_status):
+        sign = 1 if new_status == BookingStatus.COMPLETED else -1
+        updates['completed_amount'] = F('completed_amount') + sign * _amount(booking)
+
+    rows = [(booking.user_id, BookingSummary.Role.GUEST)]
+    if booking._meta.get_field('parking_space').is_cached(booking):
+        host_id = booking.parking_space.host_id
+    else:
+        host_id = ParkingListing.objects.filter(pk=booking.parking_space_id).values_list('host_id', flat=True).first()
+    if host_id is not None and host_id != booking.user_id:
+        rows.append((host_id, BookingSummary.Role.HOST))
+
+    with transaction.atomic():
+        for user_id, role in rows:
+            # A deleted booking only touches existing rows: during a cascade
+            # the user (and their summaries) may be on the way out as well
+            if new_status is not None:
+                BookingSummary.objects.get_or_create(user_id=user_id, role=role)
+            BookingSummary.objects.filter(user_id=user_id, role=role).update(**updates)
+
+
+def summary_rows(user_ids=None, app_registry=None):
+    """
+    Compute summaries from the bookings table with one GROUP BY per role.
+
+    Yields (user_id, role, {field: value}).
+    """
+    registry = app_registry or django_apps
+    Booking = registry.get_model('bookings', 'Booking')
+
+    aggregates = {'total_bookings': Count('id')}
+    for status, column in STATUS_COLUMNS.items():
+        aggregates[column] = Count('id', filter=Q(status=status))
+    aggregates['completed_amount'] = Coalesce(
+        Sum('total_amount', filter=Q(status=BookingStatus.COMPLETED)),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+    for role, user_field in ROLE_USER_FIELDS.items():
+        bookings = Booking.objects.all()
+        if role == BookingSummary.Role.HOST:
+            bookings = bookings.exclude(user_id=F('parking_space__host_id'))
+        if user_ids is not None:
+            bookings = bookings.filter(**{f'{user_field}__in': user_ids})
+        for row in bookings.values(user_field).annotate(**aggregates).order_by():
+            user_id = row.pop(user_field)
+            yield user_id, role, row
+
+
+def rebuild_booking_summaries(user_ids=None, app_registry=None):
+    """
+    Replace the summaries of the given users (everyone if None) with fresh
+    ones computed from the bookings table. Returns the number of rows written.
+    """
+    registry = app_registry or django_apps
+    Summary = registry.get_model('bookings', 'BookingSummary')
+
+    if user_ids is not None:
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return 0
+
+    with transaction.atomic():
+        rows = [
+            Summary(user_id=user_id, role=role, **values)
+            for user_id, role, values in summary_rows(user_ids, app_registry=registry)
+        ]
+        stale = Summary.objects.all()
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+        stale.delete()
+        Summary.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
+def rebuild_for_bookings(booking_ids):
+    """Rebuild the guests' and hosts' summaries for a set of bookings."""
+    from .models import Booking
+
+    user_ids = set()
+    for guest_id, host_id in Booking.objects.filter(id__in=booking_ids).values_list(
+        'user_id', 'parking_space__host_id'
+    ):
+        user_ids.update((guest_id, host_id))
+    return rebuild_booking_summaries(user_ids)
+
+
+def get_user_summary(user):
+    """
+    A user's guest and host summaries added together, as a dict (all
+    zeros for an anonymous user).
+    """
+    totals = dict.fromkeys(SUMMARY_FIELDS, 0)
+    totals['completed_amount'] = Decimal('0.00')
+    if not user.is_authenticated:
+        return totals
+    for row in BookingSummary.objects.filter(user=user).values(*SUMMARY_FIELDS):
+        for field in SUMMARY_FIELDS:
+            totals[field] += row[field]
+    return totals
@@ -2,9 +2,13 @@
 Celery tasks for booking automation.
 """
 from celery import shared_task
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
-from .models import Booking, BookingStatus
+from .models import Booking, BookingStatus, ScheduledJob
+from .holds import expire_holds
+from .jobs import deliver, dispatch_due_jobs, record_delivery
+from .transitions import bulk_transition
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,25 +31,16 @@ def auto_checkout_bookings():
         actual_end_time__isnull=True,  # Not already checked out
     )
     
-    checkout_count = 0
-    
-    for booking in bookings_to_checkout:
-        try:
-            # Set checkout time to exactly 1 hour after check-in
-            checkout_time = booking.actual_start_time + timedelta(hours=1)
-            booking.actual_end_time = checkout_time
-            booking.auto_checkout = True
-            booking.status = BookingStatus.COMPLETED
-            booking.save()
-            
-            checkout_count += 1
-            logger.info(f'Auto-checked out booking {booking.booking_id} at {checkout_time}')
-            
-        except Exception as e:
-            logger.error(f'Failed to auto-checkout booking {booking.booking_id}: {str(e)}')
+    # One UPDATE for the whole batch; checkout time is exactly 1 hour after check-in
+    checked_out = bulk_transition(
+        bookings_to_checkout,
+        BookingStatus.COMPLETED,
+        actual_end_time=F('actual_start_time') + timedelta(hours=1),
+        auto_checkout=True,
+    )
     
-    logger.info(f'Auto-checkout task completed. Checked out {checkout_count} bookings.')
-    return checkout_count
+    logger.info(f'Auto-checkout task completed. Checked out {len(checked_out)} bookings.')
+    return len(checked_out)
 
 
 @shared_task  
@@ -64,18 +59,66 @@ def check_expired_bookings():
         actual_start_time__isnull=True,  # Never checked in
     )
     
-    no_show_count = 0
+    no_shows = bulk_transition(expired_bookings, BookingStatus.NO_SHOW)
     
-    for booking in expired_bookings:
-        try:
-            booking.status = BookingStatus.NO_SHOW
-            booking.save()
-            
-            no_show_count += 1
-            logger.info(f'Marked booking {booking.booking_id} as no-show')
-            
-        except Exception as e:
-            logger.error(f'Failed to mark booking {booking.booking_id} as no-show: {str(e)}')
+    logger.info(f'No-show check completed. Marked {len(no_shows)} bookings as no-show.')
+    return len(no_shows)
+
+
+@shared_task
+def expire_booking_holds():
+    """
+    Delete expired booking holds that were never converted, cancelling
+    their payment intents. Holds already stop blocking their slot at expiry.
+    """
+    expired_count = expire_holds()
+    logger.info(f'Hold expiry completed. Deleted {expired_count} expired holds.')
+    return expired_count
+
+
+@shared_task
+def dispatch_scheduled_jobs():
+    """
+    Send every due check-in reminder and expiration warning.
+    Run every minute via celery beat; safe to run on several workers at once.
+    """
+    counts = dispatch_due_jobs()
+    logger.info(f'Scheduled job dispatch completed: {counts}')
+    return counts
+
+
+@shared_task
+def process_checkin_reminders():
+    """Send due check-in reminders only."""
+    return dispatch_due_jobs(kinds=[ScheduledJob.Kind.CHECKIN_REMINDER])
+
+
+@shared_task
+def process_expiration_warnings():
+    """Send due expiration warnings only."""
+    return dispatch_due_jobs(kinds=[ScheduledJob.Kind.EXPIRATION_WARNING])
+
+
+def _send_now(booking_id, kind):
+    try:
+        booking = Booking.objects.select_related('user', 'parking_space').get(id=booking_id)
+    except Booking.DoesNotExist:
+        logger.warning(f'Booking {booking_id} not found for {kind}')
+        return False
     
-    logger.info(f'No-show check completed. Marked {no_show_count} bookings as no-show.')
-    return no_show_count
\ No newline at end of file
+    sent = deliver(kind, booking)
+    if sent:
+        record_delivery(booking, kind)
+    return sent
+
+
+@shared_task
+def send_checkin_reminder(booking_id):
+    """Send a check-in reminder immediately and record it so the dispatcher won't repeat it."""
+    return _send_now(booking_id, ScheduledJob.Kind.CHECKIN_REMINDER)
+
+
+@shared_task
+def send_expiration_warning(booking_id):
+    """Send an expiration warning immediately and record it so the dispatcher won't repeat it."""
+    return _send_now(booking_id, ScheduledJob.Kind.EXPIRATION_WARNING)
@@ -0,0 +1,669 @@
+"""
+Basic tests for bookings app.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+OPEN_ALL_WEEK = {
+    day: {'available': True, 'start': '00:00', 'end': '23:59'}
+    for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+}
+
+
+def create_user(username, **kwargs):
+    """Create a user named ``username`` with a matching example.com email."""
+    kwargs.setdefault('email', f'{username}@example.com')
+    return User.objects.create_user(username=username, password='testpass123', **kwargs)
+
+
+def create_listing(host, **kwargs):
+    """Create an approved listing with sensible defaults."""
+    from apps.listings.models import ParkingListing
+
+    defaults = {
+        'title': 'Test Parking',
+        'address': '123 Test St',
+        'borough': 'Manhattan',
+        'space_type': 'garage',
+        'hourly_rate': Decimal('10.00'),
+        'daily_rate': Decimal('50.00'),
+        'weekly_rate': Decimal('300.00'),
+        'approval_status': ParkingListing.ApprovalStatus.APPROVED,
+    }
+    defaults.update(kwargs)
+    return ParkingListing.objects.create(host=host, **defaults)
+
+
+def create_booking(user, listing, start_time, end_time, **kwargs):
+    """Create a booking with sensible defaults."""
+    from .models import Booking
+
+    defaults = {
+        'hourly_rate': listing.hourly_rate,
+        'vehicle_license_plate': 'ABC123',
+        'status': 'confirmed',
+    }
+    defaults.update(kwargs)
+    return Booking.objects.create(
+        user=user, parking_space=listing, start_time=start_time, end_time=end_time, **defaults
+    )
+
+
+class BatchAvailabilityTest(TestCase):
+    """Test the batch availability endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        tomorrow = (timezone.now() + timedelta(days=1)).replace(hour=15, minute=0, second=0, microsecond=0)
+        self.start = tomorrow
+        self.end = tomorrow + timedelta(hours=2)
+
+    def test_verdict_per_listing(self):
+        """Test conflicts, schedule violations and missing listings in one call."""
+        free = create_listing(self.host, title='Free', availability_schedule=OPEN_ALL_WEEK)
+        booked = create_listing(self.host, title='Booked', availability_schedule=OPEN_ALL_WEEK)
+        closed = create_listing(self.host, title='Closed', availability_schedule={
+            day: {'available': False} for day in OPEN_ALL_WEEK
+        })
+        create_booking(self.guest, booked, self.start + timedelta(hours=1), self.end + timedelta(hours=1))
+
+        # Listings, one overlap query; schedules come from the compiled cache
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/v1/bookings/bookings/check_availability_batch/', {
+                'parking_space_ids': [free.id, booked.id, closed.id, 999999],
+                'start_time': self.start.isoformat(),
+                'end_time': self.end.isoformat(),
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = {item['parking_space_id']: item for item in response.data['results']}
+        self.assertTrue(results[free.id]['available'])
+        self.assertFalse(results[booked.id]['available'])
+        self.assertEqual(len(results[booked.id]['windows'][0]['conflicts']), 1)
+        self.assertIn('not available on', results[closed.id]['windows'][0]['reason'])
+        self.assertEqual(results[999999]['reason'], 'Parking space not found')
+
+    def test_multiple_windows(self):
+        """Test that a listing is only available if every window is."""
+        listing = create_listing(self.host, availability_schedule=OPEN_ALL_WEEK)
+        create_booking(self.guest, listing, self.start, self.end)
+        later = self.end + timedelta(hours=3)
+
+        response = self.client.post('/api/v1/bookings/bookings/check_availability_batch/', {
+            'parking_space_ids': [listing.id],
+            'windows': [
+                {'start_time': self.start.isoformat(), 'end_time': self.end.isoformat()},
+                {'start_time': later.isoformat(), 'end_time': (later + timedelta(hours=1)).isoformat()},
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        result = response.data['results'][0]
+        self.assertFalse(result['available'])
+        self.assertEqual([window['available'] for window in result['windows']], [False, True])
+
+
+class BookingConflictGuardTest(TestCase):
+    """Test the database-enforced booking overlap guard."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        self.listing = create_listing(self.host)
+        self.start = timezone.now() + timedelta(days=1)
+        self.end = self.start + timedelta(hours=2)
+
+    def test_overlap_rejected_with_conflicts(self):
+        """Test that an overlapping booking is rejected and the conflict reported."""
+        from django.db import connection
+        from .conflicts import BookingConflict, conflict_guard_available, save_booking
+        from .models import Booking
+
+        self.assertTrue(conflict_guard_available(connection))
+        create_booking(self.guest, self.listing, self.start, self.end)
+
+        overlapping = Booking(
+            user=self.guest, parking_space=self.listing,
+            start_time=self.start + timedelta(hours=1), end_time=self.end + timedelta(hours=1),
+            hourly_rate=Decimal('10.00'), vehicle_license_plate='XYZ789', status='pending',
+        )
+        with self.assertRaises(BookingConflict) as raised:
+            save_booking(overlapping)
+        self.assertEqual(len(raised.exception.conflicts), 1)
+
+        # Back-to-back and cancelled bookings don't conflict
+        create_booking(self.guest, self.listing, self.end, self.end + timedelta(hours=1))
+        create_booking(self.guest, self.listing, self.start, self.end, status='cancelled')
+
+    def test_reactivating_overlap_rejected(self):
+        """Test that an update cannot make two bookings overlap."""
+        from .conflicts import BookingConflict, save_booking
+
+        create_booking(self.guest, self.listing, self.start, self.end)
+        cancelled = create_booking(self.guest, self.listing, self.start, self.end, status='cancelled')
+
+        cancelled.status = 'confirmed'
+        with self.assertRaises(BookingConflict):
+            save_booking(cancelled)
+
+    def test_create_endpoint_reports_conflict(self):
+        """Test that the serializer turns a guard rejection into a validation error."""
+        from rest_framework import serializers
+        from .serializers import CreateBookingSerializer
+
+        create_booking(self.guest, self.listing, self.start, self.end)
+        serializer = CreateBookingSerializer()
+        with self.assertRaises(serializers.ValidationError):
+            serializer.create({
+                'parking_space': self.listing,
+                'start_time': self.start,
+                'end_time': self.end,
+                'vehicle_license_plate': 'XYZ789',
+                'user': self.guest,
+            })
+
+
+class BookingHoldTest(TestCase):
+    """Test short-lived booking holds."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        self.other_guest = create_user('other')
+        self.listing = create_listing(self.host, availability_schedule=OPEN_ALL_WEEK)
+        self.start = (timezone.now() + timedelta(days=1)).replace(hour=15, minute=0, second=0, microsecond=0)
+        self.end = self.start + timedelta(hours=2)
+
+    def hold(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/v1/bookings/bookings/hold/', {
+            'parking_space': self.listing.id,
+            'start_time': self.start.isoformat(),
+            'end_time': self.end.isoformat(),
+            'vehicle_license_plate': 'ABC123',
+        }, format='json')
+
+    def test_hold_blocks_slot(self):
+        """Test that a hold blocks other users until it expires."""
+        from .holds import expire_holds
+        from .models import BookingHold
+
+        response = self.hold(self.guest)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('expires_at', response.data)
+
+        self.assertEqual(self.hold(self.other_guest).status_code, 400)
+        # Holding again replaces the guest's own hold
+        self.assertEqual(self.hold(self.guest).status_code, 201)
+        self.assertEqual(BookingHold.objects.count(), 1)
+
+        response = self.client.post('/api/v1/bookings/bookings/check_availability_batch/', {
+            'parking_space_ids': [self.listing.id],
+            'start_time': self.start.isoformat(),
+            'end_time': self.end.isoformat(),
+        }, format='json')
+        self.assertEqual(response.data['results'][0]['windows'][0]['conflicts'][0]['status'], 'held')
+
+        BookingHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.hold(self.other_guest).status_code, 201)
+        self.assertEqual(expire_holds(now=timezone.now() + timedelta(hours=1)), 2)
+
+    def test_guard_rejects_booking_over_hold(self):
+        """Test that the database rejects another user's booking over a hold."""
+        from .conflicts import BookingConflict, save_booking
+        from .models import Booking, BookingHold, BookingSlot
+
+        self.hold(self.guest)
+        overlapping = Booking(
+            user=self.other_guest, parking_space=self.listing,
+            start_time=self.start + timedelta(hours=1), end_time=self.end + timedelta(hours=1),
+            hourly_rate=Decimal('10.00'), vehicle_license_plate='XYZ789', status='confirmed',
+        )
+        with self.assertRaises(BookingConflict) as raised:
+            save_booking(overlapping)
+        self.assertEqual(raised.exception.conflicts[0]['status'], 'held')
+
+        # The guest may book over their own hold, and an expired hold frees its slot
+        own = create_booking(self.guest, self.listing, self.start, self.end, status='cancelled')
+        own.status = 'confirmed'
+        save_booking(own)
+        self.assertEqual(BookingSlot.objects.get().booking, own)
+
+        own.status = 'cancelled'
+        own.save()
+        self.hold(self.guest)
+        BookingHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        save_booking(overlapping)
+        self.assertEqual(BookingSlot.objects.get().booking, overlapping)
+
+    def test_convert_hold(self):
+        """Test that a paid hold becomes a confirmed booking exactly once."""
+        from .holds import HoldUnavailable, convert_hold
+        from .models import BookingStatus
+
+        hold_id = self.hold(self.guest).data['hold_id']
+
+        booking = convert_hold(hold_id, 'pi_test_123')
+        self.assertEqual(booking.status, BookingStatus.CONFIRMED)
+        self.assertEqual(booking.user, self.guest)
+        self.assertEqual((booking.start_time, booking.end_time), (self.start, self.end))
+        self.assertEqual(convert_hold(hold_id, 'pi_test_123'), booking)
+        self.assertEqual(booking.slot.hold, None)
+
+        with self.assertRaises(HoldUnavailable):
+            convert_hold('00000000-0000-0000-0000-000000000000')
+
+
+class BulkTransitionTest(TestCase):
+    """Test set-based status transitions used by the periodic tasks."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        self.listing = create_listing(self.host)
+
+    def test_auto_checkout_and_no_show(self):
+        """Test that each task transitions its bookings with one batched event."""
+        from .models import Booking, BookingStatus
+        from .tasks import auto_checkout_bookings, check_expired_bookings
+        from .transitions import bookings_transitioned
+
+        now = timezone.now()
+        checked_in_at = now - timedelta(hours=2)
+        overdue = [
+            create_booking(
+                self.guest, self.listing, now - timedelta(hours=hours + 3), now - timedelta(hours=hours + 1),
+                status=BookingStatus.ACTIVE, actual_start_time=checked_in_at,
+            )
+            for hours in (0, 3)
+        ]
+        no_show = create_booking(
+            self.guest, self.listing, now - timedelta(hours=1), now + timedelta(hours=1),
+        )
+        still_parked = create_booking(
+            self.guest, self.listing, now + timedelta(hours=2), now + timedelta(hours=3),
+            status=BookingStatus.ACTIVE, actual_start_time=now - timedelta(minutes=10),
+        )
+
+        events = []
+
+        def record(sender, **kwargs):
+            events.append(kwargs)
+
+        bookings_transitioned.connect(record)
+        try:
+            self.assertEqual(auto_checkout_bookings(), 2)
+            self.assertEqual(check_expired_bookings(), 1)
+            # A second, overlapping run finds nothing left to do
+            self.assertEqual(auto_checkout_bookings(), 0)
+        finally:
+            bookings_transitioned.disconnect(record)
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(sorted(events[0]['booking_ids']), sorted(booking.id for booking in overdue))
+        self.assertEqual(events[0]['parking_space_ids'], [self.listing.id])
+        self.assertEqual(events[1]['booking_ids'], [no_show.id])
+
+        for booking in overdue:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, BookingStatus.COMPLETED)
+            self.assertTrue(booking.auto_checkout)
+            self.assertEqual(booking.actual_end_time, checked_in_at + timedelta(hours=1))
+        self.assertEqual(Booking.objects.get(pk=no_show.pk).status, BookingStatus.NO_SHOW)
+        self.assertEqual(Booking.objects.get(pk=still_parked.pk).status, BookingStatus.ACTIVE)
+
+    def test_filter_across_relations_with_and_without_returning(self):
+        """Test that both UPDATE paths handle filters spanning the listing."""
+        from unittest.mock import patch
+        from .models import Booking, BookingStatus
+        from .transitions import bulk_transition
+
+        now = timezone.now()
+        other_listing = create_listing(self.guest)
+        hosted = create_booking(self.guest, self.listing, now + timedelta(hours=1), now + timedelta(hours=2))
+        other = create_booking(self.host, other_listing, now + timedelta(hours=1), now + timedelta(hours=2))
+
+        queryset = Booking.objects.filter(parking_space__host=self.host)
+        self.assertEqual(bulk_transition(queryset, BookingStatus.ACTIVE), [hosted.id])
+        with patch('apps.bookings.transitions._can_update_returning', return_value=False):
+            self.assertEqual(bulk_transition(queryset, BookingStatus.CANCELLED), [hosted.id])
+
+        self.assertEqual(Booking.objects.get(pk=hosted.pk).status, BookingStatus.CANCELLED)
+        self.assertEqual(Booking.objects.get(pk=other.pk).status, BookingStatus.CONFIRMED)
+
+
+class BookingStatusTrackingTest(TestCase):
+    """Test status-transition hooks driven by the field tracker."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        self.listing = create_listing(self.host)
+        start = timezone.now() + timedelta(days=1)
+        self.booking = create_booking(self.guest, self.listing, start, start + timedelta(hours=2), status='pending')
+
+    def test_confirmation_hooks_fire_once(self):
+        """Test that re-saving a confirmed booking does not re-schedule reminders."""
+        from unittest import mock
+        from .models import Booking, BookingStatus
+
+        booking = Booking.objects.get(pk=self.booking.pk)
+        self.assertEqual(booking.changed_fields, {})
+
+        booking.status = BookingStatus.CONFIRMED
+        self.assertEqual(booking.changed_fields, {'status': BookingStatus.PENDING})
+
+        with mock.patch('apps.bookings.signals.schedule_checkin_reminder') as reminder:
+            booking.save()
+            booking.special_instructions = 'Gate code 1234'
+            booking.save()
+
+        reminder.assert_called_once_with(booking)
+        self.assertIsNotNone(booking.confirmed_at)
+        self.assertEqual(booking.changed_fields, {})
+
+
+class ScheduledJobTest(TestCase):
+    """Test the scheduled notification jobs and their dispatcher."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        self.listing = create_listing(self.host)
+        self.start = timezone.now() + timedelta(hours=1)
+
+    def test_confirming_schedules_jobs_once(self):
+        """Test that confirmation creates one job per kind, however often it is saved."""
+        from .models import BookingStatus, ScheduledJob
+
+        booking = create_booking(self.guest, self.listing, self.start, self.start + timedelta(hours=2), status='pending')
+        booking.status = BookingStatus.CONFIRMED
+        booking.save()
+        booking.status = BookingStatus.ACTIVE
+        booking.save()
+
+        jobs = {job.kind: job for job in ScheduledJob.objects.filter(booking=booking)}
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(jobs[ScheduledJob.Kind.CHECKIN_REMINDER].due_at, self.start - timedelta(minutes=15))
+        self.assertEqual(
+            jobs[ScheduledJob.Kind.EXPIRATION_WARNING].due_at, self.start + timedelta(hours=1, minutes=30)
+        )
+
+    def test_bookings_created_confirmed_get_jobs(self):
+        """Test that bookings confirmed from the start, one at a time or in bulk, get both jobs."""
+        from .models import ScheduledJob
+        from .series import create_booking_series
+
+        booking = create_booking(self.guest, self.listing, self.start, self.start + timedelta(hours=2))
+        self.assertEqual(
+            set(ScheduledJob.objects.filter(booking=booking).values_list('kind', flat=True)),
+            {ScheduledJob.Kind.CHECKIN_REMINDER, ScheduledJob.Kind.EXPIRATION_WARNING}
+        )
+
+        listing = create_listing(self.host, availability_schedule=OPEN_ALL_WEEK)
+        later = timezone.localtime().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        series = create_booking_series(
+            self.guest, listing,
+            [(later, later + timedelta(hours=2)), (later + timedelta(days=1), later + timedelta(days=1, hours=2))],
+            vehicle_license_plate='ABC123',
+        )
+        self.assertEqual(ScheduledJob.objects.filter(booking__in=series).count(), 4)
+
+    def test_dispatch_sends_due_jobs_once(self):
+        """Test that due jobs are sent once and ineligible bookings are skipped."""
+        from unittest import mock
+        from .jobs import dispatch_due_jobs, schedule_job
+        from .models import ScheduledJob
+
+        confirmed = create_booking(self.guest, self.listing, self.start, self.start + timedelta(hours=1))
+        cancelled = create_booking(
+            self.guest, self.listing, self.start + timedelta(hours=2), self.start + timedelta(hours=3),
+            status='cancelled',
+        )
+        due = timezone.now() - timedelta(minutes=1)
+        schedule_job(confirmed, ScheduledJob.Kind.CHECKIN_REMINDER, due)
+        schedule_job(cancelled, ScheduledJob.Kind.CHECKIN_REMINDER, due)
+        schedule_job(confirmed, ScheduledJob.Kind.EXPIRATION_WARNING, timezone.now() + timedelta(hours=1))
+
+        with mock.patch('apps.bookings.jobs.NotificationService.send_notification') as send:
+            counts = dispatch_due_jobs(batch_size=1)
+            self.assertEqual(dispatch_due_jobs()['sent'], 0)
+
+        self.assertEqual((counts['sent'], counts['skipped']), (1, 1))
+        send.assert_called_once()
+        self.assertEqual(send.call_args.kwargs['template_type'], 'CHECKIN_REMINDER')
+        self.assertEqual(
+            ScheduledJob.objects.get(booking=confirmed, kind=ScheduledJob.Kind.EXPIRATION_WARNING).state,
+            ScheduledJob.State.PENDING,
+        )
+
+
+class BookingSummaryTest(TestCase):
+    """Test the precomputed per-user booking summaries."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        self.listing = create_listing(self.host)
+        self.start = timezone.now() + timedelta(days=1)
+
+    def summaries(self):
+        from .models import BookingSummary
+        from .summary import SUMMARY_FIELDS
+
+        return {
+            (row.pop('user_id'), row.pop('role')): row
+            for row in BookingSummary.objects.values('user_id', 'role', *SUMMARY_FIELDS)
+        }
+
+    def test_summary_follows_booking_changes(self):
+        """Test that incremental updates match a rebuild and back the stats endpoint."""
+        from .models import Booking, BookingStatus
+        from .summary import rebuild_booking_summaries
+        from .transitions import bulk_transition
+
+        first = create_booking(self.guest, self.listing, self.start, self.start + timedelta(hours=2))
+        second = create_booking(
+            self.guest, self.listing, self.start + timedelta(hours=3), self.start + timedelta(hours=4),
+        )
+        create_booking(
+            self.host, self.listing, self.start + timedelta(hours=5), self.start + timedelta(hours=6),
+            status='pending',
+        )
+        first.status = BookingStatus.COMPLETED
+        first.save()
+        bulk_transition(Booking.objects.filter(pk=second.pk), BookingStatus.CANCELLED)
+
+        incremental = self.summaries()
+        self.assertEqual(incremental[(self.guest.id, 'guest')]['completed_amount'], Decimal('20.00'))
+        self.assertEqual(incremental[(self.guest.id, 'guest')]['cancelled_bookings'], 1)
+        self.assertEqual(incremental[(self.host.id, 'host')]['total_bookings'], 2)
+        self.assertEqual(incremental[(self.host.id, 'guest')]['pending_bookings'], 1)
+
+        rebuild_booking_summaries()
+        self.assertEqual(self.summaries(), incremental)
+
+        client = APIClient()
+        client.force_authenticate(user=self.host)
+        response = client.get('/api/v1/bookings/bookings/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_bookings'], 3)
+        self.assertEqual(response.data['completed_bookings'], 1)
+        self.assertEqual(response.data['upcoming_bookings'], 1)
+
+        response = APIClient().get('/api/v1/bookings/bookings/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_bookings'], 0)
+
+        first.delete()
+        self.assertEqual(self.summaries()[(self.guest.id, 'guest')]['total_bookings'], 1)
+
+
+class BookingSeriesTest(TestCase):
+    """Test multi-slot and recurring booking creation."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+        self.listing = create_listing(self.host, availability_schedule=OPEN_ALL_WEEK)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.guest)
+        self.start = timezone.localtime().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def book_series(self, **recurrence):
+        return self.client.post('/api/v1/bookings/bookings/series/', {
+            'parking_space': self.listing.id,
+            'vehicle_license_plate': 'ABC123',
+            'recurrence': {
+                'start_time': self.start.isoformat(),
+                'end_time': (self.start + timedelta(hours=10)).isoformat(),
+                **recurrence,
+            },
+        }, format='json')
+
+    def test_recurring_weekdays(self):
+        """Test that a weekday rule books every matching day in one insert."""
+        from .models import Booking, BookingStatus, BookingSummary
+
+        response = self.book_series(
+            frequency='weekly', weekdays=['monday', 'tuesday', 'wednesday', 'thursday', 'friday'], count=10,
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['count'], 10)
+        bookings = Booking.objects.filter(user=self.guest)
+        self.assertEqual(bookings.count(), 10)
+        self.assertTrue(all(timezone.localtime(b.start_time).weekday() < 5 for b in bookings))
+        self.assertTrue(all(timezone.localtime(b.start_time).hour == 8 for b in bookings))
+        self.assertEqual({b.status for b in bookings}, {BookingStatus.CONFIRMED})
+        self.assertEqual(bookings.first().total_amount, Decimal('100.00'))
+        self.assertEqual(
+            BookingSummary.objects.get(user=self.guest, role='guest').confirmed_bookings, 10
+        )
+
+    def test_conflicting_slot_books_nothing(self):
+        """Test that one taken slot rejects the whole series."""
+        from .models import Booking
+
+        create_booking(
+            self.host, self.listing, self.start + timedelta(days=2), self.start + timedelta(days=2, hours=1),
+        )
+
+        response = self.book_series(frequency='daily', count=5)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data['unavailable_slots']), 1)
+        self.assertFalse(Booking.objects.filter(user=self.guest).exists())
+
+
+class BookingSearchTest(TestCase):
+    """Test the indexed admin booking lookup."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('jane', email='jane.doe@example.com', first_name='Jane', last_name='Doe')
+        self.listing = create_listing(self.host)
+        start = timezone.now() + timedelta(days=1)
+        self.plate_booking = create_booking(
+            self.guest, self.listing, start, start + timedelta(hours=1), vehicle_license_plate='XYZ-9876',
+        )
+        self.other_booking = create_booking(
+            self.host, self.listing, start + timedelta(hours=2), start + timedelta(hours=3),
+        )
+
+    def test_search_by_id_plate_and_guest(self):
+        """Test booking ID, normalized plate and guest lookups, ranked and kept in sync."""
+        from .search import find_by_booking_id, search_bookings
+
+        booking_id = self.other_booking.booking_id
+        self.assertEqual(find_by_booking_id(f'#{booking_id.lower()}'), self.other_booking)
+        self.assertEqual(search_bookings(f'Reservation {booking_id[2:6]}')[0], self.other_booking)
+        self.assertEqual(search_bookings('xyz 9876'), [self.plate_booking])
+        self.assertEqual(search_bookings('jane doe'), [self.plate_booking])
+        self.assertEqual(search_bookings('jane.doe@'), [self.plate_booking])
+
+        self.plate_booking.vehicle_license_plate = 'NEW123'
+        self.plate_booking.save()
+        self.guest.last_name = 'Smith'
+        self.guest.save()
+        self.assertEqual(search_bookings('XYZ9876'), [])
+        self.assertEqual(search_bookings('new123'), [self.plate_booking])
+        self.assertEqual(search_bookings('smith'), [self.plate_booking])
+
+    def test_admin_search_api(self):
+        """Test that the admin API returns ranked, limited results."""
+        admin = create_user('admin', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+
+        response = client.get('/api/v1/bookings/admin/search-api/', {'q': 'xyz-9876'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['booking_id'], self.plate_booking.booking_id)
+
+
+class BookingExportTest(TestCase):
+    """Test the streaming booking export."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.other_host = create_user('other')
+        self.guest = create_user('guest')
+        self.listing = create_listing(self.host)
+        other_listing = create_listing(self.other_host)
+        start = timezone.now() + timedelta(days=1)
+        self.booking = create_booking(self.guest, self.listing, start, start + timedelta(hours=2))
+        create_booking(self.guest, self.listing, start + timedelta(hours=3), start + timedelta(hours=4), status='cancelled')
+        create_booking(self.guest, other_listing, start, start + timedelta(hours=1))
+
+    def test_host_export_is_streamed_and_filtered(self):
+        """Test that hosts only export their own listings' bookings, with filters."""
+        import csv
+        import io
+        import json
+
+        client = APIClient()
+        client.force_authenticate(user=self.host)
+
+        response = client.get('/api/v1/bookings/bookings/export/', {'status': 'confirmed,pending'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['booking_id'] for row in rows], [self.booking.booking_id])
+        self.assertEqual(rows[0]['guest_email'], 'guest@example.com')
+
+        response = client.get('/api/v1/bookings/bookings/export/', {'file_format': 'jsonl'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['total_amount'], '20.00')
+
+        response = client.get('/api/v1/bookings/bookings/export/', {'date_from': 'not-a-date'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command_writes_gzip(self):
+        """Test that the management command writes a compressed export."""
+        import gzip
+        import io
+        import tempfile
+        from pathlib import Path
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'bookings.jsonl.gz'
+            call_command(
+                'export_bookings', '--format', 'jsonl', '--output', str(output),
+                '--host', str(self.host.id), stdout=io.StringIO(),
+            )
+            with gzip.open(output, 'rt') as export_file:
+                self.assertEqual(len(export_file.read().splitlines()), 2)
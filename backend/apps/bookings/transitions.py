@@ -0,0 +1,89 @@
+"""
+Set-based booking status transitions.
+
+The periodic tasks used to load every matching booking and ``save()`` it,
+paying a pre_save SELECT and the post_save handlers per row. Instead,
+``bulk_transition`` applies the change with one ``UPDATE ... RETURNING``
+and then sends a single ``bookings_transitioned`` event with the IDs that
+actually changed, so receivers can do their own work in batches.
+
+Because the UPDATE re-checks the filter, two overlapping runs of a task
+never transition (or report) the same booking twice.
+
+Per-row ``post_save`` handlers do not run for bulk transitions; anything
+that must react to these status changes should listen to
+``bookings_transitioned`` (and to ``bookings_created`` for bookings
+inserted in bulk).
+"""
+import logging
+
+from django.db import connections, transaction
+from django.db.models.sql import UpdateQuery
+from django.dispatch import Signal
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Sent once per bulk transition with booking_ids, parking_space_ids and status
+bookings_transitioned = Signal()
+
+# Sent once per bulk insert (see bookings.series) with booking_ids and parking_space_ids
+bookings_created = Signal()
+
+
+def _can_update_returning(connection):
+    """
+    Whether the database supports ``UPDATE ... RETURNING``: PostgreSQL and
+    SQLite 3.35+. MariaDB only has ``INSERT ... RETURNING`` and MySQL has
+    neither.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def _update_returning(queryset, values):
+    """Run ``queryset.update(**values)`` returning (id, parking_space_id) rows."""
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    compiler = query.get_compiler(queryset.db)
+    # as_sql() starts with the update compiler's pre_sql_setup(), which turns
+    # filters across relations into ``id IN (subquery)`` as update() does
+    sql, params = compiler.as_sql()
+    if not sql:
+        return []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING id, parking_space_id', params)
+        return cursor.fetchall()
+
+
+def bulk_transition(queryset, status, **values):
+    """
+    Move every booking in ``queryset`` to ``status`` (setting any extra
+    field ``values``, which may be expressions) with one UPDATE, then send
+    ``bookings_transitioned``. Returns the list of booking IDs changed.
+    """
+    queryset = queryset.exclude(status=status).order_by()
+    values = {'status': status, 'updated_at': timezone.now(), **values}
+    connection = connections[queryset.db]
+
+    with transaction.atomic(using=queryset.db):
+        if _can_update_returning(connection):
+            rows = _update_returning(queryset, values)
+        else:
+            # No UPDATE ... RETURNING: lock the rows, then update them by ID
+            rows = list(queryset.select_for_update().values_list('id', 'parking_space_id'))
+            queryset.model.objects.filter(pk__in=[booking_id for booking_id, _ in rows]).update(**values)
+
+    if not rows:
+        return []
+
+    booking_ids = [booking_id for booking_id, _ in rows]
+    parking_space_ids = sorted({parking_space_id for _, parking_space_id in rows})
+    bookings_transitioned.send(
+        sender=queryset.model,
+        booking_ids=booking_ids,
+        parking_space_ids=parking_space_ids,
+        status=status,
+    )
+    return booking_ids
@@ -2,19 +2,29 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from datetime import datetime
 import logging
 
 from .models import Booking, BookingReview, BookingStatus
 from .serializers import (
     BookingSerializer, CreateBookingSerializer, BookingDetailSerializer,
-    BookingReviewSerializer
+    BookingReviewSerializer, BookingHoldSerializer, CreateBookingHoldSerializer,
+    CreateBookingSeriesSerializer
 )
 from .filters import BookingFilter
+from .holds import hold_conflicts, overlapping_holds, release_hold
+from .summary import get_user_summary
+from .exports import EXPORT_FORMATS, export_bookings, export_queryset
+from .availability import (
+    MAX_BATCH_LISTINGS, MAX_BATCH_WINDOWS, check_batch_availability, parse_request_datetime
+)
+from apps.common.pagination import CursorOrPageNumberPagination
+from apps.common.streaming import CONTENT_TYPES, streaming_response
 from apps.listings.models import ParkingListing
+from apps.listings.schedule import get_compiled_schedule
 from apps.users.models import User
 
 logger = logging.getLogger(__name__)
@@ -22,6 +32,7 @@ logger = logging.getLogger(__name__)
 
 class BookingViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.AllowAny]  # TEMPORARILY DISABLED FOR 403 FIX
+    pagination_class = CursorOrPageNumberPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_class = BookingFilter
     search_fields = ['booking_id', 'parking_space__title', 'vehicle_license_plate']
@@ -74,6 +85,58 @@ class BookingViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(response_serializer.data)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def hold(self, request):
+        """
+        Hold a time slot while the guest pays.
+        
+        The hold blocks the slot until it expires; pay for it by creating a
+        payment intent with its hold_id, and it becomes a booking when the
+        payment succeeds.
+        """
+        serializer = CreateBookingHoldSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        hold = serializer.save(user=request.user)
+        
+        logger.info(f"Hold {hold.hold_id} placed on parking space {hold.parking_space_id} until {hold.expires_at}")
+        return Response(BookingHoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def series(self, request):
+        """
+        Book several slots of one parking space in a single request.
+        
+        Takes either a list of windows or a recurrence rule (e.g. weekdays
+        8am-6pm for four weeks). Every slot is booked, or none is and the
+        unavailable slots are returned.
+        """
+        serializer = CreateBookingSeriesSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        bookings = serializer.save(user=request.user)
+        
+        logger.info(
+            f"Booking series of {len(bookings)} slots created on parking space {bookings[0].parking_space_id}"
+        )
+        return Response({
+            'count': len(bookings),
+            'bookings': BookingSerializer(bookings, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def release_hold(self, request):
+        """Release a hold before it expires (e.g. the guest left checkout)"""
+        hold_id = request.data.get('hold_id')
+        if not hold_id:
+            return Response({'error': 'hold_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            released = release_hold(hold_id, request.user)
+        except DjangoValidationError:
+            released = False
+        if not released:
+            return Response({'error': 'Hold not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Hold released'})
+    
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         """Confirm a pending booking (host only)"""
@@ -604,30 +667,53 @@ class BookingViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get booking statistics for the user"""
-        user_bookings = self.get_queryset()
+        # Counters come from the precomputed BookingSummary rows; only the
+        # time-dependent upcoming count is still queried
+        summary = get_user_summary(request.user)
         
         stats = {
-            'total_bookings': user_bookings.count(),
-            'completed_bookings': user_bookings.filter(status=BookingStatus.COMPLETED).count(),
-            'cancelled_bookings': user_bookings.filter(status=BookingStatus.CANCELLED).count(),
-            'active_bookings': user_bookings.filter(status=BookingStatus.ACTIVE).count(),
-            'upcoming_bookings': user_bookings.filter(
+            'total_bookings': summary['total_bookings'],
+            'completed_bookings': summary['completed_bookings'],
+            'cancelled_bookings': summary['cancelled_bookings'],
+            'active_bookings': summary['active_bookings'],
+            'upcoming_bookings': self.get_queryset().filter(
                 status__in=[BookingStatus.CONFIRMED, BookingStatus.PENDING],
                 start_time__gt=timezone.now()
             ).count(),
-            'total_spent': sum(
-                booking.total_amount or 0 
-                for booking in user_bookings.filter(status=BookingStatus.COMPLETED)
-            ),
+            'total_spent': summary['completed_amount'],
         }
         
         return Response(stats)
     
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        """
+        Download bookings as CSV or JSON Lines (?file_format=csv|jsonl).
+        
+        Staff can export every booking; hosts get the bookings of their own
+        listings. Filters: date_from, date_to (start date, inclusive),
+        listing, host and status (comma-separated). Rows are streamed.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({
+                'error': f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        bookings = Booking.objects.all()
+        if not request.user.is_staff:
+            bookings = bookings.filter(parking_space__host=request.user)
+        try:
+            bookings = export_queryset(request.query_params, bookings)
+        except ValueError as e:
+            return Response({'error': e.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+        
+        filename = f'bookings_{timezone.now().strftime("%Y%m%d_%H%M%S")}.{file_format}'
+        return streaming_response(export_bookings(bookings, file_format), CONTENT_TYPES[file_format], filename)
+    
     @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
     def check_availability(self, request):
         """Check if a parking space is available for the requested time period"""
-        from rest_framework import serializers as drf_serializers
-        
         # Validate required parameters
         parking_space_id = request.data.get('parking_space_id')
         start_time_str = request.data.get('start_time')
@@ -640,14 +726,8 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         try:
             # Parse datetime strings and make them timezone-aware
-            start_time = datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-            end_time = datetime.fromisoformat(end_time_str.replace('Z', '+00:00'))
-            
-            # Ensure timezone awareness
-            if start_time.tzinfo is None:
-                start_time = timezone.make_aware(start_time)
-            if end_time.tzinfo is None:
-                end_time = timezone.make_aware(end_time)
+            start_time = parse_request_datetime(start_time_str)
+            end_time = parse_request_datetime(end_time_str)
             
             # Get parking space
             parking_space = ParkingListing.objects.get(id=parking_space_id)
@@ -673,7 +753,10 @@ class BookingViewSet(viewsets.ModelViewSet):
                 end_time__gt=start_time
             )
             
-            if overlapping_bookings.exists():
+            # Slots held by checkouts in progress are unavailable too
+            held = overlapping_holds(parking_space.id, start_time, end_time)
+            
+            if overlapping_bookings.exists() or held.exists():
                 # Return details about conflicting bookings (anonymized)
                 conflicts = []
                 for booking in overlapping_bookings:
@@ -682,6 +765,7 @@ class BookingViewSet(viewsets.ModelViewSet):
                         'end_time': booking.end_time.isoformat(),
                         'status': booking.status
                     })
+                conflicts.extend(hold_conflicts(held))
                 
                 return Response({
                     'available': False,
@@ -691,23 +775,11 @@ class BookingViewSet(viewsets.ModelViewSet):
             
             # Check parking space availability schedule
             if hasattr(parking_space, 'availability_schedule') and parking_space.availability_schedule:
-                try:
-                    self._validate_schedule_availability(start_time, end_time, parking_space.availability_schedule)
-                except drf_serializers.ValidationError as e:
-                    # Extract the error message properly
-                    error_message = str(e)
-                    if hasattr(e, 'detail'):
-                        if isinstance(e.detail, list) and len(e.detail) > 0:
-                            error_message = str(e.detail[0])
-                        elif isinstance(e.detail, dict):
-                            # Handle dict-style error details
-                            error_message = str(list(e.detail.values())[0])
-                        else:
-                            error_message = str(e.detail)
-                    
+                schedule_check = get_compiled_schedule(parking_space).check(start_time, end_time)
+                if not schedule_check.fits:
                     return Response({
                         'available': False,
-                        'reason': error_message
+                        'reason': schedule_check.reason
                     }, status=status.HTTP_200_OK)
             
             # If we get here, the space is available
@@ -733,68 +805,46 @@ class BookingViewSet(viewsets.ModelViewSet):
                 'error': f'An error occurred: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    def _validate_schedule_availability(self, start_time, end_time, availability_schedule):
-        """Helper method to validate against availability schedule"""
-        from rest_framework import serializers as drf_serializers
-        from datetime import datetime
-        import pytz
-        from django.conf import settings
-        
-        # Get day names mapping (Monday = 0, Sunday = 6)
-        day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-        
-        # Get the local timezone
-        local_tz = pytz.timezone(settings.TIME_ZONE)
-        
-        # Convert booking times to local timezone for comparison
-        local_start_time = start_time.astimezone(local_tz)
-        local_end_time = end_time.astimezone(local_tz)
-        
-        # Check each day the booking spans
-        current_datetime = local_start_time
-        while current_datetime.date() <= local_end_time.date():
-            day_name = day_names[current_datetime.weekday()]
-            
-            if day_name not in availability_schedule:
-                raise drf_serializers.ValidationError(
-                    f"Parking space schedule not configured for {day_name.title()}"
-                )
-            
-            day_schedule = availability_schedule[day_name]
-            
-            if not day_schedule.get('available', False):
-                raise drf_serializers.ValidationError(
-                    f"Parking space is not available on {day_name.title()}"
-                )
-            
-            # Parse schedule times
-            try:
-                schedule_start = datetime.strptime(day_schedule['start'], '%H:%M').time()
-                schedule_end = datetime.strptime(day_schedule['end'], '%H:%M').time()
-            except (KeyError, ValueError):
-                # Skip validation if schedule format is invalid
-                current_datetime = current_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-                current_datetime += timezone.timedelta(days=1)
-                continue
-            
-            # Check if booking times fall within available hours for this day
-            if current_datetime.date() == local_start_time.date():
-                if local_start_time.time() < schedule_start:
-                    raise drf_serializers.ValidationError(
-                        f"Parking space opens at {day_schedule['start']} on {day_name.title()}"
-                    )
-            
-            if current_datetime.date() == local_end_time.date():
-                if local_end_time.time() > schedule_end:
-                    raise drf_serializers.ValidationError(
-                        f"Parking space closes at {day_schedule['end']} on {day_name.title()}"
-                    )
-            
-            # Move to next day
-            current_datetime = current_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-            current_datetime += timezone.timedelta(days=1)
-
-
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
+    def check_availability_batch(self, request):
+        """
+        Check availability for many parking spaces and time windows at once.
+        
+        Accepts parking_space_ids plus either start_time/end_time or a list of
+        windows ({start_time, end_time}); returns a verdict per parking space.
+        """
+        parking_space_ids = request.data.get('parking_space_ids')
+        windows_data = request.data.get('windows')
+        if windows_data is None and request.data.get('start_time') and request.data.get('end_time'):
+            windows_data = [{
+                'start_time': request.data.get('start_time'),
+                'end_time': request.data.get('end_time'),
+            }]
+        
+        if not isinstance(parking_space_ids, list) or not parking_space_ids or not isinstance(windows_data, list) or not windows_data:
+            return Response({
+                'error': 'parking_space_ids and start_time/end_time (or windows) are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(parking_space_ids) > MAX_BATCH_LISTINGS or len(windows_data) > MAX_BATCH_WINDOWS:
+            return Response({
+                'error': f'At most {MAX_BATCH_LISTINGS} parking spaces and {MAX_BATCH_WINDOWS} windows per request'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            listing_ids = list(dict.fromkeys(int(listing_id) for listing_id in parking_space_ids))
+            windows = [
+                (parse_request_datetime(window['start_time']), parse_request_datetime(window['end_time']))
+                for window in windows_data
+            ]
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return Response({
+                'error': f'Invalid parking_space_ids or datetime format: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'results': check_batch_availability(listing_ids, windows)
+        }, status=status.HTTP_200_OK)
 
 
 class BookingReviewViewSet(viewsets.ModelViewSet):
@@ -0,0 +1,3 @@
+"""
+Shared helpers used across apps (not a Django app; nothing to install).
+"""
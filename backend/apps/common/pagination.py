@@ -0,0 +1,279 @@
+"""
+Keyset (cursor) pagination.
+
+PageNumberPagination pages with OFFSET and runs a COUNT(*) for every
+page, so deep pages of the listing feed or a message history get
+linearly slower. KeysetPagination instead continues from the sort key of
+the last row it returned, e.g. ``WHERE (created_at, id) < (:c, :i)``,
+which costs the same on page 1 and page 1000. Cursors are opaque
+(base64-encoded JSON) and a count is only computed on request, either
+exactly (``?count=exact``) or from the planner estimate
+(``?count=approx``, PostgreSQL).
+
+``CursorOrPageNumberPagination`` keeps the existing page-number behaviour
+and switches to keyset mode when the request carries a ``cursor``
+parameter (an empty ``?cursor=`` fetches the first page).
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Below this estimate the planner is too rough to be useful; count exactly.
+APPROXIMATE_COUNT_THRESHOLD = 1000
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def approximate_count(queryset):
+    """
+    Estimated row count for a queryset.
+
+    Uses the PostgreSQL planner's row estimate; falls back to an exact
+    count on other backends or when the estimate is small.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= APPROXIMATE_COUNT_THRESHOLD:
+            return estimate
+    return queryset.count()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate on a stable, unique sort key such as ``(-created_at, -pk)``.
+
+    The view's ordering (from an OrderingFilter, or ``ordering`` on the
+    view) is used when present; ``pk`` is always appended as a tiebreaker.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('-created_at',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        # Only the first page pays for a count; links don't carry it forward
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.count_query_param)
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        queryset = queryset.order_by(*self.ordering)
+        self.count = self.get_count(queryset, request)
+
+        values, reverse = self.decode_cursor(request)
+        if values is not None:
+            if len(values) != len(self.ordering):
+                raise NotFound('Invalid cursor')
+            queryset = queryset.filter(self.keyset_filter(values, reverse))
+        if reverse:
+            queryset = queryset.order_by(*(self._invert(field) for field in self.ordering))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+            response['count_is_approximate'] = self.count_mode == 'approx'
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer'},
+                'count_is_approximate': {'type': 'boolean'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque pagination cursor from a previous response.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Include a total count: "exact" or "approx".',
+                'schema': {'type': 'string', 'enum': ['exact', 'approx']},
+            },
+        ]
+
+    # Ordering ------------------------------------------------------------
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        if view is not None:
+            for backend in getattr(view, 'filter_backends', []):
+                if hasattr(backend, 'get_ordering'):
+                    ordering = backend().get_ordering(request, queryset, view)
+                    if ordering:
+                        break
+            if not ordering:
+                ordering = getattr(view, 'ordering', None)
+        if not ordering:
+            ordering = self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        ordering = [field for field in ordering if '__' not in field.lstrip('-')]
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return tuple(ordering)
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def keyset_filter(self, values, reverse=False):
+        """
+        Rows strictly after ``values`` in the current ordering (before, if
+        ``reverse``), i.e. a lexicographic comparison across the sort key.
+        """
+        condition = Q()
+        equal_prefix = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            condition |= equal_prefix & Q(**{lookup: value})
+            equal_prefix &= Q(**{name: value})
+        return condition
+
+    # Cursors -------------------------------------------------------------
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            reverse = bool(payload.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound('Invalid cursor')
+        if not isinstance(values, list):
+            raise NotFound('Invalid cursor')
+        return values, reverse
+
+    def encode_cursor(self, row, reverse=False):
+        values = [_encode_value(getattr(row, field.lstrip('-'))) for field in self.ordering]
+        payload = {'v': values}
+        if reverse:
+            payload['r'] = True
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    # Sizes and counts ----------------------------------------------------
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_count(self, queryset, request):
+        self.count_mode = request.query_params.get(self.count_query_param)
+        if self.count_mode == 'exact':
+            return queryset.count()
+        if self.count_mode == 'approx':
+            return approximate_count(queryset)
+        return None
+
+
+class CursorOrPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination that switches to keyset mode when the request
+    has a ``cursor`` parameter.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if isinstance(queryset, QuerySet) and self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.get_page_size(request) or self.page_size
+            self.keyset.max_page_size = self.max_page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
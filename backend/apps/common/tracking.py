@@ -0,0 +1,75 @@
+"""
+Original-value tracking for model fields.
+
+Signal handlers that need to know whether a field (usually ``status``)
+changed used to re-fetch the row in pre_save, costing a query per save
+and still not telling post_save handlers anything. ``FieldTrackerMixin``
+snapshots the tracked fields when an instance is loaded and after each
+save, so pre_save and post_save receivers can ask what changed for free:
+
+    class Booking(FieldTrackerMixin, models.Model):
+        tracked_fields = ('status',)
+
+    instance.has_changed('status')
+    instance.original_value('status')
+    instance.changed_fields  # {'status': 'pending'}, field -> old value
+
+New instances report no original values: ``changed_fields`` lists every
+tracked field, and receivers should check ``created``/``instance.pk``
+first as before. The snapshot is taken after post_save has run, so both
+pre_save and post_save see the same changes.
+"""
+
+_UNKNOWN = object()
+
+
+class FieldTrackerMixin:
+    """Model mixin that remembers the loaded values of ``tracked_fields``."""
+
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        if not hasattr(self, '_original_values'):
+            self._original_values = {}
+        for name in fields or self.tracked_fields:
+            if name not in self.tracked_fields:
+                continue
+            attname = self._meta.get_field(name).attname
+            # Deferred fields stay unknown until they are loaded
+            if attname in self.__dict__:
+                self._original_values[name] = self.__dict__[attname]
+
+    def original_value(self, name):
+        """The value ``name`` had when loaded or last saved (None if unknown)."""
+        value = getattr(self, '_original_values', {}).get(name, _UNKNOWN)
+        return None if value is _UNKNOWN else value
+
+    def has_changed(self, name):
+        """True if ``name`` differs from its loaded value (or that is unknown)."""
+        original = getattr(self, '_original_values', {}).get(name, _UNKNOWN)
+        if original is _UNKNOWN:
+            return True
+        return original != getattr(self, self._meta.get_field(name).attname)
+
+    @property
+    def changed_fields(self):
+        """Changed tracked fields mapped to their original values."""
+        return {
+            name: self.original_value(name)
+            for name in self.tracked_fields
+            if self.has_changed(name)
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_tracked_fields(fields)
@@ -3,11 +3,12 @@ Dispute models for the Parking in a Pinch application.
 """
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from apps.common.tracking import FieldTrackerMixin
 from apps.users.models import User
 from apps.bookings.models import Booking
 
 
-class Dispute(models.Model):
+class Dispute(FieldTrackerMixin, models.Model):
     """
     Model representing a dispute filed by a user.
     """
@@ -167,6 +168,8 @@ class Dispute(models.Model):
         help_text=_('When the dispute was resolved')
     )
     
+    tracked_fields = ('status',)
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = _('Dispute')
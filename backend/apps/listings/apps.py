@@ -7,4 +7,8 @@ from django.apps import AppConfig
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.listings'
-    verbose_name = 'Parking Listings'
\ No newline at end of file
+    verbose_name = 'Parking Listings'
+    
+    def ready(self):
+        """Import signals when app is ready."""
+        import apps.listings.signals  # noqa
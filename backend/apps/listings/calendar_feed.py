@@ -0,0 +1,239 @@
+"""
+iCalendar (ICS) feeds of bookings and blocked periods, per listing and per host.
+
+Calendar clients poll feeds every few minutes, so feeds are cached whole
+and rebuilt only when something in them changed:
+
+- a listing feed is valid for one calendar version (free_slots bumps it
+  whenever a booking or block of the listing changes, and the listings
+  signals also bump it when the listing itself is edited). Serving an
+  unchanged feed is one ``get_many`` for the version and the cached feed;
+- a host feed is valid for the versions of all the host's listings (the
+  host's listing IDs are cached too, and dropped when a listing is saved);
+- on a rebuild, each booking's VEVENT is looked up in the cache by
+  (booking, ``updated_at``, listing ``updated_at``), and only new or
+  changed bookings are loaded and rendered.
+
+Each feed carries an ETag, so a client sending a current If-None-Match
+gets a 304 without a body. Feeds are not authenticated (calendar clients
+can't log in); their URLs include a token signed with SECRET_KEY.
+"""
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .free_slots import calendar_version_key, get_calendar_version
+from .models import ListingAvailability, ParkingListing
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+EVENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+FEED_PAST_DAYS = 30
+
+# Bookings shown in feeds; cancelled ones drop out of the calendar
+FEED_BOOKING_STATUSES = ('pending', 'confirmed', 'active', 'completed')
+
+PRODID = '-//Parking In A Pinch//Booking Calendar//EN'
+UID_DOMAIN = 'parkinginapinch.com'
+
+_FEED_KEY = 'calendar_feed:{scope}:{object_id}'
+_HOST_LISTINGS_KEY = 'calendar_host_listings:{host_id}'
+_EVENT_KEY = 'calendar_event:booking:{booking_id}:{booking_stamp}:{listing_stamp}'
+
+_signer = signing.Signer(salt='listings.calendar_feed')
+
+
+def feed_token(scope, object_id):
+    """Token that authorizes reading the ``scope`` ('listing'/'host') feed."""
+    return _signer.signature(f'{scope}:{object_id}')
+
+
+def check_feed_token(scope, object_id, token):
+    return constant_time_compare(feed_token(scope, object_id), token or '')
+
+
+def invalidate_host_listings(host_id):
+    """Forget the cached listing IDs of a host (a listing was added or removed)."""
+    cache.delete(_HOST_LISTINGS_KEY.format(host_id=host_id))
+
+
+def _escape(text):
+    return (
+        str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Don't split a UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts)
+
+
+def _stamp(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _event(lines):
+    return ''.join(f'{_fold(line)}\r\n' for line in ['BEGIN:VEVENT', *lines, 'END:VEVENT'])
+
+
+def booking_event(booking, listing):
+    guest = booking.user
+    description = [
+        f'Reservation {booking.booking_id}',
+        f'Guest: {guest.first_name or guest.username}',
+        f'Vehicle: {booking.vehicle_license_plate} ({booking.vehicle_state})',
+    ]
+    if booking.special_instructions:
+        description.append(f'Notes: {booking.special_instructions}')
+    label = 'Booking request' if booking.status == 'pending' else 'Booked'
+    return _event([
+        f'UID:booking-{booking.booking_id}@{UID_DOMAIN}',
+        f'DTSTAMP:{_stamp(booking.updated_at)}',
+        f'DTSTART:{_stamp(booking.start_time)}',
+        f'DTEND:{_stamp(booking.end_time)}',
+        f'SUMMARY:{_escape(f"{label}: {listing.title}")}',
+        f'LOCATION:{_escape(listing.address)}',
+        f'DESCRIPTION:{_escape(chr(10).join(description))}',
+        f"STATUS:{'TENTATIVE' if booking.status == 'pending' else 'CONFIRMED'}",
+    ])
+
+
+def block_event(block, listing):
+    return _event([
+        f'UID:block-{block.pk}@{UID_DOMAIN}',
+        f'DTSTAMP:{_stamp(block.created_at)}',
+        f'DTSTART:{_stamp(block.start_datetime)}',
+        f'DTEND:{_stamp(block.end_datetime)}',
+        f'SUMMARY:{_escape(f"Unavailable: {listing.title}")}',
+        f'DESCRIPTION:{_escape(block.reason or "Blocked by host")}',
+        'TRANSP:OPAQUE',
+    ])
+
+
+def _booking_events(listings):
+    """VEVENTs for the bookings of ``listings``, reusing cached ones."""
+    from apps.bookings.models import Booking
+
+    since = timezone.now() - timedelta(days=FEED_PAST_DAYS)
+    rows = Booking.objects.filter(
+        parking_space__in=list(listings),
+        status__in=FEED_BOOKING_STATUSES,
+        end_time__gte=since,
+    ).order_by('start_time', 'id').values_list('id', 'parking_space_id', 'updated_at')
+
+    keys = {
+        booking_id: _EVENT_KEY.format(
+            booking_id=booking_id,
+            booking_stamp=updated_at.timestamp(),
+            listing_stamp=listings[listing_id].updated_at.timestamp(),
+        )
+        for booking_id, listing_id, updated_at in rows
+    }
+    events = cache.get_many(list(keys.values()))
+
+    missing = [booking_id for booking_id, key in keys.items() if key not in events]
+    if missing:
+        rendered = {}
+        for booking in Booking.objects.filter(id__in=missing).select_related('user'):
+            rendered[keys[booking.id]] = booking_event(booking, listings[booking.parking_space_id])
+        cache.set_many(rendered, EVENT_CACHE_TIMEOUT)
+        events.update(rendered)
+
+    return [events[key] for key in keys.values() if key in events]
+
+
+def _block_events(listings):
+    since = timezone.now() - timedelta(days=FEED_PAST_DAYS)
+    blocks = ListingAvailability.objects.filter(
+        listing__in=list(listings), end_datetime__gte=since
+    ).order_by('start_datetime')
+    return [block_event(block, listings[block.listing_id]) for block in blocks]
+
+
+def render_feed(name, listings):
+    """The complete ICS document for ``listings`` ({id: listing})."""
+    header = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(name)}',
+    ]
+    return ''.join([
+        ''.join(f'{_fold(line)}\r\n' for line in header),
+        *_booking_events(listings),
+        *_block_events(listings),
+        'END:VCALENDAR\r\n',
+    ])
+
+
+def _cached_feed(scope, object_id, version, build):
+    """
+    The (etag, body) of a feed for ``version``, from the cache when the
+    cached feed is current, else built by ``build()`` and cached.
+    """
+    key = _FEED_KEY.format(scope=scope, object_id=object_id)
+    feed = cache.get(key)
+    if feed is not None and feed['version'] == version:
+        return feed['etag'], feed['body']
+    return _store_feed(key, version, build())
+
+
+def _store_feed(key, version, body):
+    etag = f'"{hashlib.md5(body.encode("utf-8")).hexdigest()}"'
+    cache.set(key, {'version': version, 'etag': etag, 'body': body}, FEED_CACHE_TIMEOUT)
+    return etag, body
+
+
+def listing_feed(listing_id):
+    """(etag, body) of a listing's feed. Raises ParkingListing.DoesNotExist."""
+    feed_key = _FEED_KEY.format(scope='listing', object_id=listing_id)
+    version_key = calendar_version_key(listing_id)
+    cached = cache.get_many([feed_key, version_key])
+    version = cached.get(version_key)
+    if version is None:
+        version = get_calendar_version(listing_id)
+    feed = cached.get(feed_key)
+    if feed is not None and feed['version'] == version:
+        return feed['etag'], feed['body']
+
+    listing = ParkingListing.objects.only('id', 'title', 'address', 'updated_at').get(pk=listing_id)
+    return _store_feed(feed_key, version, render_feed(listing.title, {listing.id: listing}))
+
+
+def host_feed(host_id):
+    """(etag, body) of the feed covering all of a host's listings."""
+    listings_key = _HOST_LISTINGS_KEY.format(host_id=host_id)
+    listing_ids = cache.get(listings_key)
+    if listing_ids is None:
+        listing_ids = sorted(ParkingListing.objects.filter(host_id=host_id).values_list('id', flat=True))
+        cache.set(listings_key, listing_ids, FEED_CACHE_TIMEOUT)
+
+    versions = cache.get_many([calendar_version_key(listing_id) for listing_id in listing_ids])
+    version = tuple(
+        (listing_id, versions.get(calendar_version_key(listing_id)) or get_calendar_version(listing_id))
+        for listing_id in listing_ids
+    )
+
+    def build():
+        listings = ParkingListing.objects.only('id', 'title', 'address', 'updated_at').in_bulk(listing_ids)
+        return render_feed('Parking In A Pinch bookings', listings)
+
+    return _cached_feed('host', host_id, version, build)
@@ -0,0 +1,42 @@
+"""
+iCalendar feed endpoints, polled by calendar apps (see listings.calendar_feed).
+"""
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+
+from .calendar_feed import check_feed_token, host_feed, listing_feed
+from .models import ParkingListing
+
+
+def _feed_response(request, etag, body, filename):
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+def listing_calendar_feed(request, listing_id):
+    """Bookings and blocked periods of one listing"""
+    if not check_feed_token('listing', listing_id, request.GET.get('token')):
+        raise Http404
+    try:
+        etag, body = listing_feed(listing_id)
+    except ParkingListing.DoesNotExist:
+        raise Http404
+    return _feed_response(request, etag, body, f'listing-{listing_id}.ics')
+
+
+@require_GET
+def host_calendar_feed(request, host_id):
+    """Bookings and blocked periods of every listing of a host"""
+    if not check_feed_token('host', host_id, request.GET.get('token')):
+        raise Http404
+    etag, body = host_feed(host_id)
+    return _feed_response(request, etag, body, 'bookings.ics')
@@ -3,7 +3,11 @@ Filters for parking listings.
 """
 import django_filters
 from django.db import models
+from rest_framework import filters
+from .amenities import AMENITY_BITS, AMENITY_FILTER_BITS, amenity_q
 from .models import ParkingListing
+from .occupancy import exclude_busy_listings
+from .search import search_listings
 
 
 class ParkingListingFilter(django_filters.FilterSet):
@@ -31,12 +35,12 @@ class ParkingListingFilter(django_filters.FilterSet):
         method='filter_space_types'
     )
     
-    # Boolean filters for amenities
-    is_covered = django_filters.BooleanFilter()
-    has_ev_charging = django_filters.BooleanFilter()
-    has_security = django_filters.BooleanFilter()
-    has_cctv = django_filters.BooleanFilter()
-    has_car_wash = django_filters.BooleanFilter()
+    # Boolean filters for amenities (matched against amenity_mask)
+    is_covered = django_filters.BooleanFilter(method='filter_amenity_flag')
+    has_ev_charging = django_filters.BooleanFilter(method='filter_amenity_flag')
+    has_security = django_filters.BooleanFilter(method='filter_amenity_flag')
+    has_cctv = django_filters.BooleanFilter(method='filter_amenity_flag')
+    has_car_wash = django_filters.BooleanFilter(method='filter_amenity_flag')
     is_available = django_filters.BooleanFilter(field_name="is_active")
     
     # Multiple amenities filter
@@ -69,28 +73,15 @@ class ParkingListingFilter(django_filters.FilterSet):
     
     def filter_search(self, queryset, name, value):
         """
-        Enhanced search filter that searches across multiple fields with weighting.
+        Full-text search across title, description, address and borough.
+        
+        Uses the listing search index (prefix matching, ranked by relevance);
+        see apps.listings.search.
         """
         if not value:
             return queryset
         
-        # Search across title, description, address, and borough fields only
-        # These fields are confirmed to exist in the database model
-        search_query = models.Q()
-        
-        # Split search terms for better matching
-        search_terms = value.strip().split()
-        
-        for term in search_terms:
-            term_query = (
-                models.Q(title__icontains=term) |
-                models.Q(description__icontains=term) |
-                models.Q(address__icontains=term) |
-                models.Q(borough__icontains=term)
-            )
-            search_query &= term_query
-        
-        return queryset.filter(search_query)
+        return search_listings(queryset, value)
     
     def filter_space_types(self, queryset, name, value):
         """
@@ -103,32 +94,29 @@ class ParkingListingFilter(django_filters.FilterSet):
     def filter_amenities(self, queryset, name, value):
         """
         Filter by multiple amenities using comma-separated values.
+        
+        Matches listings with any of the given amenities.
         """
         if value:
-            amenities = [a.strip() for a in value.split(',') if a.strip()]
-            query = models.Q()
+            any_bits = 0
+            for amenity in (a.strip() for a in value.split(',')):
+                any_bits |= AMENITY_FILTER_BITS.get(amenity, 0)
             
-            for amenity in amenities:
-                if amenity == 'covered':
-                    query |= models.Q(is_covered=True)
-                elif amenity == 'security':
-                    query |= models.Q(has_security=True)
-                elif amenity == 'electric_charging':
-                    query |= models.Q(has_ev_charging=True)
-                elif amenity == 'cctv':
-                    query |= models.Q(has_cctv=True)
-                elif amenity == 'car_wash':
-                    query |= models.Q(has_car_wash=True)
-                elif amenity == 'gated':
-                    query |= models.Q(has_security=True)  # Assume gated = security for now
-                elif amenity == 'lighting':
-                    # Add lighting field if it exists, otherwise skip
-                    pass
-            
-            if query:
-                return queryset.filter(query)
+            if any_bits:
+                return queryset.filter(amenity_q(any_bits=any_bits))
         return queryset
     
+    def filter_amenity_flag(self, queryset, name, value):
+        """
+        Filter on a single amenity flag via the amenity bitmask.
+        """
+        if value is None:
+            return queryset
+        bit = AMENITY_BITS[name]
+        if value:
+            return queryset.filter(amenity_q(all_bits=bit))
+        return queryset.filter(amenity_q(none_bits=bit))
+    
     def filter_wheelchair_accessible(self, queryset, name, value):
         """
         Filter for wheelchair accessible parking.
@@ -149,23 +137,14 @@ class ParkingListingFilter(django_filters.FilterSet):
         Filter for spaces available right now (next 2 hours).
         """
         if value:
-            from datetime import datetime, timedelta
+            from datetime import timedelta
             from django.utils import timezone
             
             now = timezone.now()
             two_hours_later = now + timedelta(hours=2)
             
-            # Filter out listings with current bookings AND blocked periods
-            return queryset.filter(is_active=True).exclude(
-                # Exclude if there are booking conflicts
-                bookings__start_time__lte=two_hours_later,
-                bookings__end_time__gte=now,
-                bookings__status__in=['confirmed', 'active']
-            ).exclude(
-                # Exclude if there are blocked/unavailable periods
-                unavailable_periods__start_datetime__lte=two_hours_later,
-                unavailable_periods__end_datetime__gte=now
-            ).distinct()
+            # Exclude listings with bookings or blocked periods in the window
+            return exclude_busy_listings(queryset.filter(is_active=True), now, two_hours_later)
         return queryset
     
     def filter_available_today(self, queryset, name, value):
@@ -180,17 +159,8 @@ class ParkingListingFilter(django_filters.FilterSet):
             start_of_day = timezone.make_aware(datetime.combine(today, time.min))
             end_of_day = timezone.make_aware(datetime.combine(today, time.max))
             
-            # Filter out listings with bookings or blocked periods today
-            return queryset.filter(is_active=True).exclude(
-                # Exclude if there are booking conflicts today
-                bookings__start_time__lte=end_of_day,
-                bookings__end_time__gte=start_of_day,
-                bookings__status__in=['confirmed', 'active']
-            ).exclude(
-                # Exclude if there are blocked/unavailable periods today
-                unavailable_periods__start_datetime__lte=end_of_day,
-                unavailable_periods__end_datetime__gte=start_of_day
-            ).distinct()
+            # Exclude listings with bookings or blocked periods today
+            return exclude_busy_listings(queryset.filter(is_active=True), start_of_day, end_of_day)
         return queryset
     
     def filter_available_this_week(self, queryset, name, value):
@@ -198,21 +168,38 @@ class ParkingListingFilter(django_filters.FilterSet):
         Filter for spaces available this week.
         """
         if value:
-            from datetime import datetime, timedelta
+            from datetime import timedelta
             from django.utils import timezone
             
             now = timezone.now()
             week_end = now + timedelta(days=7)
             
-            # Filter out listings with bookings or blocked periods this week
-            return queryset.filter(is_active=True).exclude(
-                # Exclude if there are booking conflicts this week
-                bookings__start_time__lte=week_end,
-                bookings__end_time__gte=now,
-                bookings__status__in=['confirmed', 'active']
-            ).exclude(
-                # Exclude if there are blocked/unavailable periods this week
-                unavailable_periods__start_datetime__lte=week_end,
-                unavailable_periods__end_datetime__gte=now
-            ).distinct()
-        return queryset
\ No newline at end of file
+            # Exclude listings with bookings or blocked periods this week
+            return exclude_busy_listings(queryset.filter(is_active=True), now, week_end)
+        return queryset
+
+class ListingSearchFilter(filters.SearchFilter):
+    """
+    DRF search backend that answers ``?search=`` from the listing search
+    index instead of icontains over ``search_fields``.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        # The filterset's ``search`` filter shares the query param and may
+        # already have applied the index.
+        if not search_terms or 'search_rank' in queryset.query.annotations:
+            return queryset
+        return search_listings(queryset, ' '.join(search_terms))
+
+
+class ListingOrderingFilter(filters.OrderingFilter):
+    """
+    Ordering backend that sorts search results by relevance unless the
+    client asked for an explicit ordering.
+    """
+    
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', '-created_at']
+        return super().get_ordering(request, queryset, view)
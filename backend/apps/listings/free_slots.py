@@ -0,0 +1,137 @@
+"""
+Free-slot calendar for parking listings.
+
+Merges the listing's weekly availability schedule, its blocking bookings,
+its active checkout holds and its unavailable periods into free intervals
+with a single sweep-line pass. Bookings, holds and blocks are each loaded
+with one query.
+
+Results are cached per listing, keyed by a calendar version that the
+listings signals bump whenever a booking or block for the listing
+changes (and apps.bookings.holds whenever a hold is placed, released,
+converted or expired), plus the listing's ``updated_at`` (so schedule
+edits show up immediately). Versions are random tokens, so a version
+evicted from the cache is replaced by a new one rather than reissued.
+"""
+import uuid
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+
+from .schedule import get_compiled_schedule
+
+# Bookings that take the space (pending ones too; they may be confirmed)
+BLOCKING_BOOKING_STATUSES = ('pending', 'confirmed', 'active')
+
+FREE_SLOTS_MAX_DAYS = 31
+FREE_SLOTS_CACHE_TIMEOUT = 60 * 10
+
+_VERSION_KEY = 'listing_calendar_version:{listing_id}'
+
+
+def calendar_version_key(listing_id):
+    return _VERSION_KEY.format(listing_id=listing_id)
+
+
+def get_calendar_version(listing_id):
+    """Current calendar version of a listing, starting a new one if missing."""
+    key = calendar_version_key(listing_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_calendar_version(listing_id):
+    """Invalidate cached free slots for a listing."""
+    cache.set(calendar_version_key(listing_id), uuid.uuid4().hex, None)
+
+
+def sweep_free_intervals(open_windows, busy_intervals):
+    """
+    Return the parts of the open windows not covered by any busy interval.
+
+    A single pass over the sorted boundary events: time is free while at
+    least one open window and no busy interval is in effect.
+    """
+    events = []
+    for start, end in open_windows:
+        events.append((start, 0, 1))
+        events.append((end, 0, -1))
+    for start, end in busy_intervals:
+        events.append((start, 1, 1))
+        events.append((end, 1, -1))
+    # Closing events sort before opening events at the same instant
+    events.sort(key=lambda event: (event[0], event[2]))
+
+    free = []
+    open_count = busy_count = 0
+    free_since = None
+    for moment, kind, delta in events:
+        if kind == 0:
+            open_count += delta
+        else:
+            busy_count += delta
+
+        is_free = open_count > 0 and busy_count == 0
+        if is_free and free_since is None:
+            free_since = moment
+        elif not is_free and free_since is not None:
+            if moment > free_since:
+                if free and free[-1][1] == free_since:
+                    free[-1] = (free[-1][0], moment)
+                else:
+                    free.append((free_since, moment))
+            free_since = None
+    return free
+
+
+def compute_free_intervals(listing, range_start, range_end):
+    """Free (start, end) intervals for a listing within [range_start, range_end)."""
+    from apps.bookings.holds import active_holds
+    from apps.bookings.models import Booking
+
+    if listing.availability_schedule:
+        open_windows = list(get_compiled_schedule(listing).open_windows(range_start, range_end))
+    else:
+        # No schedule: any time can be requested (subject to host approval)
+        open_windows = [(range_start, range_end)]
+
+    busy = list(Booking.objects.filter(
+        parking_space_id=listing.pk,
+        status__in=BLOCKING_BOOKING_STATUSES,
+        start_time__lt=range_end,
+        end_time__gt=range_start,
+    ).values_list('start_time', 'end_time'))
+    busy.extend(active_holds().filter(
+        parking_space_id=listing.pk,
+        start_time__lt=range_end,
+        end_time__gt=range_start,
+    ).values_list('start_time', 'end_time'))
+    busy.extend(listing.unavailable_periods.filter(
+        start_datetime__lt=range_end,
+        end_datetime__gt=range_start,
+    ).values_list('start_datetime', 'end_datetime'))
+
+    return sweep_free_intervals(open_windows, busy)
+
+
+def get_free_slots(listing, start_date, days):
+    """
+    Free intervals for ``days`` local days from ``start_date``, cached per
+    listing and calendar version. Returns a list of (start, end) datetimes.
+    """
+    updated = int(listing.updated_at.timestamp()) if listing.updated_at else 0
+    cache_key = (
+        f'listing_free_slots:{listing.pk}:{get_calendar_version(listing.pk)}:'
+        f'{updated}:{start_date.isoformat()}:{days}'
+    )
+    free = cache.get(cache_key)
+    if free is None:
+        tz = get_compiled_schedule(listing).timezone
+        range_start = tz.localize(datetime.combine(start_date, time.min))
+        range_end = tz.localize(datetime.combine(start_date + timedelta(days=days), time.min))
+        free = compute_free_intervals(listing, range_start, range_end)
+        cache.set(cache_key, free, FREE_SLOTS_CACHE_TIMEOUT)
+    return free
@@ -0,0 +1,137 @@
+"""
+Geospatial helpers for parking listings.
+
+Listings store a geohash of their coordinates so radius searches can
+prefilter on a handful of grid cells (an indexed prefix match) before
+running the exact haversine distance check in Python.
+"""
+import math
+from typing import Iterable, List, Optional, Tuple
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells, plenty for a parking space
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+_DECODE_MAP = {char: index for index, char in enumerate(GEOHASH_ALPHABET)}
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a coordinate pair as a geohash string."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        target, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (target[0] + target[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            target[0] = mid
+        else:
+            bits = bits << 1
+            target[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def decode_geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) for a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _DECODE_MAP[char]
+        for shift in range(4, -1, -1):
+            target = lng_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """Return the (lat, lng) size in degrees of a cell at the given precision."""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def precision_for_radius(latitude: float, radius_km: float) -> int:
+    """
+    Pick the finest geohash precision whose cells are at least radius_km
+    tall and wide at this latitude, so the 3x3 block of cells around the
+    centre is guaranteed to contain the whole search circle.
+    """
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lng_deg = cell_size_degrees(precision)
+        height_km = lat_deg * KM_PER_DEGREE_LAT
+        width_km = lng_deg * KM_PER_DEGREE_LAT * cos_lat
+        if height_km >= radius_km and width_km >= radius_km:
+            return precision
+    return 1
+
+
+def neighbor_cells(latitude: float, longitude: float, precision: int) -> List[str]:
+    """Return the geohash cell containing the point plus its eight neighbours."""
+    lat_deg, lng_deg = cell_size_degrees(precision)
+    cells = []
+    for d_lat in (-1, 0, 1):
+        neighbor_lat = latitude + d_lat * lat_deg
+        if neighbor_lat > 90.0 or neighbor_lat < -90.0:
+            continue
+        for d_lng in (-1, 0, 1):
+            neighbor_lng = longitude + d_lng * lng_deg
+            # Wrap around the antimeridian
+            neighbor_lng = (neighbor_lng + 180.0) % 360.0 - 180.0
+            cell = encode_geohash(neighbor_lat, neighbor_lng, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    d_lat = lat2 - lat1
+    d_lng = lng2 - lng1
+    a = math.sin(d_lat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def rank_by_distance(
+    candidates: Iterable[Tuple[int, Optional[float], Optional[float]]],
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+) -> List[Tuple[float, int]]:
+    """
+    Exact radius check over (id, lat, lng) candidates.
+
+    Returns (distance_km, id) pairs inside the radius, nearest first.
+    """
+    ranked = []
+    for listing_id, lat, lng in candidates:
+        if lat is None or lng is None:
+            continue
+        distance = haversine_km(latitude, longitude, float(lat), float(lng))
+        if distance <= radius_km:
+            ranked.append((distance, listing_id))
+    ranked.sort()
+    return ranked
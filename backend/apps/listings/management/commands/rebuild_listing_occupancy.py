@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.listings.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed listing occupancy (busy interval) index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--listing',
+            type=int,
+            action='append',
+            dest='listing_ids',
+            help='Only rebuild this listing id (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        listing_ids = options['listing_ids']
+        scope = f'{len(listing_ids)} listing(s)' if listing_ids else 'all listings'
+        self.stdout.write(f'Rebuilding occupancy index for {scope}...')
+
+        row_count = rebuild_occupancy(listing_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Occupancy index rebuilt: {row_count} busy intervals')
+        )
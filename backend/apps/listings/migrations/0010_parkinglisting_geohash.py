@@ -0,0 +1,44 @@
+# Generated by Django 4.2.8 on 2026-10-16 19:27
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    """Compute the geohash cell for every listing that has coordinates."""
+    from apps.listings.geo import encode_geohash
+
+    ParkingListing = apps.get_model("listings", "ParkingListing")
+    batch = []
+    listings = ParkingListing.objects.exclude(latitude__isnull=True).exclude(
+        longitude__isnull=True
+    ).only("id", "latitude", "longitude")
+    for listing in listings.iterator(chunk_size=1000):
+        listing.geohash = encode_geohash(float(listing.latitude), float(listing.longitude))
+        batch.append(listing)
+        if len(batch) >= 1000:
+            ParkingListing.objects.bulk_update(batch, ["geohash"])
+            batch = []
+    if batch:
+        ParkingListing.objects.bulk_update(batch, ["geohash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0009_alter_parkinglisting_space_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="parkinglisting",
+            name="geohash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Geohash grid cell of the coordinates, used for radius search",
+                max_length=12,
+                verbose_name="geohash",
+            ),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
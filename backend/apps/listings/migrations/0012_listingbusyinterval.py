@@ -0,0 +1,74 @@
+# Generated by Django 4.2.8 on 2026-10-16 19:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_occupancy(apps, schema_editor):
+    """Build busy intervals from existing bookings and blocked periods."""
+    from apps.listings.occupancy import rebuild_occupancy
+
+    rebuild_occupancy(app_registry=apps)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0011_listing_search_index"),
+        ("bookings", "0005_booking_auto_checkout"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingBusyInterval",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "start_time",
+                    models.DateTimeField(
+                        help_text="Start of the busy interval",
+                        verbose_name="start time",
+                    ),
+                ),
+                (
+                    "end_time",
+                    models.DateTimeField(
+                        help_text="End of the busy interval", verbose_name="end time"
+                    ),
+                ),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        help_text="Parking listing",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="busy_intervals",
+                        to="listings.parkinglisting",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Listing Busy Interval",
+                "verbose_name_plural": "Listing Busy Intervals",
+                "db_table": "listing_busy_intervals",
+                "ordering": ["listing", "start_time"],
+                "indexes": [
+                    models.Index(
+                        fields=["end_time", "start_time"],
+                        name="listing_bus_end_tim_3586e3_idx",
+                    ),
+                    models.Index(
+                        fields=["listing", "start_time"],
+                        name="listing_bus_listing_85558d_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
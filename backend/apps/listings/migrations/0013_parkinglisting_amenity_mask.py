@@ -0,0 +1,51 @@
+# Generated by Django 4.2.8 on 2026-10-16 19:36
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_amenity_mask(apps, schema_editor):
+    """Set each amenity's bit with one UPDATE per amenity."""
+    from apps.listings.amenities import AMENITY_BITS
+
+    ParkingListing = apps.get_model("listings", "ParkingListing")
+    for field, bit in AMENITY_BITS.items():
+        ParkingListing.objects.filter(**{field: True}).update(
+            amenity_mask=F("amenity_mask").bitor(bit)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0012_listingbusyinterval"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="parkinglisting",
+            name="amenity_mask",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Amenity flags packed into a bitmask, used for amenity filtering",
+                verbose_name="amenity mask",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="parkinglisting",
+            index=models.Index(
+                fields=["amenity_mask"], name="parking_lis_amenity_c2a342_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="parkinglisting",
+            index=models.Index(
+                condition=models.Q(
+                    ("approval_status", "APPROVED"), ("is_active", True)
+                ),
+                fields=["amenity_mask"],
+                name="listings_amenity_public_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_amenity_mask, migrations.RunPython.noop),
+    ]
@@ -5,6 +5,8 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 from apps.users.models import User
+from .amenities import AMENITY_FIELDS, AMENITY_LABELS, compute_amenity_mask
+from .geo import encode_geohash
 
 
 class ParkingListing(models.Model):
@@ -64,6 +66,14 @@ class ParkingListing(models.Model):
         blank=True,
         help_text=_('Longitude coordinate')
     )
+    geohash = models.CharField(
+        _('geohash'),
+        max_length=12,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_('Geohash grid cell of the coordinates, used for radius search')
+    )
     borough = models.CharField(
         _('borough'),
         max_length=20,
@@ -161,6 +171,12 @@ class ParkingListing(models.Model):
         default=False,
         help_text=_('Whether car washing services are available')
     )
+    amenity_mask = models.PositiveIntegerField(
+        _('amenity mask'),
+        default=0,
+        editable=False,
+        help_text=_('Amenity flags packed into a bitmask, used for amenity filtering')
+    )
     
     # Instructions and availability
     instructions = models.TextField(
@@ -255,33 +271,40 @@ class ParkingListing(models.Model):
             models.Index(fields=['is_active']),
             models.Index(fields=['created_at']),
             models.Index(fields=['rating_average']),
+            models.Index(fields=['amenity_mask']),
+            # Public listing queries always filter on these
+            models.Index(
+                fields=['amenity_mask'],
+                condition=models.Q(is_active=True, approval_status='APPROVED'),
+                name='listings_amenity_public_idx'
+            ),
         ]
     
     def __str__(self):
         return f"{self.title} - {self.borough}"
     
+    def save(self, *args, **kwargs):
+        self.geohash = self.compute_geohash()
+        self.amenity_mask = compute_amenity_mask(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            if update_fields.intersection(AMENITY_FIELDS):
+                update_fields.add('amenity_mask')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+    
+    def compute_geohash(self):
+        """Return the geohash cell for the listing's coordinates."""
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return encode_geohash(float(self.latitude), float(self.longitude))
+    
     def get_amenities(self):
         """Return a list of available amenities."""
-        amenities = []
-        if self.is_covered:
-            amenities.append('Covered')
-        if self.has_ev_charging:
-            amenities.append('EV Charging')
-        if self.has_security:
-            amenities.append('Security')
-        if self.has_lighting:
-            amenities.append('Well Lit')
-        if self.has_cctv:
-            amenities.append('CCTV Monitoring')
-        if self.has_gated_access:
-            amenities.append('Gated Access')
-        if self.is_handicap_accessible:
-            amenities.append('Wheelchair Accessible')
-        if self.has_valet_service:
-            amenities.append('Valet Service')
-        if self.has_car_wash:
-            amenities.append('Car Wash')
-        return amenities
+        return list(AMENITY_LABELS[compute_amenity_mask(self)])
     
     def get_availability_schedule(self):
         """Return formatted availability schedule."""
@@ -418,4 +441,41 @@ class ListingAvailability(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.listing.title} unavailable {self.start_datetime} - {self.end_datetime}"
\ No newline at end of file
+        return f"{self.listing.title} unavailable {self.start_datetime} - {self.end_datetime}"
+
+class ListingBusyInterval(models.Model):
+    """
+    Precomputed occupancy for a listing: merged intervals covered by
+    confirmed/active bookings or unavailable periods.
+    
+    Maintained by apps.listings.occupancy whenever a Booking or
+    ListingAvailability changes, so availability filters can run a single
+    indexed overlap lookup instead of joining both source tables.
+    """
+    listing = models.ForeignKey(
+        ParkingListing,
+        on_delete=models.CASCADE,
+        related_name='busy_intervals',
+        help_text=_('Parking listing')
+    )
+    start_time = models.DateTimeField(
+        _('start time'),
+        help_text=_('Start of the busy interval')
+    )
+    end_time = models.DateTimeField(
+        _('end time'),
+        help_text=_('End of the busy interval')
+    )
+    
+    class Meta:
+        db_table = 'listing_busy_intervals'
+        verbose_name = _('Listing Busy Interval')
+        verbose_name_plural = _('Listing Busy Intervals')
+        ordering = ['listing', 'start_time']
+        indexes = [
+            models.Index(fields=['end_time', 'start_time']),
+            models.Index(fields=['listing', 'start_time']),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing_id} busy {self.start_time} - {self.end_time}"
@@ -0,0 +1,112 @@
+"""
+Occupancy index for parking listings.
+
+Each listing's confirmed/active bookings and unavailable periods are
+merged into non-overlapping busy intervals (ListingBusyInterval). The
+availability filters then answer "which listings are free in this
+window?" with one indexed overlap lookup.
+"""
+from datetime import timedelta
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.utils import timezone
+
+# Booking statuses that occupy a space for the availability filters
+BUSY_BOOKING_STATUSES = ('confirmed', 'active')
+
+# Keep intervals that ended up to this long ago, so "available today"
+# still sees the morning's bookings.
+OCCUPANCY_RETENTION = timedelta(days=1)
+
+
+def merge_intervals(intervals):
+    """
+    Merge (start, end) pairs into sorted, non-overlapping intervals.
+
+    Touching intervals are merged too; the filters use inclusive bounds so
+    this does not change which windows overlap.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def collect_busy_intervals(listing_ids=None, since=None, app_registry=None):
+    """
+    Load busy periods for the given listings (all listings if None) with
+    one query per source table, and return {listing_id: merged intervals}.
+    """
+    registry = app_registry or django_apps
+    Booking = registry.get_model('bookings', 'Booking')
+    ListingAvailability = registry.get_model('listings', 'ListingAvailability')
+    since = since or timezone.now() - OCCUPANCY_RETENTION
+
+    bookings = Booking.objects.filter(
+        status__in=BUSY_BOOKING_STATUSES,
+        end_time__gte=since,
+    )
+    blocks = ListingAvailability.objects.filter(end_datetime__gte=since)
+    if listing_ids is not None:
+        bookings = bookings.filter(parking_space_id__in=listing_ids)
+        blocks = blocks.filter(listing_id__in=listing_ids)
+
+    raw = {}
+    for listing_id, start, end in bookings.values_list('parking_space_id', 'start_time', 'end_time').iterator():
+        raw.setdefault(listing_id, []).append((start, end))
+    for listing_id, start, end in blocks.values_list('listing_id', 'start_datetime', 'end_datetime').iterator():
+        raw.setdefault(listing_id, []).append((start, end))
+
+    return {listing_id: merge_intervals(intervals) for listing_id, intervals in raw.items()}
+
+
+def rebuild_occupancy(listing_ids=None, app_registry=None):
+    """
+    Recompute the busy intervals for the given listings (all if None).
+
+    Returns the number of interval rows written.
+    """
+    registry = app_registry or django_apps
+    ListingBusyInterval = registry.get_model('listings', 'ListingBusyInterval')
+
+    if listing_ids is not None:
+        listing_ids = list(set(listing_ids))
+        if not listing_ids:
+            return 0
+
+    with transaction.atomic():
+        intervals = collect_busy_intervals(listing_ids, app_registry=registry)
+
+        stale = ListingBusyInterval.objects.all()
+        if listing_ids is not None:
+            stale = stale.filter(listing_id__in=listing_ids)
+        stale.delete()
+
+        rows = [
+            ListingBusyInterval(listing_id=listing_id, start_time=start, end_time=end)
+            for listing_id, merged in intervals.items()
+            for start, end in merged
+        ]
+        ListingBusyInterval.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
+def busy_listing_ids(window_start, window_end):
+    """Subquery of listing ids that are occupied at any point in the window."""
+    from .models import ListingBusyInterval
+
+    return ListingBusyInterval.objects.filter(
+        end_time__gte=window_start,
+        start_time__lte=window_end,
+    ).values('listing_id')
+
+
+def exclude_busy_listings(queryset, window_start, window_end):
+    """Restrict a ParkingListing queryset to listings free for the whole window."""
+    return queryset.exclude(id__in=busy_listing_ids(window_start, window_end))
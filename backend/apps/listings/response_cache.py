@@ -0,0 +1,120 @@
+"""
+Response cache for anonymous listing browse.
+
+Anonymous ``list``/``retrieve`` responses do not depend on who is asking,
+so they are cached in the default cache, keyed on the normalized query
+string and a version:
+
+- detail responses use the listing's own version, and
+- list responses use a global listings version, since any listing can
+  enter or leave a filtered result set.
+
+Versions are random tokens rather than counters, so a version lost to
+cache eviction is never issued again and old ETags cannot match.
+
+Signals bump both versions whenever a listing, one of its images or its
+rating changes. Responses carry an ETag derived from the cache key, so a
+conditional GET with a current ETag is answered with 304 before any
+query runs.
+
+The cache is bypassed when the cache backend cannot keep versions (the
+default DummyCache) and for filters whose results change with time or
+bookings rather than with listing edits.
+"""
+import hashlib
+import uuid
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+LISTING_RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+# Filters whose answers depend on the clock or on bookings
+UNCACHEABLE_PARAMS = frozenset(['available_now', 'available_today', 'available_this_week'])
+
+_LIST_VERSION_KEY = 'listing_response_version:list'
+_LISTING_VERSION_KEY = 'listing_response_version:{listing_id}'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _get_version(key):
+    """Current version for a key, or None if the cache cannot hold one."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    cache.set(key, _new_version(), None)
+
+
+def bump_listing_version(listing_id):
+    """Invalidate cached responses that include this listing."""
+    _bump(_LISTING_VERSION_KEY.format(listing_id=listing_id))
+    _bump(_LIST_VERSION_KEY)
+
+
+def normalized_query(request):
+    """Query string with keys sorted and empty values dropped."""
+    items = []
+    for key in sorted(request.query_params.keys()):
+        for value in sorted(request.query_params.getlist(key)):
+            if value != '':
+                items.append((key, value))
+    return urlencode(items)
+
+
+def is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user and request.user.is_authenticated:
+        return False
+    return not UNCACHEABLE_PARAMS.intersection(request.query_params.keys())
+
+
+def cached_listing_response(request, build, listing_id=None):
+    """
+    Return a cached response for an anonymous listing request, calling
+    ``build()`` on a miss. ``listing_id`` selects the detail version.
+    """
+    if not is_cacheable(request):
+        return build()
+
+    if listing_id is None:
+        version = _get_version(_LIST_VERSION_KEY)
+        scope = 'list'
+    else:
+        version = _get_version(_LISTING_VERSION_KEY.format(listing_id=listing_id))
+        scope = f'detail:{listing_id}'
+    if version is None:
+        return build()
+
+    key_source = f'{scope}:{version}:{request.get_host()}{request.path}?{normalized_query(request)}'
+    digest = hashlib.md5(key_source.encode('utf-8')).hexdigest()
+    cache_key = f'listing_response:{digest}'
+    etag = f'"{digest}"'
+
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        data = cache.get(cache_key)
+        if data is None:
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cache_key, response.data, LISTING_RESPONSE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
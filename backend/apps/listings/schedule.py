@@ -0,0 +1,218 @@
+"""
+Compiled weekly availability schedules.
+
+``ParkingListing.availability_schedule`` is a JSON dict keyed by day name
+with ``available``/``start``/``end`` entries. CompiledSchedule parses it
+once into minute-of-week open intervals so booking validation does not
+re-run ``strptime`` per day on every request. Compiled schedules are
+cached per listing and invalidated by ``updated_at``.
+
+Semantics match the original validation loops: every day a booking
+touches must be configured and available, the booking may not start
+before opening time on its first day, and may not end after closing
+time on its last day (overnight stays across open days are allowed).
+"""
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Day states
+DAY_MISSING = 'missing'
+DAY_CLOSED = 'closed'
+DAY_INVALID = 'invalid'
+DAY_OPEN = 'open'
+
+ScheduleCheck = namedtuple('ScheduleCheck', ['fits', 'reason', 'code'])
+ScheduleCheck.__doc__ = """Result of CompiledSchedule.check(); reason/code are None when it fits."""
+
+OpenDay = namedtuple('OpenDay', ['state', 'open_minute', 'close_minute', 'open_label', 'close_label'])
+
+FITS = ScheduleCheck(True, None, None)
+
+SCHEDULE_CACHE_SIZE = 2048
+
+
+def _parse_minute(value):
+    parsed = datetime.strptime(value, '%H:%M')
+    return parsed.hour * 60 + parsed.minute
+
+
+def _minute_of_day(local_dt):
+    """Exact (fractional) minute of day, so seconds still count at the edges."""
+    return (local_dt.hour * 60 + local_dt.minute
+            + local_dt.second / 60 + local_dt.microsecond / 60_000_000)
+
+
+class CompiledSchedule:
+    """
+    A weekly availability schedule parsed into minute-of-week intervals.
+    """
+
+    def __init__(self, availability_schedule):
+        self.days = []
+        intervals = []
+        availability_schedule = availability_schedule or {}
+
+        for index, day_name in enumerate(DAY_NAMES):
+            if day_name not in availability_schedule:
+                self.days.append(OpenDay(DAY_MISSING, None, None, None, None))
+                continue
+
+            day_schedule = availability_schedule[day_name]
+            if not isinstance(day_schedule, dict):
+                self.days.append(OpenDay(DAY_INVALID, None, None, None, None))
+                continue
+            if not day_schedule.get('available', False):
+                self.days.append(OpenDay(DAY_CLOSED, None, None, None, None))
+                continue
+
+            try:
+                open_minute = _parse_minute(day_schedule['start'])
+                close_minute = _parse_minute(day_schedule['end'])
+            except (KeyError, TypeError, ValueError):
+                self.days.append(OpenDay(DAY_INVALID, None, None, None, None))
+                continue
+
+            self.days.append(OpenDay(
+                DAY_OPEN, open_minute, close_minute, day_schedule['start'], day_schedule['end']
+            ))
+            if close_minute > open_minute:
+                day_offset = index * MINUTES_PER_DAY
+                intervals.append((day_offset + open_minute, day_offset + close_minute))
+
+        self.intervals = intervals
+        self._interval_starts = [start for start, _ in intervals]
+        self.timezone = pytz.timezone(settings.TIME_ZONE)
+
+    @property
+    def has_invalid_days(self):
+        return any(day.state == DAY_INVALID for day in self.days)
+
+    def to_local(self, value):
+        return value.astimezone(self.timezone)
+
+    def minute_of_week(self, local_dt):
+        return local_dt.weekday() * MINUTES_PER_DAY + _minute_of_day(local_dt)
+
+    def interval_containing(self, minute_of_week):
+        """Binary search for the open interval containing a minute of the week."""
+        index = bisect_right(self._interval_starts, minute_of_week) - 1
+        if index >= 0:
+            start, end = self.intervals[index]
+            if start <= minute_of_week <= end:
+                return start, end
+        return None
+
+    def check(self, start_time, end_time, strict=False):
+        """
+        Check whether [start_time, end_time) fits the schedule.
+
+        Days whose start/end cannot be parsed are skipped unless ``strict``
+        is set, in which case they fail with code ``invalid``.
+        """
+        local_start = self.to_local(start_time)
+        local_end = self.to_local(end_time)
+
+        # Fast path: the whole booking sits inside a single open interval
+        if local_start.date() == local_end.date():
+            interval = self.interval_containing(self.minute_of_week(local_start))
+            if interval and self.minute_of_week(local_end) <= interval[1]:
+                return FITS
+
+        first_date = local_start.date()
+        last_date = local_end.date()
+        current_date = first_date
+        while current_date <= last_date:
+            day_name = DAY_NAMES[current_date.weekday()]
+            day = self.days[current_date.weekday()]
+
+            if day.state == DAY_MISSING:
+                return ScheduleCheck(
+                    False, f"Parking space schedule not configured for {day_name.title()}", DAY_MISSING
+                )
+            if day.state == DAY_CLOSED:
+                return ScheduleCheck(
+                    False, f"Parking space is not available on {day_name.title()}", DAY_CLOSED
+                )
+            if day.state == DAY_INVALID:
+                if strict:
+                    return ScheduleCheck(
+                        False, f"Parking space schedule is invalid for {day_name.title()}", DAY_INVALID
+                    )
+                current_date += timedelta(days=1)
+                continue
+
+            if current_date == first_date and _minute_of_day(local_start) < day.open_minute:
+                return ScheduleCheck(
+                    False, f"Parking space opens at {day.open_label} on {day_name.title()}", 'opens_later'
+                )
+            if current_date == last_date and _minute_of_day(local_end) > day.close_minute:
+                return ScheduleCheck(
+                    False, f"Parking space closes at {day.close_label} on {day_name.title()}", 'closes_earlier'
+                )
+
+            current_date += timedelta(days=1)
+
+        return FITS
+
+    def fits(self, start_time, end_time):
+        return self.check(start_time, end_time).fits
+
+    def open_windows(self, range_start, range_end):
+        """
+        Yield (start, end) aware datetimes of open intervals overlapping
+        [range_start, range_end), clipped to the range.
+        """
+        local_start = self.to_local(range_start)
+        day = local_start.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        while True:
+            local_day = self.timezone.localize(day)
+            if local_day >= range_end:
+                break
+            open_day = self.days[day.weekday()]
+            if open_day.state == DAY_OPEN and open_day.close_minute > open_day.open_minute:
+                window_start = self.timezone.localize(day + timedelta(minutes=open_day.open_minute))
+                window_end = self.timezone.localize(day + timedelta(minutes=open_day.close_minute))
+                window_start = max(window_start, range_start)
+                window_end = min(window_end, range_end)
+                if window_start < window_end:
+                    yield window_start, window_end
+            day += timedelta(days=1)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_compiled_schedule(listing):
+    """
+    Return the CompiledSchedule for a listing, cached against updated_at.
+
+    Listings without a schedule compile to an empty schedule; callers that
+    treat "no schedule" specially should check ``availability_schedule``.
+    """
+    if listing.pk is None or listing.updated_at is None:
+        return CompiledSchedule(listing.availability_schedule)
+
+    key = listing.pk
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == listing.updated_at:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    compiled = CompiledSchedule(listing.availability_schedule)
+    with _cache_lock:
+        _cache[key] = (listing.updated_at, compiled)
+        _cache.move_to_end(key)
+        while len(_cache) > SCHEDULE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
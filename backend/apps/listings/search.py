@@ -0,0 +1,199 @@
+"""
+Full-text search index for parking listings.
+
+PostgreSQL uses a generated, weighted ``tsvector`` column with a GIN
+index. SQLite uses an external-content FTS5 table kept in sync with
+``parking_listings`` by triggers. Any other backend falls back to the
+original ``icontains`` scan.
+
+Both index types support prefix matching (so results update while the
+user is still typing) and annotate matches with ``search_rank``.
+"""
+import re
+
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+LISTINGS_TABLE = 'parking_listings'
+FTS_TABLE = 'listing_search_fts'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+SEARCH_GIN_INDEX = 'parking_listings_search_gin'
+MAX_SEARCH_TERMS = 8
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# FTS5 bm25 column weights, in FTS5 column order
+FTS_COLUMNS = ('title', 'description', 'address', 'borough')
+FTS_WEIGHTS = '10.0, 1.0, 4.0, 6.0'
+
+POSTGRES_INSTALL_SQL = [
+    f"""
+    ALTER TABLE {LISTINGS_TABLE} ADD COLUMN IF NOT EXISTS {SEARCH_VECTOR_COLUMN} tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(borough, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(address, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_GIN_INDEX} ON {LISTINGS_TABLE} USING gin ({SEARCH_VECTOR_COLUMN})",
+]
+
+POSTGRES_UNINSTALL_SQL = [
+    f"DROP INDEX IF EXISTS {SEARCH_GIN_INDEX}",
+    f"ALTER TABLE {LISTINGS_TABLE} DROP COLUMN IF EXISTS {SEARCH_VECTOR_COLUMN}",
+]
+
+_fts_columns = ', '.join(FTS_COLUMNS)
+_new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+_old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+
+SQLITE_INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_fts_columns},
+        content='{LISTINGS_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {LISTINGS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_fts_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {LISTINGS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_fts_columns}) VALUES ('delete', old.id, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {LISTINGS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_fts_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_fts_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    # Re-index everything; cheap on dev databases and repairs the index after
+    # SQLite table rebuilds, which drop the triggers.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_index_available = {}
+
+
+def install_search_index(connection):
+    """Create (or repair) the search index for this connection's backend."""
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_INSTALL_SQL
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_INSTALL_SQL
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _index_available.pop(connection.alias, None)
+
+
+def uninstall_search_index(connection):
+    """Drop the search index for this connection's backend."""
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_UNINSTALL_SQL
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_UNINSTALL_SQL
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _index_available.pop(connection.alias, None)
+
+
+def search_index_available(connection):
+    """Return True if the search index exists on this connection."""
+    if connection.alias not in _index_available:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+                    [LISTINGS_TABLE, SEARCH_VECTOR_COLUMN]
+                )
+                available = cursor.fetchone() is not None
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [FTS_TABLE]
+                )
+                available = cursor.fetchone() is not None
+        else:
+            available = False
+        _index_available[connection.alias] = available
+    return _index_available[connection.alias]
+
+
+def tokenize(value):
+    """Split free-text search input into index-safe tokens."""
+    return TOKEN_RE.findall((value or '').lower())[:MAX_SEARCH_TERMS]
+
+
+def search_listings(queryset, value):
+    """
+    Filter a ParkingListing queryset by free-text search.
+
+    Every term must match (as a prefix) in title, description, address or
+    borough. When the index is available the queryset is annotated with
+    ``search_rank`` (higher is more relevant).
+    """
+    terms = tokenize(value)
+    if not terms:
+        return queryset
+
+    connection = connections[queryset.db]
+    if not search_index_available(connection):
+        return _search_icontains(queryset, terms)
+
+    table = connection.ops.quote_name(LISTINGS_TABLE)
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        vector = f'{table}.{SEARCH_VECTOR_COLUMN}'
+        return queryset.filter(
+            RawSQL(f"{vector} @@ to_tsquery('english', %s)", [tsquery], output_field=models.BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f"ts_rank_cd({vector}, to_tsquery('english', %s))", [tsquery], output_field=models.FloatField())
+        )
+
+    match = ' '.join(f'"{term}"*' for term in terms)
+    return queryset.filter(
+        RawSQL(
+            f'{table}."id" IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+            [match], output_field=models.BooleanField()
+        )
+    ).annotate(
+        # bm25() is lower-is-better, so negate it to match ts_rank_cd
+        search_rank=RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}."id")',
+            [match], output_field=models.FloatField()
+        )
+    )
+
+
+def _search_icontains(queryset, terms):
+    """Unindexed fallback: AND of OR'd icontains clauses per term."""
+    search_query = models.Q()
+    for term in terms:
+        search_query &= (
+            models.Q(title__icontains=term) |
+            models.Q(description__icontains=term) |
+            models.Q(address__icontains=term) |
+            models.Q(borough__icontains=term)
+        )
+    return queryset.filter(search_query)
@@ -1,7 +1,9 @@
 """
 Serializers for parking listings.
 """
+from django.db.models import QuerySet
 from rest_framework import serializers
+from .amenities import amenity_labels
 from .models import ParkingListing, ListingImage, ListingAvailability
 from .utils import PhotoPrivacyManager
 
@@ -36,7 +38,45 @@ class HostSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
 
-class ParkingListingSerializer(serializers.ModelSerializer):
+class PhotoPrivacyMixin:
+    """
+    Resolves photo-unlock state for every listing being serialized with a
+    single PhotoPrivacyManager lookup, cached in the serializer context.
+    """
+    
+    def get_request_user(self):
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return request.user
+        return None
+    
+    def is_photo_unlocked(self, obj):
+        """Return whether real photos of this listing are unlocked."""
+        user = self.get_request_user()
+        if user is None:
+            return False
+        
+        checked_ids, unlocked_ids = self.context.get('_photo_unlock_state', (set(), set()))
+        if obj.id not in checked_ids:
+            # Resolve the whole page (the root serializer's instances) at once
+            instances = self.root.instance
+            if not isinstance(instances, (list, tuple, QuerySet)):
+                instances = [instances]
+            listings = [
+                listing for listing in instances
+                if isinstance(listing, ParkingListing) and listing.id not in checked_ids
+            ]
+            if obj.id not in {listing.id for listing in listings}:
+                listings.append(obj)
+            
+            unlocked_ids = unlocked_ids | PhotoPrivacyManager.get_unlocked_listing_ids(listings, user)
+            checked_ids = checked_ids | {listing.id for listing in listings}
+            self.context['_photo_unlock_state'] = (checked_ids, unlocked_ids)
+        
+        return obj.id in unlocked_ids
+
+
+class ParkingListingSerializer(PhotoPrivacyMixin, serializers.ModelSerializer):
     """
     Serializer for parking listings.
     """
@@ -64,7 +104,7 @@ class ParkingListingSerializer(serializers.ModelSerializer):
     
     def get_amenities(self, obj):
         """Return list of amenities for the listing."""
-        return obj.get_amenities()
+        return amenity_labels(obj.amenity_mask)
     
     def get_availability_schedule(self, obj):
         """Return availability schedule for the listing."""
@@ -72,28 +112,25 @@ class ParkingListingSerializer(serializers.ModelSerializer):
     
     def get_images_unlocked(self, obj):
         """Check if images are unlocked for current user."""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return PhotoPrivacyManager.should_show_real_photos(obj, request.user)
+        return self.is_photo_unlocked(obj)
     
     def get_unlock_message(self, obj):
         """Get unlock message for images."""
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return 'Login to view photos after booking'
-        if not PhotoPrivacyManager.should_show_real_photos(obj, request.user):
+        if not self.is_photo_unlocked(obj):
             return 'Photos will be visible after booking confirmation'
         return None
     
     def to_representation(self, instance):
         """Override to apply photo privacy filtering."""
         data = super().to_representation(instance)
-        request = self.context.get('request')
-        user = request.user if request and request.user.is_authenticated else None
         
         # Apply photo privacy filtering
-        return PhotoPrivacyManager.filter_listing_images(instance, user, data)
+        return PhotoPrivacyManager.filter_listing_images(
+            instance, self.get_request_user(), data, unlocked=self.is_photo_unlocked(instance)
+        )
     
     def create(self, validated_data):
         """Create a new parking listing."""
@@ -107,7 +144,7 @@ class ParkingListingSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ParkingListingListSerializer(serializers.ModelSerializer):
+class ParkingListingListSerializer(PhotoPrivacyMixin, serializers.ModelSerializer):
     """
     Simplified serializer for listing lists (less data for performance).
     """
@@ -129,23 +166,20 @@ class ParkingListingListSerializer(serializers.ModelSerializer):
     
     def get_amenities(self, obj):
         """Return list of amenities for the listing."""
-        return obj.get_amenities()
+        return amenity_labels(obj.amenity_mask)
     
     def get_images_unlocked(self, obj):
         """Check if images are unlocked for current user."""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return PhotoPrivacyManager.should_show_real_photos(obj, request.user)
+        return self.is_photo_unlocked(obj)
     
     def to_representation(self, instance):
         """Override to apply photo privacy filtering."""
         data = super().to_representation(instance)
-        request = self.context.get('request')
-        user = request.user if request and request.user.is_authenticated else None
         
         # Apply photo privacy filtering
-        return PhotoPrivacyManager.filter_listing_images(instance, user, data)
+        return PhotoPrivacyManager.filter_listing_images(
+            instance, self.get_request_user(), data, unlocked=self.is_photo_unlocked(instance)
+        )
 
 
 class ListingAvailabilitySerializer(serializers.ModelSerializer):
@@ -0,0 +1,87 @@
+"""
+Signals for the listings app.
+"""
+from django.db import connections
+from django.db.models.signals import post_migrate, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.bookings.transitions import bookings_created, bookings_transitioned
+
+from .calendar_feed import invalidate_host_listings
+from .free_slots import bump_calendar_version
+from .models import ListingAvailability, ListingImage, ParkingListing
+from .occupancy import rebuild_occupancy
+from .response_cache import bump_listing_version
+from .search import install_search_index
+
+
+@receiver(post_migrate)
+def ensure_listing_search_index(sender, using='default', **kwargs):
+    """
+    Repair the SQLite FTS index after migrations.
+
+    SQLite rebuilds tables for most schema changes, which silently drops
+    the triggers that keep the FTS table in sync. PostgreSQL's generated
+    column is managed by migration 0011 alone.
+    """
+    if getattr(sender, 'name', None) != 'apps.listings':
+        return
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        install_search_index(connection)
+
+
+@receiver(post_save, sender=ListingAvailability)
+@receiver(post_delete, sender=ListingAvailability)
+def update_occupancy_on_block_change(sender, instance, **kwargs):
+    """Refresh the listing's busy intervals when a blocked period changes."""
+    rebuild_occupancy([instance.listing_id])
+    bump_calendar_version(instance.listing_id)
+
+
+@receiver(post_save, sender='bookings.Booking')
+@receiver(post_delete, sender='bookings.Booking')
+def update_occupancy_on_booking_change(sender, instance, **kwargs):
+    """Refresh the listing's busy intervals when a booking changes."""
+    rebuild_occupancy([instance.parking_space_id])
+    bump_calendar_version(instance.parking_space_id)
+
+
+@receiver(bookings_transitioned)
+@receiver(bookings_created)
+def update_occupancy_on_bulk_transition(sender, parking_space_ids, **kwargs):
+    """Refresh busy intervals once for every listing touched by a bulk transition or insert."""
+    rebuild_occupancy(parking_space_ids)
+    for listing_id in parking_space_ids:
+        bump_calendar_version(listing_id)
+
+
+@receiver(post_save, sender=ParkingListing)
+@receiver(post_delete, sender=ParkingListing)
+def invalidate_cached_listing(sender, instance, **kwargs):
+    """Expire cached anonymous responses that include this listing."""
+    bump_listing_version(instance.pk)
+
+
+@receiver(post_save, sender=ParkingListing)
+@receiver(post_delete, sender=ParkingListing)
+def invalidate_listing_calendar(sender, instance, **kwargs):
+    """Rebuild calendar feeds that show this listing's title or address."""
+    bump_calendar_version(instance.pk)
+    invalidate_host_listings(instance.host_id)
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+def invalidate_cached_listing_on_image_change(sender, instance, **kwargs):
+    """Expire cached responses when a listing's images change."""
+    bump_listing_version(instance.listing_id)
+
+
+@receiver(post_save, sender='users.User')
+def invalidate_cached_listings_on_host_change(sender, instance, update_fields=None, **kwargs):
+    """Expire cached responses that embed a host's details."""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    for listing_id in ParkingListing.objects.filter(host=instance).values_list('id', flat=True):
+        bump_listing_version(listing_id)
@@ -0,0 +1,654 @@
+"""
+Basic tests for listings app.
+"""
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+def create_user(username, **kwargs):
+    """Create a user named ``username`` with a matching example.com email."""
+    kwargs.setdefault('email', f'{username}@example.com')
+    return User.objects.create_user(username=username, password='testpass123', **kwargs)
+
+
+def create_listing(host, **kwargs):
+    """Create an approved listing with sensible defaults."""
+    from .models import ParkingListing
+
+    defaults = {
+        'title': 'Test Parking',
+        'address': '123 Test St',
+        'borough': 'Manhattan',
+        'space_type': 'garage',
+        'hourly_rate': Decimal('10.00'),
+        'daily_rate': Decimal('50.00'),
+        'weekly_rate': Decimal('300.00'),
+        'approval_status': ParkingListing.ApprovalStatus.APPROVED,
+    }
+    defaults.update(kwargs)
+    return ParkingListing.objects.create(host=host, **defaults)
+
+
+class GeoUtilsTest(TestCase):
+    """Test geohash and distance helpers."""
+
+    def test_encode_geohash(self):
+        """Test geohash encoding against a known value."""
+        from .geo import encode_geohash
+
+        # Times Square
+        self.assertEqual(encode_geohash(40.7580, -73.9855, 6), 'dr5ru7')
+
+    def test_haversine_km(self):
+        """Test haversine distance between two Manhattan points."""
+        from .geo import haversine_km
+
+        # Times Square to Empire State Building is about 1.05 km
+        distance = haversine_km(40.7580, -73.9855, 40.7484, -73.9857)
+        self.assertAlmostEqual(distance, 1.07, delta=0.05)
+
+    def test_neighbor_cells_cover_radius(self):
+        """Test that the 3x3 cell block contains every point inside the radius."""
+        from .geo import encode_geohash, neighbor_cells, precision_for_radius
+
+        lat, lng, radius = 40.7580, -73.9855, 2.0
+        precision = precision_for_radius(lat, radius)
+        cells = neighbor_cells(lat, lng, precision)
+
+        # Points just inside the radius in each compass direction
+        offsets = [(0.0179, 0), (-0.0179, 0), (0, 0.0236), (0, -0.0236)]
+        for d_lat, d_lng in offsets:
+            point_cell = encode_geohash(lat + d_lat, lng + d_lng, precision)
+            self.assertIn(point_cell, cells)
+
+
+class NearbyListingsTest(TestCase):
+    """Test the nearby radius search endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.host = create_user('host')
+
+    def test_geohash_maintained_on_save(self):
+        """Test that the geohash cell follows the coordinates."""
+        listing = create_listing(self.host, latitude=Decimal('40.7580'), longitude=Decimal('-73.9855'))
+        self.assertTrue(listing.geohash.startswith('dr5ru7'))
+
+        listing.latitude = None
+        listing.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.geohash, '')
+
+    def test_nearby_sorted_and_within_radius(self):
+        """Test that nearby returns only listings in the radius, nearest first."""
+        far = create_listing(self.host, title='Empire State', latitude=Decimal('40.7484'), longitude=Decimal('-73.9857'))
+        near = create_listing(self.host, title='Times Square', latitude=Decimal('40.7585'), longitude=Decimal('-73.9850'))
+        create_listing(self.host, title='Brooklyn', latitude=Decimal('40.6782'), longitude=Decimal('-73.9442'))
+
+        response = self.client.get('/api/v1/listings/nearby/', {
+            'lat': '40.7580', 'lng': '-73.9855', 'radius': '2'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [near.id, far.id])
+        self.assertLess(results[0]['distance_km'], results[1]['distance_km'])
+
+
+class ListingSearchTest(TestCase):
+    """Test the full-text listing search index."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.host = create_user('host')
+
+    def test_prefix_match_and_ranking(self):
+        """Test that partial terms match and title hits rank first."""
+        from .models import ParkingListing
+        from .search import search_listings
+
+        in_title = create_listing(self.host, title='Brooklyn Heights Garage')
+        in_description = create_listing(self.host, title='Quiet spot', description='Short walk to Brooklyn Bridge')
+        create_listing(self.host, title='Midtown Lot')
+
+        results = list(search_listings(ParkingListing.objects.all(), 'brookl').order_by('-search_rank'))
+        self.assertEqual(results, [in_title, in_description])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test that the index is maintained when listings change."""
+        from .models import ParkingListing
+        from .search import search_listings
+
+        listing = create_listing(self.host, title='Astoria Driveway')
+        listing.title = 'Flushing Driveway'
+        listing.save()
+
+        self.assertFalse(search_listings(ParkingListing.objects.all(), 'astoria').exists())
+        self.assertTrue(search_listings(ParkingListing.objects.all(), 'flush').exists())
+
+        listing.delete()
+        self.assertFalse(search_listings(ParkingListing.objects.all(), 'flush').exists())
+
+    def test_list_endpoint_search(self):
+        """Test that ?search= on the list endpoint uses the index."""
+        match = create_listing(self.host, title='Harlem Garage')
+        create_listing(self.host, title='Chelsea Garage')
+
+        response = self.client.get('/api/v1/listings/', {'search': 'harl gar'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [match.id])
+
+
+class OccupancyIndexTest(TestCase):
+    """Test the precomputed occupancy index behind the availability filters."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+
+    def test_merge_intervals(self):
+        """Test that overlapping and touching intervals merge."""
+        from .occupancy import merge_intervals
+
+        self.assertEqual(
+            merge_intervals([(5, 7), (1, 3), (2, 4), (4, 5), (9, 10)]),
+            [(1, 7), (9, 10)]
+        )
+
+    def test_available_now_tracks_bookings_and_blocks(self):
+        """Test that available_now follows booking and block changes."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.bookings.models import Booking
+        from .filters import ParkingListingFilter
+        from .models import ParkingListing, ListingAvailability
+
+        booked = create_listing(self.host, title='Booked')
+        blocked = create_listing(self.host, title='Blocked')
+        free = create_listing(self.host, title='Free')
+        now = timezone.now()
+
+        booking = Booking.objects.create(
+            user=self.guest,
+            parking_space=booked,
+            start_time=now + timedelta(minutes=30),
+            end_time=now + timedelta(hours=3),
+            hourly_rate=Decimal('10.00'),
+            vehicle_license_plate='ABC123',
+            status='confirmed',
+        )
+        ListingAvailability.objects.create(
+            listing=blocked,
+            start_datetime=now - timedelta(hours=1),
+            end_datetime=now + timedelta(hours=1),
+        )
+
+        def available_now():
+            filterset = ParkingListingFilter({'available_now': True}, queryset=ParkingListing.objects.all())
+            return set(filterset.qs)
+
+        self.assertEqual(available_now(), {free})
+
+        booking.status = 'cancelled'
+        booking.save()
+        blocked.unavailable_periods.all().delete()
+
+        self.assertEqual(available_now(), {booked, blocked, free})
+
+
+class PhotoPrivacyBatchTest(TestCase):
+    """Test batched photo-unlock resolution in listing serializers."""
+
+    def setUp(self):
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+
+    def _serialize(self, user, listings):
+        from unittest.mock import MagicMock
+        from .serializers import ParkingListingListSerializer
+        from django.db.models import prefetch_related_objects
+
+        prefetch_related_objects(listings, 'images')
+
+        request = MagicMock()
+        request.user = user
+        request.build_absolute_uri.side_effect = lambda url: url
+        return ParkingListingListSerializer(listings, many=True, context={'request': request}).data
+
+    def test_one_query_for_page(self):
+        """Test that a page of listings resolves unlock state with one query."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.bookings.models import Booking
+
+        listings = [create_listing(self.host, title=f'Spot {i}') for i in range(5)]
+        start = timezone.now() + timedelta(days=1)
+        Booking.objects.create(
+            user=self.guest,
+            parking_space=listings[2],
+            start_time=start,
+            end_time=start + timedelta(hours=2),
+            hourly_rate=Decimal('10.00'),
+            vehicle_license_plate='ABC123',
+            status='confirmed',
+        )
+        own = create_listing(self.guest, title='Own spot')
+
+        # One prefetch for images, one for the unlock state
+        with self.assertNumQueries(2):
+            data = self._serialize(self.guest, listings + [own])
+
+        unlocked = {item['id'] for item in data if item['images_unlocked']}
+        self.assertEqual(unlocked, {listings[2].id, own.id})
+
+    def test_anonymous_makes_no_queries(self):
+        """Test that anonymous users resolve unlock state without queries."""
+        from django.contrib.auth.models import AnonymousUser
+
+        listings = [create_listing(self.host, title=f'Spot {i}') for i in range(3)]
+
+        # Only the images prefetch
+        with self.assertNumQueries(1):
+            data = self._serialize(AnonymousUser(), listings)
+
+        self.assertFalse(any(item['images_unlocked'] for item in data))
+
+
+class CompiledScheduleTest(TestCase):
+    """Test the compiled availability schedule."""
+
+    def setUp(self):
+        import pytz
+        from django.conf import settings
+
+        self.tz = pytz.timezone(settings.TIME_ZONE)
+        open_day = {'available': True, 'start': '08:00', 'end': '18:00'}
+        self.schedule = {
+            'monday': open_day,
+            'tuesday': open_day,
+            'wednesday': {'available': True, 'start': 'bad', 'end': '18:00'},
+            'thursday': open_day,
+            'friday': {'available': False},
+            'saturday': open_day,
+        }
+
+    def _at(self, day, hour, minute=0):
+        from datetime import datetime
+
+        # 2024-01-01 is a Monday
+        return self.tz.localize(datetime(2024, 1, day, hour, minute))
+
+    def test_check_reasons(self):
+        """Test fit results and reasons for each kind of violation."""
+        from .schedule import CompiledSchedule
+
+        compiled = CompiledSchedule(self.schedule)
+
+        self.assertTrue(compiled.fits(self._at(1, 8), self._at(1, 18)))
+        self.assertTrue(compiled.fits(self._at(1, 17), self._at(2, 9)))
+        self.assertEqual(
+            compiled.check(self._at(1, 7, 30), self._at(1, 9)).reason,
+            'Parking space opens at 08:00 on Monday'
+        )
+        self.assertEqual(
+            compiled.check(self._at(2, 17), self._at(2, 18, 1)).reason,
+            'Parking space closes at 18:00 on Tuesday'
+        )
+        self.assertEqual(
+            compiled.check(self._at(5, 9), self._at(5, 10)).reason,
+            'Parking space is not available on Friday'
+        )
+        self.assertEqual(
+            compiled.check(self._at(7, 9), self._at(7, 10)).reason,
+            'Parking space schedule not configured for Sunday'
+        )
+
+        # Unparseable days are skipped, except in strict mode
+        self.assertTrue(compiled.fits(self._at(3, 1), self._at(3, 23)))
+        self.assertFalse(compiled.check(self._at(3, 9), self._at(3, 10), strict=True).fits)
+
+    def test_cached_against_updated_at(self):
+        """Test that the compiled schedule is reused until the listing changes."""
+        from .schedule import get_compiled_schedule
+
+        host = create_user('host')
+        listing = create_listing(host, availability_schedule=self.schedule)
+
+        compiled = get_compiled_schedule(listing)
+        self.assertIs(get_compiled_schedule(listing), compiled)
+
+        listing.availability_schedule = {**self.schedule, 'friday': {'available': True, 'start': '08:00', 'end': '18:00'}}
+        listing.save()
+        recompiled = get_compiled_schedule(listing)
+        self.assertIsNot(recompiled, compiled)
+        self.assertTrue(recompiled.fits(self._at(5, 9), self._at(5, 10)))
+
+
+class FreeSlotsTest(TestCase):
+    """Test the free-slot calendar."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.host = create_user('host')
+        self.guest = create_user('guest')
+
+    def test_sweep_free_intervals(self):
+        """Test that busy intervals are cut out of the open windows."""
+        from .free_slots import sweep_free_intervals
+
+        self.assertEqual(
+            sweep_free_intervals([(0, 10), (10, 14), (20, 30)], [(2, 4), (3, 5), (12, 22), (28, 30)]),
+            [(0, 2), (5, 12), (22, 28)]
+        )
+
+    def test_endpoint_follows_bookings(self):
+        """Test that free slots exclude bookings and refresh when they change."""
+        import pytz
+        from datetime import date, datetime, timedelta
+        from django.conf import settings
+        from django.core.cache import caches
+        from django.test import override_settings
+        from apps.bookings.models import Booking
+
+        schedule = {
+            day: {'available': True, 'start': '08:00', 'end': '18:00'}
+            for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        }
+        listing = create_listing(self.host, availability_schedule=schedule)
+        day = date.today() + timedelta(days=2)
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            caches['default'].clear()
+            url = f'/api/v1/listings/{listing.id}/free_slots/'
+            params = {'start_date': day.isoformat(), 'days': 1}
+
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['free_slots']), 1)
+
+            tz = pytz.timezone(settings.TIME_ZONE)
+            booking = Booking.objects.create(
+                user=self.guest,
+                parking_space=listing,
+                start_time=tz.localize(datetime.combine(day, datetime.min.time()).replace(hour=10)),
+                end_time=tz.localize(datetime.combine(day, datetime.min.time()).replace(hour=12)),
+                hourly_rate=Decimal('10.00'),
+                vehicle_license_plate='ABC123',
+                status='confirmed',
+            )
+
+            slots = self.client.get(url, params).data['free_slots']
+            self.assertEqual(len(slots), 2)
+            self.assertTrue(slots[0]['end'].startswith(f'{day.isoformat()}T10:00'))
+            self.assertTrue(slots[1]['start'].startswith(f'{day.isoformat()}T12:00'))
+
+            booking.delete()
+            self.assertEqual(len(self.client.get(url, params).data['free_slots']), 1)
+
+    def test_endpoint_follows_holds(self):
+        """Test that active holds are busy and released or expired holds are free again."""
+        import pytz
+        from datetime import date, datetime, timedelta
+        from django.conf import settings
+        from django.core.cache import caches
+        from django.test import override_settings
+        from django.utils import timezone
+        from apps.bookings.holds import create_hold, expire_holds, release_hold
+
+        schedule = {
+            day: {'available': True, 'start': '08:00', 'end': '18:00'}
+            for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        }
+        listing = create_listing(self.host, availability_schedule=schedule)
+        day = date.today() + timedelta(days=2)
+        tz = pytz.timezone(settings.TIME_ZONE)
+        start = tz.localize(datetime.combine(day, datetime.min.time()).replace(hour=10))
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            caches['default'].clear()
+            url = f'/api/v1/listings/{listing.id}/free_slots/'
+            params = {'start_date': day.isoformat(), 'days': 1}
+            self.assertEqual(len(self.client.get(url, params).data['free_slots']), 1)
+
+            hold = create_hold(self.guest, listing, start, start + timedelta(hours=2), vehicle_license_plate='ABC123')
+            self.assertEqual(len(self.client.get(url, params).data['free_slots']), 2)
+            release_hold(hold.hold_id, self.guest)
+            self.assertEqual(len(self.client.get(url, params).data['free_slots']), 1)
+
+            create_hold(self.guest, listing, start, start + timedelta(hours=2), vehicle_license_plate='ABC123')
+            self.assertEqual(len(self.client.get(url, params).data['free_slots']), 2)
+            self.assertEqual(expire_holds(timezone.now() + timedelta(hours=1)), 1)
+            self.assertEqual(len(self.client.get(url, params).data['free_slots']), 1)
+
+
+class AmenityMaskTest(TestCase):
+    """Test the packed amenity bitmask."""
+
+    def setUp(self):
+        self.host = create_user('host')
+
+    def test_mask_maintained_and_labelled(self):
+        """Test that the mask follows the flags, including update_fields saves."""
+        listing = create_listing(self.host, is_covered=True, has_car_wash=True)
+        self.assertEqual(listing.get_amenities(), ['Covered', 'Car Wash'])
+
+        listing.has_cctv = True
+        listing.save(update_fields=['has_cctv'])
+        listing.refresh_from_db()
+
+        from .amenities import amenity_labels
+
+        self.assertEqual(amenity_labels(listing.amenity_mask), ['Covered', 'CCTV Monitoring', 'Car Wash'])
+
+    def test_filters_use_mask(self):
+        """Test the amenities and boolean amenity filters."""
+        from .filters import ParkingListingFilter
+        from .models import ParkingListing
+
+        covered = create_listing(self.host, title='Covered', is_covered=True)
+        gated = create_listing(self.host, title='Gated', has_gated_access=True, has_cctv=True)
+        plain = create_listing(self.host, title='Plain')
+
+        def run(params):
+            return set(ParkingListingFilter(params, queryset=ParkingListing.objects.all()).qs)
+
+        self.assertEqual(run({'amenities': 'covered,gated'}), {covered, gated})
+        self.assertEqual(run({'has_cctv': 'true'}), {gated})
+        self.assertEqual(run({'is_covered': 'false'}), {gated, plain})
+        self.assertEqual(run({'amenities': 'unknown'}), {covered, gated, plain})
+
+
+class KeysetPaginationTest(TestCase):
+    """Test cursor pagination on the listing feed."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.host = create_user('host')
+
+    def test_walk_forward_and_back(self):
+        """Test that cursors visit every listing once and can step back."""
+        from django.utils import timezone
+        from .models import ParkingListing
+
+        listings = [create_listing(self.host, title=f'Spot {i}') for i in range(7)]
+        # Force ties on created_at so the id tiebreaker matters
+        ParkingListing.objects.filter(id__in=[l.id for l in listings[:4]]).update(created_at=timezone.now())
+        expected = list(ParkingListing.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        response = self.client.get('/api/v1/listings/', {'cursor': '', 'page_size': 3, 'count': 'exact'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 7)
+        self.assertIsNone(response.data['previous'])
+
+        seen, pages = [], []
+        while True:
+            pages.append(response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, expected)
+        self.assertNotIn('count', pages[1])
+
+        previous = self.client.get(pages[2]['previous'])
+        self.assertEqual(
+            [item['id'] for item in previous.data['results']],
+            [item['id'] for item in pages[1]['results']]
+        )
+
+    def test_invalid_cursor(self):
+        """Test that a garbage cursor is a 404, like DRF's cursor pagination."""
+        response = self.client.get('/api/v1/listings/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ListingResponseCacheTest(TestCase):
+    """Test the anonymous listing response cache."""
+
+    def setUp(self):
+        from django.core.cache import caches
+        from django.test import override_settings
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        self.override = override_settings(CACHES=locmem)
+        self.override.enable()
+        caches['default'].clear()
+
+        self.client = APIClient()
+        self.host = create_user('host')
+
+    def tearDown(self):
+        self.override.disable()
+
+    def test_list_cached_until_listing_changes(self):
+        """Test that repeated anonymous list requests hit the cache until a save."""
+        listing = create_listing(self.host, title='Harlem Garage')
+        params = {'borough': 'Manhattan', 'min_price': '5'}
+
+        first = self.client.get('/api/v1/listings/', params)
+        self.assertEqual(first.status_code, 200)
+
+        # Same filters in a different order: served from the cache
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/v1/listings/?min_price=5&borough=Manhattan')
+        self.assertEqual(second.data, first.data)
+
+        listing.title = 'Harlem Lot'
+        listing.save()
+        third = self.client.get('/api/v1/listings/', params)
+        self.assertEqual(third.data['results'][0]['title'], 'Harlem Lot')
+
+    def test_detail_etag(self):
+        """Test conditional GETs on the detail endpoint."""
+        from django.core.cache import caches
+
+        listing = create_listing(self.host)
+        url = f'/api/v1/listings/{listing.id}/'
+
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        listing.images.create(image='listings/a.jpg', alt_text='Front')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # A version lost to eviction is not reissued, so old ETags stay stale
+        caches['default'].clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_time_dependent_filters_not_cached(self):
+        """Test that availability filters bypass the cache."""
+        create_listing(self.host)
+        self.client.get('/api/v1/listings/', {'available_now': 'true'})
+        response = self.client.get('/api/v1/listings/', {'available_now': 'true'})
+        self.assertNotIn('ETag', response)
+
+
+class CalendarFeedTest(TestCase):
+    """Test the cached iCalendar feeds."""
+
+    def setUp(self):
+        from django.core.cache import caches
+        from django.test import override_settings
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        self.override = override_settings(CACHES=locmem)
+        self.override.enable()
+        caches['default'].clear()
+
+        self.host = create_user('host')
+        self.guest = create_user('guest', first_name='Gina')
+        self.listing = create_listing(self.host, title='Harlem Garage, Lot B')
+
+    def tearDown(self):
+        self.override.disable()
+
+    def book(self, hours_from_now):
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.bookings.models import Booking
+
+        start = timezone.now() + timedelta(hours=hours_from_now)
+        return Booking.objects.create(
+            user=self.guest, parking_space=self.listing, start_time=start, end_time=start + timedelta(hours=1),
+            hourly_rate=self.listing.hourly_rate, vehicle_license_plate='ABC123', status='confirmed',
+        )
+
+    def test_listing_feed_cached_until_bookings_change(self):
+        """Test feed contents, ETags and that an unchanged feed needs no queries."""
+        from .calendar_feed import feed_token
+
+        booking = self.book(24)
+        client = APIClient()
+        client.force_authenticate(user=self.host)
+        feed_url = client.get(f'/api/v1/listings/{self.listing.id}/calendar_feeds/').data['listing_feed_url']
+        path = feed_url.split('testserver', 1)[1]
+
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(f'UID:booking-{booking.booking_id}@parkinginapinch.com', body)
+        self.assertIn('SUMMARY:Booked: Harlem Garage\\, Lot B', body)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path).content, response.content)
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        second = self.book(48)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(second.booking_id, response.content.decode())
+
+        wrong_token = f'/api/v1/listings/{self.listing.id}/calendar.ics?token=nope'
+        self.assertEqual(self.client.get(wrong_token).status_code, 404)
+        host_path = f"/api/v1/listings/calendar/host/{self.host.id}.ics?token={feed_token('host', self.host.id)}"
+        self.assertEqual(self.client.get(host_path).content.decode().count('BEGIN:VEVENT'), 2)
+
+    def test_evicted_version_not_reissued(self):
+        """Test that a feed cached before its version was evicted is rebuilt after a bump."""
+        from django.core.cache import cache
+        from .calendar_feed import listing_feed
+        from .free_slots import bump_calendar_version, calendar_version_key
+
+        first = self.book(24)
+        cache.delete(calendar_version_key(self.listing.id))
+        bump_calendar_version(self.listing.id)
+        listing_feed(self.listing.id)
+
+        first.delete()
+        # The version is evicted before the next bump
+        cache.delete(calendar_version_key(self.listing.id))
+        bump_calendar_version(self.listing.id)
+        _, body = listing_feed(self.listing.id)
+        self.assertNotIn(first.booking_id, body)
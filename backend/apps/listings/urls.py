@@ -8,6 +8,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 from .views import ParkingListingViewSet, ListingImageViewSet, MyListingsView
 from .admin_views import AdminListingViewSet
+from .calendar_views import host_calendar_feed, listing_calendar_feed
 
 app_name = 'listings'
 
@@ -56,8 +57,14 @@ urlpatterns = [
     # Custom actions - these MUST come before the detail view to avoid conflicts
     path('<int:pk>/toggle_status/', ParkingListingViewSet.as_view({'post': 'toggle_status'}), name='listings-toggle-status'),
     path('<int:pk>/availability/', ParkingListingViewSet.as_view({'get': 'availability'}), name='listings-availability'),
+    path('<int:pk>/free_slots/', ParkingListingViewSet.as_view({'get': 'free_slots'}), name='listings-free-slots'),
+    path('<int:pk>/calendar_feeds/', ParkingListingViewSet.as_view({'get': 'calendar_feeds'}), name='listings-calendar-feeds'),
     path('nearby/', ParkingListingViewSet.as_view({'get': 'nearby'}), name='listings-nearby'),
     
+    # iCalendar feeds (token-authorized, for calendar apps)
+    path('<int:listing_id>/calendar.ics', listing_calendar_feed, name='listing-calendar-feed'),
+    path('calendar/host/<int:host_id>.ics', host_calendar_feed, name='host-calendar-feed'),
+    
     # Detail endpoint MUST come last since it will match <int:pk>/
     path('<int:pk>/', ParkingListingViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='listings-detail'),
     
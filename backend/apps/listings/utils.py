@@ -2,7 +2,7 @@
 Utility functions for listings app
 """
 
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Set, Union
 from django.db.models import Q
 from apps.bookings.models import Booking
 
@@ -22,6 +22,9 @@ class PhotoPrivacyManager:
         'default': 'https://images.unsplash.com/photo-1590674899484-d5640e854abe?w=500&h=300&fit=crop&crop=center'
     }
     
+    # Booking statuses that unlock real photos for the renter
+    UNLOCKING_BOOKING_STATUSES = ['confirmed', 'active', 'completed']
+    
     @classmethod
     def should_show_real_photos(cls, listing, user) -> bool:
         """
@@ -45,11 +48,47 @@ class PhotoPrivacyManager:
         has_confirmed_booking = Booking.objects.filter(
             user=user,
             parking_space=listing,
-            status__in=['confirmed', 'active', 'completed']
+            status__in=cls.UNLOCKING_BOOKING_STATUSES
         ).exists()
         
         return has_confirmed_booking
     
+    @classmethod
+    def get_unlocked_listing_ids(cls, listings, user) -> Set[int]:
+        """
+        Batch version of should_show_real_photos for many listings
+        
+        Args:
+            listings: Iterable of ParkingListing instances
+            user: User instance (can be None for anonymous users)
+            
+        Returns:
+            set: IDs of listings whose real photos the user may see,
+            resolved with at most one query
+        """
+        if not user or not user.is_authenticated:
+            return set()
+        
+        listing_ids = set()
+        unlocked_ids = set()
+        for listing in listings:
+            # Host always sees their own photos
+            if listing.host_id == user.id:
+                unlocked_ids.add(listing.id)
+            else:
+                listing_ids.add(listing.id)
+        
+        if listing_ids:
+            unlocked_ids.update(
+                Booking.objects.filter(
+                    user=user,
+                    parking_space_id__in=listing_ids,
+                    status__in=cls.UNLOCKING_BOOKING_STATUSES
+                ).order_by().values_list('parking_space_id', flat=True).distinct()
+            )
+        
+        return unlocked_ids
+    
     @classmethod
     def get_placeholder_image(cls, space_type: str) -> str:
         """
@@ -58,7 +97,7 @@ class PhotoPrivacyManager:
         return cls.PLACEHOLDER_IMAGES.get(space_type, cls.PLACEHOLDER_IMAGES['default'])
     
     @classmethod
-    def filter_listing_images(cls, listing, user, serialized_data: Dict) -> Dict:
+    def filter_listing_images(cls, listing, user, serialized_data: Dict, unlocked: Optional[bool] = None) -> Dict:
         """
         Filter listing images based on privacy settings
         
@@ -66,11 +105,15 @@ class PhotoPrivacyManager:
             listing: ParkingListing instance
             user: User instance
             serialized_data: Serialized listing data
+            unlocked: Precomputed unlock state (skips the lookup if given)
             
         Returns:
             Modified serialized data with filtered images
         """
-        if cls.should_show_real_photos(listing, user):
+        if unlocked is None:
+            unlocked = cls.should_show_real_photos(listing, user)
+        
+        if unlocked:
             # Add privacy metadata
             serialized_data['images_unlocked'] = True
             return serialized_data
@@ -114,7 +157,7 @@ class PhotoPrivacyManager:
         confirmed_booking_subquery = Booking.objects.filter(
             user=user,
             parking_space=OuterRef('pk'),
-            status__in=['confirmed', 'active', 'completed']
+            status__in=cls.UNLOCKING_BOOKING_STATUSES
         )
         
         return queryset.annotate(
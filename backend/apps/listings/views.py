@@ -1,11 +1,15 @@
 """
 Views for parking listings.
 """
-from rest_framework import viewsets, permissions, status, filters, generics
+from rest_framework import viewsets, permissions, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date
+from apps.common.pagination import CursorOrPageNumberPagination
 from .models import ParkingListing, ListingImage
 from .serializers import (
     ParkingListingSerializer,
@@ -14,7 +18,11 @@ from .serializers import (
     UpdateListingSerializer,
     ListingImageSerializer
 )
-from .filters import ParkingListingFilter
+from .filters import ParkingListingFilter, ListingSearchFilter, ListingOrderingFilter
+from .geo import neighbor_cells, precision_for_radius, rank_by_distance
+from .calendar_feed import feed_token
+from .free_slots import FREE_SLOTS_MAX_DAYS, get_free_slots
+from .response_cache import cached_listing_response
 
 
 class ParkingListingViewSet(viewsets.ModelViewSet):
@@ -24,11 +32,13 @@ class ParkingListingViewSet(viewsets.ModelViewSet):
     # Show all listings when authentication is disabled, otherwise show only approved ones
     queryset = ParkingListing.objects.filter(is_active=True)
     permission_classes = [permissions.AllowAny]  # TEMPORARILY DISABLED FOR 403 FIX
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = CursorOrPageNumberPagination
+    filter_backends = [DjangoFilterBackend, ListingSearchFilter, ListingOrderingFilter]
     filterset_class = ParkingListingFilter
     search_fields = ['title', 'description', 'address', 'borough']
     ordering_fields = ['created_at', 'hourly_rate', 'daily_rate', 'rating_average']
     ordering = ['-created_at']
+    NEARBY_MAX_RADIUS_KM = 50.0
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -76,6 +86,20 @@ class ParkingListingViewSet(viewsets.ModelViewSet):
         
         return self.queryset
     
+    def list(self, request, *args, **kwargs):
+        """List listings; anonymous responses come from the response cache."""
+        return cached_listing_response(
+            request, lambda: super(ParkingListingViewSet, self).list(request, *args, **kwargs)
+        )
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a listing; anonymous responses come from the response cache."""
+        return cached_listing_response(
+            request,
+            lambda: super(ParkingListingViewSet, self).retrieve(request, *args, **kwargs),
+            listing_id=kwargs.get('pk')
+        )
+    
     def perform_create(self, serializer):
         """Create listing with current user as host."""
         try:
@@ -149,38 +173,67 @@ class ParkingListingViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def nearby(self, request):
-        """Get listings near a specific location."""
+        """Get listings within a radius of a location, nearest first."""
         lat = request.query_params.get('lat')
         lng = request.query_params.get('lng')
-        radius = float(request.query_params.get('radius', 5))  # Default 5 km
-        
+
         if not lat or not lng:
             return Response(
                 {'error': 'Latitude and longitude are required.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+
         try:
             lat = float(lat)
             lng = float(lng)
+            radius = float(request.query_params.get('radius', 5))  # Default 5 km
         except ValueError:
             return Response(
-                {'error': 'Invalid latitude or longitude.'},
+                {'error': 'Invalid latitude, longitude or radius.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Simple distance filter (in a real app, you'd use PostGIS for proper geo queries)
-        # This is a rough approximation for demonstration
-        lat_range = radius / 111.0  # Rough km to degree conversion
-        lng_range = radius / (111.0 * abs(lat))  # Adjust for latitude
-        
-        queryset = self.get_queryset().filter(
-            latitude__range=(lat - lat_range, lat + lat_range),
-            longitude__range=(lng - lng_range, lng + lng_range)
+
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or radius <= 0:
+            return Response(
+                {'error': 'Coordinates out of range or radius not positive.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        radius = min(radius, self.NEARBY_MAX_RADIUS_KM)
+
+        # Cell prefilter: only rows in the 3x3 block of geohash cells around
+        # the centre can be inside the radius (indexed prefix match).
+        precision = precision_for_radius(lat, radius)
+        cell_query = Q()
+        for cell in neighbor_cells(lat, lng, precision):
+            cell_query |= Q(geohash__startswith=cell)
+
+        candidates = self.get_queryset().filter(cell_query).values_list('id', 'latitude', 'longitude')
+
+        # Exact haversine check, nearest first
+        ranked = rank_by_distance(candidates, lat, lng, radius)
+
+        page = self.paginate_queryset(ranked)
+        window = page if page is not None else ranked
+
+        listings = ParkingListing.objects.select_related('host').prefetch_related('images').in_bulk(
+            [listing_id for _, listing_id in window]
         )
-        
-        serializer = ParkingListingListSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        results = []
+        for distance, listing_id in window:
+            listing = listings.get(listing_id)
+            if listing is None:
+                continue
+            listing.distance_km = distance
+            results.append(listing)
+
+        serializer = ParkingListingListSerializer(results, many=True, context={'request': request})
+        data = serializer.data
+        for item, listing in zip(data, results):
+            item['distance_km'] = round(listing.distance_km, 3)
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
     
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
@@ -204,6 +257,64 @@ class ParkingListingViewSet(viewsets.ModelViewSet):
         is_available = not unavailable_periods.exists()
         
         return Response({'is_available': is_available})
+    
+    @action(detail=True, methods=['get'])
+    def free_slots(self, request, pk=None):
+        """Get the free intervals for a listing over the next N days."""
+        listing = self.get_object()
+        
+        try:
+            days = int(request.query_params.get('days', 7))
+            start_date = request.query_params.get('start_date')
+            start_date = date.fromisoformat(start_date) if start_date else timezone.localdate()
+        except ValueError:
+            return Response(
+                {'error': 'Invalid days or start_date (expected YYYY-MM-DD).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not 1 <= days <= FREE_SLOTS_MAX_DAYS:
+            return Response(
+                {'error': f'days must be between 1 and {FREE_SLOTS_MAX_DAYS}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Cached per calendar version; only the "not in the past" trim is per request
+        now = timezone.now()
+        free = [
+            {'start': timezone.localtime(max(start, now)).isoformat(), 'end': timezone.localtime(end).isoformat()}
+            for start, end in get_free_slots(listing, start_date, days)
+            if end > now
+        ]
+        
+        return Response({
+            'listing_id': listing.id,
+            'start_date': start_date.isoformat(),
+            'days': days,
+            'requires_approval': not listing.availability_schedule,
+            'free_slots': free,
+        })
+    
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def calendar_feeds(self, request, pk=None):
+        """Subscription URLs for this listing's and the host's booking calendars (host only)."""
+        listing = self.get_object()
+        if listing.host_id != request.user.id:
+            return Response(
+                {'error': 'Only the listing owner can subscribe to its calendar.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        listing_url = reverse('listings:listing-calendar-feed', args=[listing.id])
+        host_url = reverse('listings:host-calendar-feed', args=[listing.host_id])
+        return Response({
+            'listing_feed_url': request.build_absolute_uri(
+                f"{listing_url}?token={feed_token('listing', listing.id)}"
+            ),
+            'host_feed_url': request.build_absolute_uri(
+                f"{host_url}?token={feed_token('host', listing.host_id)}"
+            ),
+        })
 
 
 class ListingImageViewSet(viewsets.ModelViewSet):
@@ -253,7 +364,8 @@ class MyListingsView(generics.ListAPIView):
     """
     serializer_class = ParkingListingListSerializer
     permission_classes = [permissions.AllowAny]  # TEMPORARILY DISABLED FOR 403 FIX
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = CursorOrPageNumberPagination
+    filter_backends = [DjangoFilterBackend, ListingSearchFilter, ListingOrderingFilter]
     filterset_class = ParkingListingFilter
     search_fields = ['title', 'description', 'address', 'borough']
     ordering_fields = ['created_at', 'hourly_rate', 'daily_rate', 'rating_average']
@@ -4,14 +4,11 @@ ViewSets for the messaging app.
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.exceptions import ValidationError
 from django.db.models import Q, Prefetch, Count
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.generics import ListAPIView
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,10 +24,12 @@ from .serializers import (
     MessageAttachmentSerializer
 )
 from .filters import ConversationFilter, MessageFilter
+from apps.common.pagination import CursorOrPageNumberPagination
+from apps.users.models import User
 
 
-class MessagePagination(PageNumberPagination):
-    """Custom pagination for messages."""
+class MessagePagination(CursorOrPageNumberPagination):
+    """Custom pagination for messages (pass ?cursor= for keyset paging)."""
     page_size = 50
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -49,41 +48,6 @@ class ConversationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Get conversations for the current user."""
-<<<<<<< HEAD
-        try:
-            user = self.request.user
-            
-            # Handle case where authentication is disabled
-            if not user.is_authenticated:
-                from apps.users.models import User
-                # Fallback disabled - return None instead
-                if not user:
-                    return Conversation.objects.none()
-            
-            queryset = Conversation.objects.filter(
-                participants=user
-            ).select_related(
-                'booking', 'listing'
-            ).prefetch_related(
-                'participants',
-                'participant_settings',
-                Prefetch(
-                    'messages',
-                    queryset=Message.objects.select_related('sender').order_by('-created_at')[:1],
-                    to_attr='latest_messages'
-                )
-            ).distinct()
-            
-            # Filter by booking if provided
-            booking_id = self.request.query_params.get('booking')
-            if booking_id:
-                queryset = queryset.filter(booking_id=booking_id)
-            
-            return queryset
-        except Exception as e:
-            logger.error(f"Error in get_queryset: {str(e)}")
-            return Conversation.objects.none()
-=======
         user = self.request.user
         
         queryset = Conversation.objects.filter(
@@ -106,7 +70,6 @@ class ConversationViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(booking_id=booking_id)
         
         return queryset
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -122,35 +85,14 @@ class ConversationViewSet(viewsets.ModelViewSet):
         
         # Ensure current user is a participant
         user = self.request.user
-<<<<<<< HEAD
-        if not user.is_authenticated:
-            from apps.users.models import User
-            # Fallback disabled - return None instead
-        
-        if user and not conversation.participants.filter(id=user.id).exists():
-=======
         if not conversation.participants.filter(id=user.id).exists():
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
             conversation.participants.add(user)
     
     def list(self, request, *args, **kwargs):
         """List conversations with proper error handling."""
         try:
             user = request.user
-<<<<<<< HEAD
-            logger.info(f"ConversationViewSet.list called for user: {user} (authenticated: {user.is_authenticated})")
-            
-            # Handle case where authentication is disabled  
-            if not user.is_authenticated:
-                from apps.users.models import User
-                # Fallback disabled - return None instead
-                if not user:
-                    logger.warning("No users found in database")
-                    return Response({'count': 0, 'results': []})
-                logger.info(f"Using fallback user: {user}")
-=======
             logger.info(f"ConversationViewSet.list called for user: {user}")
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
             
             # Get conversations with proper annotations
             queryset = Conversation.objects.filter(
@@ -189,27 +131,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         """Mark all messages in conversation as read."""
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            not isinstance(request.user, AnonymousUser) and
-            hasattr(request.user, 'id')):
-            user = request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            # Fallback disabled - return None instead
-            if not user:
-                return Response(
-                    {'error': 'No users available'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-=======
         user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         conversation = self.get_object()
         conversation.mark_as_read(user)
@@ -229,9 +151,6 @@ class ConversationViewSet(viewsets.ModelViewSet):
             )
         
         # Find users by email
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        
         new_participants = User.objects.filter(email__in=participant_emails)
         if new_participants.count() != len(participant_emails):
             existing_emails = set(new_participants.values_list('email', flat=True))
@@ -309,27 +228,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def archive(self, request, pk=None):
         """Archive conversation for the current user."""
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            not isinstance(request.user, AnonymousUser) and
-            hasattr(request.user, 'id')):
-            user = request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            # Fallback disabled - return None instead
-            if not user:
-                return Response(
-                    {'error': 'No users available'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-=======
         user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         conversation = self.get_object()
         participant_settings, created = ConversationParticipant.objects.get_or_create(
@@ -348,27 +247,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def unarchive(self, request, pk=None):
         """Unarchive conversation for the current user."""
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            not isinstance(request.user, AnonymousUser) and
-            hasattr(request.user, 'id')):
-            user = request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            # Fallback disabled - return None instead
-            if not user:
-                return Response(
-                    {'error': 'No users available'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-=======
         user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         conversation = self.get_object()
         participant_settings = get_object_or_404(
@@ -385,53 +264,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get total unread message count across all conversations."""
-<<<<<<< HEAD
-        from rest_framework.authtoken.models import Token
-        from django.contrib.auth.models import AnonymousUser
-        
-        # Initialize user variable
-        user = None
-        
-        # First check if user is already authenticated via session/request
-        if hasattr(request, 'user') and request.user and not isinstance(request.user, AnonymousUser):
-            if hasattr(request.user, 'is_authenticated') and request.user.is_authenticated:
-                user = request.user
-        
-        # If no user yet, check for token in Authorization header
-        if not user:
-            auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-            
-            # Check for Token format
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    pass
-            
-            # Check for Bearer format
-            elif auth_header.startswith('Bearer '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    pass
-        
-        # If still no authenticated user, return 0
-        if not user:
-            return Response({
-                'unread_count': 0,
-                'user_id': None
-            })
-        
-        # Count unread messages using MessageReadStatus
-        from django.db.models import Count, Q
-        from apps.messaging.models import MessageReadStatus, Message
-=======
         user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         # Get all messages in user's conversations that aren't from the user
         user_messages = Message.objects.filter(
@@ -457,27 +290,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """Mark all messages as read for the current user."""
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            not isinstance(request.user, AnonymousUser) and
-            hasattr(request.user, 'id')):
-            user = request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            # Fallback disabled - return None instead
-            if not user:
-                return Response(
-                    {'error': 'No users available'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-=======
         user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         # Find all unread messages for the user using MessageReadStatus
         from apps.messaging.models import MessageReadStatus
@@ -522,24 +335,7 @@ class MessageViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Get messages for conversations the user participates in."""
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(self.request, 'user') and 
-            self.request.user.is_authenticated and 
-            not isinstance(self.request.user, AnonymousUser) and
-            hasattr(self.request.user, 'id')):
-            user = self.request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            # Fallback disabled - return None instead
-            if not user:
-                return Message.objects.none()
-=======
         user = self.request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         return Message.objects.filter(
             conversation__participants=user,
@@ -572,27 +368,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         print(f"MessageViewSet.create called with data: {request.data}")
         data = request.data.copy()
         
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            not isinstance(request.user, AnonymousUser) and
-            hasattr(request.user, 'id')):
-            sender_user = request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            sender_# Fallback disabled - return None instead
-            if not sender_user:
-                return Response(
-                    {'error': 'No users available to send message'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-=======
         sender_user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         # Check if this is a simple notification message (has recipient_id but no conversation)
         recipient_id = data.get('recipient_id')
@@ -677,24 +453,7 @@ class MessageViewSet(viewsets.ModelViewSet):
     
     def list(self, request, *args, **kwargs):
         """List messages with conversation filtering."""
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            not isinstance(request.user, AnonymousUser) and
-            hasattr(request.user, 'id')):
-            user = request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            # Fallback disabled - return None instead
-            if not user:
-                return Response({'results': []})
-=======
         user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         conversation_id = request.query_params.get('conversation')
         if conversation_id:
@@ -726,27 +485,7 @@ class MessageViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         """Mark a specific message as read."""
-<<<<<<< HEAD
-        # Handle authentication-disabled state
-        from django.contrib.auth.models import AnonymousUser
-        from apps.users.models import User
-        
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            not isinstance(request.user, AnonymousUser) and
-            hasattr(request.user, 'id')):
-            user = request.user
-        else:
-            # Use first user as fallback when authentication is disabled
-            # Fallback disabled - return None instead
-            if not user:
-                return Response(
-                    {'error': 'No users available'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-=======
         user = request.user
->>>>>>> e80026deea8aaf4be5adaee36791ef8b8d5a712f
         
         message = self.get_object()
         
@@ -10,6 +10,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import permissions
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from apps.common.pagination import KeysetPagination
 from .models import (
     Notification, NotificationPreference, PushSubscription,
     NotificationChannel
@@ -48,6 +49,23 @@ def get_notifications(request):
         if unread_only:
             notifications = notifications.exclude(status='read')
         
+        # Keyset pagination when a cursor is passed (no OFFSET, no COUNT)
+        if 'cursor' in request.GET:
+            paginator = KeysetPagination()
+            paginator.page_size = page_size
+            page_items = paginator.paginate_queryset(notifications, request)
+            serializer = NotificationSerializer(page_items, many=True)
+            response = {
+                'notifications': serializer.data,
+                'page_size': paginator.page_size,
+                'has_more': paginator.has_next,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+            }
+            if paginator.count is not None:
+                response['total_count'] = paginator.count
+            return Response(response)
+        
         # Pagination
         start = (page - 1) * page_size
         end = start + page_size
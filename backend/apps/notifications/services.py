@@ -125,6 +125,11 @@ class NotificationService:
                 'message': 'Your parking is confirmed for {parking_space_title} on {booking_date_time}',
                 'type': 'booking_confirmed'
             },
+            'BOOKING_SERIES_CONFIRMED': {
+                'title': 'Recurring Parking Booked! 🎉',
+                'message': '{booking_count} bookings at {parking_space_title} from {first_date_time} to {last_date}',
+                'type': 'booking_series_confirmed'
+            },
             'CHECKIN_REMINDER': {
                 'title': 'Parking Starts Soon ⏰',
                 'message': 'Your parking starts in 15 minutes at {parking_space_title}. Tap for directions.',
@@ -147,6 +152,11 @@ class NotificationService:
                 'message': 'New booking for {booking_date_time}',
                 'type': 'new_booking'
             },
+            'NEW_BOOKING_SERIES': {
+                'title': 'New Recurring Booking! 📅',
+                'message': '{renter_name} booked {booking_count} slots from {first_date_time} to {last_date}',
+                'type': 'new_booking'
+            },
             'INSTANT_BOOKING': {
                 'title': 'Space Booked Instantly! ⚡',
                 'message': 'Your space was just booked for {booking_date_time}',
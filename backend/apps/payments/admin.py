@@ -14,7 +14,9 @@ from .models import (
     PaymentMethod, PaymentIntent, Payment, Refund, 
     RefundRequest, Payout, WebhookEvent
 )
+from .exports import export_action
 from .services import PaymentService
+from .webhook_events import requeue_events
 
 # Configure Stripe
 from django.conf import settings
@@ -79,6 +81,7 @@ class PaymentAdmin(admin.ModelAdmin):
                       'host_payout_amount', 'created_at', 
                       'updated_at']
     inlines = [RefundInline]
+    actions = [export_action('payments', 'csv'), export_action('payments', 'xlsx')]
     
     def booking_link(self, obj):
         if obj.booking:
@@ -114,6 +117,7 @@ class RefundAdmin(admin.ModelAdmin):
     readonly_fields = ['refund_id', 'stripe_refund_id', 'payment', 'user', 
                       'amount', 'status', 'created_at', 'processed_at', 
                       'updated_at']
+    actions = [export_action('refunds', 'csv'), export_action('refunds', 'xlsx')]
     
     def payment_link(self, obj):
         url = reverse('admin:payments_payment_change', args=[obj.payment.id])
@@ -435,6 +439,7 @@ class PayoutAdmin(admin.ModelAdmin):
     search_fields = ['payout_id', 'host__email', 'stripe_payout_id']
     readonly_fields = ['payout_id', 'stripe_payout_id', 
                       'created_at', 'updated_at']
+    actions = [export_action('payouts', 'csv'), export_action('payouts', 'xlsx')]
     
     def amount_display(self, obj):
         return f"${obj.amount}"
@@ -443,11 +448,18 @@ class PayoutAdmin(admin.ModelAdmin):
 
 @admin.register(WebhookEvent)
 class WebhookEventAdmin(admin.ModelAdmin):
-    list_display = ['stripe_event_id', 'event_type', 'status', 'created_at']
-    list_filter = ['event_type', 'status', 'created_at']
-    search_fields = ['stripe_event_id', 'event_type']
-    readonly_fields = ['stripe_event_id', 'event_type', 'data', 'created_at', 
-                      'processed_at']
+    list_display = ['stripe_event_id', 'event_type', 'status', 'retry_count', 'created_at']
+    list_filter = ['event_type', 'status', 'source', 'created_at']
+    search_fields = ['stripe_event_id', 'event_type', 'object_id']
+    readonly_fields = ['stripe_event_id', 'event_type', 'object_id', 'source', 'data', 
+                      'stripe_created', 'next_attempt_at', 'created_at', 'processed_at']
+    actions = ['retry_events']
+    
+    def retry_events(self, request, queryset):
+        """Retry failed or dead events right away."""
+        requeued = requeue_events(queryset)
+        self.message_user(request, f"Requeued {requeued} webhook events", level='SUCCESS')
+    retry_events.short_description = "Retry selected failed or dead events"
     
     def has_add_permission(self, request):
         return False  # Webhook events are created automatically
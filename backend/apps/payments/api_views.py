@@ -6,11 +6,12 @@ import logging
 from decimal import Decimal
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from . import stripe_gateway
 from .models import Payment, PaymentIntent, Payout, Refund
 from .services import PaymentService, PayoutService, RefundService
 from .serializers import PaymentSerializer, PayoutSerializer, RefundSerializer
@@ -80,7 +81,9 @@ def confirm_real_payment(request):
         
         # Retrieve payment intent from Stripe to verify it succeeded
         try:
-            stripe_payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            stripe_payment_intent = stripe_gateway.call(
+                'payment_intent.retrieve', stripe.PaymentIntent.retrieve, payment_intent_id
+            )
             
             if stripe_payment_intent.status != 'succeeded':
                 return Response(
@@ -572,4 +575,14 @@ def create_mobile_payment_session(request):
         return Response(
             {'error': 'Failed to create payment session'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_stripe_metrics(request):
+    """Latency, retries and errors of Stripe calls per operation, for the process serving the request"""
+    return Response({
+        'operations': stripe_gateway.metrics.snapshot(),
+        'generated_at': timezone.now(),
+    })
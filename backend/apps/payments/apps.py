@@ -14,6 +14,9 @@ class PaymentsConfig(AppConfig):
     
     def ready(self):
         """
-        Import signals when the app is ready.
+        Import signals and route Stripe requests through the pooled client
+        when the app is ready.
         """
-        import apps.payments.signals  # noqa
\ No newline at end of file
+        import apps.payments.signals  # noqa
+        from .stripe_gateway import install_http_client
+        install_http_client()
\ No newline at end of file
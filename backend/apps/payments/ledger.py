@@ -0,0 +1,272 @@
+"""
+Host balance ledger behind ``PayoutViewSet.earnings``.
+
+The earnings endpoint used to sum ``host_payout_amount`` over the host's
+payments (joined through booking and listing) three times and their paid
+payouts once on every call, and the host dashboard polls it. Hosts'
+money movements are now written to an append-only ledger as they happen:
+
+- a payment entering ``succeeded`` is a credit; leaving it (refunded) is
+  the matching debit. Both are recorded from the payment post_save
+  signal;
+- succeeded payments added to a payout leave the pending payout, and come
+  back if the payout releases them (``record_payout_links``, called from
+  the m2m_changed signal and by payments.payouts, which links with
+  ``bulk_create``);
+- a payout entering or leaving ``paid`` moves the paid-out total
+  (``record_payout_status_changes``, from the payout post_save signal and
+  after the bulk update in payments.payouts).
+
+Every entry carries its change to each HostBalance column, and the
+entries and F() updates of the host's HostBalance row are written in one
+transaction, so earnings is a single-row read. ``rebuild_host_balances``
+replaces a host's entries with ones derived from the payments and payouts
+tables (a few GROUP BY queries) and recomputes the balances from them; it
+backs the ``rebuild_host_balances`` reconciliation command and catches up
+on changes that bypass the signals, such as queryset ``update()`` or
+deleted payments.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, F, IntegerField, OuterRef, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import HostBalance, HostLedgerEntry, Payment, Payout
+
+EntryKind = HostLedgerEntry.Kind
+PaymentStatus = Payment.PaymentStatus
+PayoutStatus = Payout.PayoutStatus
+
+# Ledger entry field -> HostBalance field it adds to
+BALANCE_FIELDS = {
+    'earnings_change': 'total_earnings',
+    'bookings_change': 'total_bookings',
+    'pending_change': 'pending_payout',
+    'paid_out_change': 'paid_out',
+}
+
+HOST_FIELD = 'booking__parking_space__host_id'
+
+
+def _apply(entries):
+    """Write ``entries`` and add them to their hosts' balances."""
+    if not entries:
+        return
+    totals = defaultdict(lambda: dict.fromkeys(BALANCE_FIELDS, 0))
+    for entry in entries:
+        for field in BALANCE_FIELDS:
+            totals[entry.host_id][field] += getattr(entry, field)
+
+    now = timezone.now()
+    with transaction.atomic():
+        HostLedgerEntry.objects.bulk_create(entries)
+        for host_id, changes in totals.items():
+            HostBalance.objects.get_or_create(host_id=host_id)
+            HostBalance.objects.filter(host_id=host_id).update(updated_at=now, **{
+                balance_field: F(balance_field) + changes[field]
+                for field, balance_field in BALANCE_FIELDS.items()
+            })
+
+
+def _payment_host_id(payment):
+    if payment._meta.get_field('booking').is_cached(payment):
+        return payment.booking.parking_space.host_id
+    return Payment.objects.filter(pk=payment.pk).values_list(HOST_FIELD, flat=True).first()
+
+
+def record_payment_status_change(payment, old_status, new_status):
+    """
+    Credit or debit a payment's host when it enters or leaves ``succeeded``.
+
+    ``old_status`` is None for a new payment.
+    """
+    if old_status == new_status or PaymentStatus.SUCCEEDED not in (old_status, new_status):
+        return
+    host_id = _payment_host_id(payment)
+    if host_id is None:
+        return
+
+    sign = 1 if new_status == PaymentStatus.SUCCEEDED else -1
+    amount = sign * (payment.host_payout_amount or Decimal('0.00'))
+    in_payout = old_status is not None and payment.payouts.exists()
+    _apply([HostLedgerEntry(
+        host_id=host_id,
+        kind=EntryKind.PAYMENT if sign > 0 else EntryKind.REFUND,
+        payment=payment,
+        earnings_change=amount,
+        bookings_change=sign,
+        pending_change=Decimal('0.00') if in_payout else amount,
+    )])
+
+
+def record_payout_links(links, removing=False):
+    """
+    Move succeeded payments into or out of the pending payout as they are
+    added to or removed from payouts.
+
+    ``links`` are (payout_id, payment_id) pairs about to be added (or
+    removed, with ``removing``): call this before changing the links. A
+    payment only leaves the pending payout with its first payout and only
+    returns with its last.
+    """
+    payout_ids = defaultdict(list)
+    for payout_id, payment_id in links:
+        payout_ids[payment_id].append(payout_id)
+    if not payout_ids:
+        return
+
+    changes = defaultdict(Decimal)
+    payments = Payment.objects.filter(
+        pk__in=list(payout_ids), status=PaymentStatus.SUCCEEDED
+    ).annotate(link_count=Count('payouts')).values_list('pk', HOST_FIELD, 'host_payout_amount', 'link_count')
+    for payment_id, host_id, amount, link_count in payments:
+        if link_count != (len(payout_ids[payment_id]) if removing else 0):
+            continue
+        changes[(host_id, payout_ids[payment_id][0])] += amount
+
+    sign = 1 if removing else -1
+    _apply([
+        HostLedgerEntry(
+            host_id=host_id,
+            kind=EntryKind.PAYOUT_RELEASED if removing else EntryKind.PAYOUT,
+            payout_id=payout_id,
+            pending_change=sign * amount,
+        )
+        for (host_id, payout_id), amount in changes.items()
+    ])
+
+
+def record_payout_status_changes(changes):
+    """
+    Move the paid-out totals for (payout, old_status, new_status) changes;
+    ``old_status`` is None for a new payout.
+    """
+    entries = []
+    for payout, old_status, new_status in changes:
+        if old_status == new_status or PayoutStatus.PAID not in (old_status, new_status):
+            continue
+        sign = 1 if new_status == PayoutStatus.PAID else -1
+        entries.append(HostLedgerEntry(
+            host_id=payout.host_id,
+            kind=EntryKind.PAYOUT_PAID if sign > 0 else EntryKind.PAYOUT_REVERSED,
+            payout=payout,
+            paid_out_change=sign * payout.amount,
+        ))
+    _apply(entries)
+
+
+def ledger_rows(host_ids=None, app_registry=None):
+    """
+    Derive ledger entries for the current state of the payments and payouts
+    tables: a credit per succeeded payment, a debit per payout of them and
+    the total of each paid payout.
+
+    Yields dicts of HostLedgerEntry fields.
+    """
+    registry = app_registry or django_apps
+    Payment = registry.get_model('payments', 'Payment')
+    Payout = registry.get_model('payments', 'Payout')
+    PayoutPayment = Payout.payments.through
+
+    payments = Payment.objects.filter(status=PaymentStatus.SUCCEEDED)
+    links = PayoutPayment.objects.filter(payment__status=PaymentStatus.SUCCEEDED)
+    payouts = Payout.objects.filter(status=PayoutStatus.PAID)
+    if host_ids is not None:
+        payments = payments.filter(**{f'{HOST_FIELD}__in': host_ids})
+        links = links.filter(**{f'payment__{HOST_FIELD}__in': host_ids})
+        payouts = payouts.filter(host_id__in=host_ids)
+
+    for row in payments.values('pk', 'host_payout_amount', 'created_at', 'processed_at', host_id=F(HOST_FIELD)):
+        yield {
+            'host_id': row['host_id'],
+            'kind': EntryKind.PAYMENT,
+            'payment_id': row['pk'],
+            'earnings_change': row['host_payout_amount'],
+            'bookings_change': 1,
+            'pending_change': row['host_payout_amount'],
+            'created_at': row['processed_at'] or row['created_at'],
+        }
+
+    # A payment in several payouts leaves the pending payout with the first
+    earlier_link = PayoutPayment.objects.filter(payment_id=OuterRef('payment_id'), payout_id__lt=OuterRef('payout_id'))
+    for row in links.exclude(Exists(earlier_link)).values(
+        'payout_id', 'payout__created_at', host_id=F(f'payment__{HOST_FIELD}')
+    ).annotate(total=Sum('payment__host_payout_amount')).order_by():
+        yield {
+            'host_id': row['host_id'],
+            'kind': EntryKind.PAYOUT,
+            'payout_id': row['payout_id'],
+            'pending_change': -row['total'],
+            'created_at': row['payout__created_at'],
+        }
+
+    for row in payouts.values('pk', 'host_id', 'amount', 'created_at', 'processed_at'):
+        yield {
+            'host_id': row['host_id'],
+            'kind': EntryKind.PAYOUT_PAID,
+            'payout_id': row['pk'],
+            'paid_out_change': row['amount'],
+            'created_at': row['processed_at'] or row['created_at'],
+        }
+
+
+def rebuild_host_balances(host_ids=None, app_registry=None):
+    """
+    Replace the ledger entries and balances of the given hosts (everyone if
+    None) with ones derived from the payments and payouts tables. Returns
+    the number of balances written.
+    """
+    registry = app_registry or django_apps
+    Entry = registry.get_model('payments', 'HostLedgerEntry')
+    Balance = registry.get_model('payments', 'HostBalance')
+
+    if host_ids is not None:
+        host_ids = list(set(host_ids))
+        if not host_ids:
+            return 0
+
+    with transaction.atomic():
+        stale_entries = Entry.objects.all()
+        stale_balances = Balance.objects.all()
+        if host_ids is not None:
+            stale_entries = stale_entries.filter(host_id__in=host_ids)
+            stale_balances = stale_balances.filter(host_id__in=host_ids)
+        stale_entries.delete()
+        stale_balances.delete()
+        Entry.objects.bulk_create(
+            (Entry(**row) for row in ledger_rows(host_ids, app_registry=registry)),
+            batch_size=1000,
+        )
+
+        entries = Entry.objects.all()
+        if host_ids is not None:
+            entries = entries.filter(host_id__in=host_ids)
+        totals = entries.values('host_id').annotate(**{
+            balance_field: Coalesce(
+                Sum(field),
+                Value(0),
+                output_field=IntegerField() if field == 'bookings_change' else DecimalField(max_digits=12, decimal_places=2),
+            )
+            for field, balance_field in BALANCE_FIELDS.items()
+        }).order_by()
+        balances = [Balance(**row) for row in totals]
+        Balance.objects.bulk_create(balances, batch_size=1000)
+
+    return len(balances)
+
+
+def get_host_earnings(host):
+    """The earnings summary of ``host`` from their balance, as a dict."""
+    row = HostBalance.objects.filter(host=host).values(*BALANCE_FIELDS.values()).first()
+    if row is None:
+        return {
+            'total_earnings': Decimal('0.00'),
+            'total_bookings': 0,
+            'pending_payout': Decimal('0.00'),
+            'paid_out': Decimal('0.00'),
+        }
+    return row
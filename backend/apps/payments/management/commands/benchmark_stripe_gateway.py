@@ -0,0 +1,75 @@
+"""
+Management command to benchmark the Stripe gateway against the in-process fake.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.core.management.base import BaseCommand
+
+from apps.payments import stripe_gateway
+
+
+class Command(BaseCommand):
+    help = 'Create payment intents through the Stripe gateway against a fake Stripe and report metrics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--calls',
+            type=int,
+            default=500,
+            help='Number of payment intents to create (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Calls made in parallel (default: 8)',
+        )
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=20.0,
+            help='Simulated Stripe latency per request (default: 20ms)',
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of requests answered with a 503, to exercise retries (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        stripe_gateway.metrics.reset()
+
+        fake = stripe_gateway.fake_stripe(
+            latency=options['latency_ms'] / 1000,
+            failure_rate=options['failure_rate'],
+        )
+
+        def create_intent(number):
+            try:
+                stripe_gateway.call(
+                    'payment_intent.create', stripe.PaymentIntent.create,
+                    amount=1000,
+                    currency='usd',
+                    metadata={'benchmark': number},
+                )
+            except stripe.error.StripeError:
+                pass  # Counted in the metrics
+
+        with fake:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                list(executor.map(create_intent, range(calls)))
+            elapsed = time.monotonic() - started
+
+        self.stdout.write(f"{calls} calls in {elapsed:.2f}s ({calls / elapsed:.1f} calls/s)")
+        for operation, stats in stripe_gateway.metrics.snapshot().items():
+            self.stdout.write(
+                f"{operation}: {stats['calls']} calls, {stats['retries']} retries, "
+                f"avg {stats['avg_ms']}ms, p95 {stats['p95_ms']}ms, max {stats['max_ms']}ms, "
+                f"errors {stats['errors'] or 'none'}"
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
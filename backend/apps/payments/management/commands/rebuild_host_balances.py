@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.payments.ledger import rebuild_host_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the host balance ledger and balances from the payments and payouts tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            type=int,
+            action='append',
+            dest='host_ids',
+            help='Only rebuild this host id (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        host_ids = options['host_ids']
+        scope = f'{len(host_ids)} host(s)' if host_ids else 'all hosts'
+        self.stdout.write(f'Rebuilding host balances for {scope}...')
+
+        balance_count = rebuild_host_balances(host_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Host balances rebuilt: {balance_count} balances')
+        )
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.8 on 2026-10-16 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0005_remove_payoutrequestpayments_payment_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="claimed_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When a worker started processing the event",
+                null=True,
+                verbose_name="claimed at",
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the event is due to be processed (again)",
+                null=True,
+                verbose_name="next attempt at",
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="object_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Stripe object the event is about; events of one object are processed in order",
+                max_length=255,
+                verbose_name="object ID",
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="source",
+            field=models.CharField(
+                choices=[
+                    ("stripe", "Stripe webhook"),
+                    ("legacy", "Legacy Stripe webhook"),
+                ],
+                default="stripe",
+                help_text="Endpoint that received the event, which decides its handlers",
+                max_length=10,
+                verbose_name="source",
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="stripe_created",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When Stripe created the event",
+                null=True,
+                verbose_name="Stripe created at",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="webhookevent",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("received", "Received"),
+                    ("processing", "Processing"),
+                    ("processed", "Processed"),
+                    ("failed", "Failed"),
+                    ("ignored", "Ignored"),
+                    ("dead", "Dead"),
+                ],
+                default="received",
+                help_text="Event processing status",
+                max_length=20,
+                verbose_name="status",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                fields=["status", "next_attempt_at"],
+                name="webhook_eve_status_8017be_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                fields=["object_id", "stripe_created"],
+                name="webhook_eve_object__4fdc26_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,204 @@
+# Generated by Django 4.2.8 on 2026-10-16 20:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_ledger(apps, schema_editor):
+    """Build ledger entries and balances from existing payments and payouts."""
+    from apps.payments.ledger import rebuild_host_balances
+
+    rebuild_host_balances(app_registry=apps)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("payments", "0006_webhook_event_processing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HostBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total_earnings",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Host share of succeeded payments",
+                        max_digits=12,
+                        verbose_name="total earnings",
+                    ),
+                ),
+                (
+                    "total_bookings",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Number of succeeded payments",
+                        verbose_name="total bookings",
+                    ),
+                ),
+                (
+                    "pending_payout",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Host share of succeeded payments not in any payout",
+                        max_digits=12,
+                        verbose_name="pending payout",
+                    ),
+                ),
+                (
+                    "paid_out",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Total of paid payouts",
+                        max_digits=12,
+                        verbose_name="paid out",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+                (
+                    "host",
+                    models.OneToOneField(
+                        help_text="Host the balance belongs to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="host_balance",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Host Balance",
+                "verbose_name_plural": "Host Balances",
+                "db_table": "host_balances",
+            },
+        ),
+        migrations.CreateModel(
+            name="HostLedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("payment", "Payment succeeded"),
+                            ("refund", "Payment refunded"),
+                            ("payout", "Payments added to payout"),
+                            ("payout_released", "Payments released from payout"),
+                            ("payout_paid", "Payout paid"),
+                            ("payout_reversed", "Payout no longer paid"),
+                        ],
+                        help_text="What moved the money",
+                        max_length=20,
+                        verbose_name="kind",
+                    ),
+                ),
+                (
+                    "earnings_change",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="earnings change",
+                    ),
+                ),
+                (
+                    "bookings_change",
+                    models.IntegerField(default=0, verbose_name="bookings change"),
+                ),
+                (
+                    "pending_change",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="pending payout change",
+                    ),
+                ),
+                (
+                    "paid_out_change",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="paid out change",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="created at"
+                    ),
+                ),
+                (
+                    "host",
+                    models.ForeignKey(
+                        help_text="Host whose balance the entry changes",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ledger_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "payment",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Payment the entry is about, if any",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="payments.payment",
+                    ),
+                ),
+                (
+                    "payout",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Payout the entry is about, if any",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="payments.payout",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Host Ledger Entry",
+                "verbose_name_plural": "Host Ledger Entries",
+                "db_table": "host_ledger_entries",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["host", "created_at"],
+                        name="host_ledger_host_id_09b290_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
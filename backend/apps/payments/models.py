@@ -8,6 +8,7 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from apps.common.tracking import FieldTrackerMixin
 
 User = get_user_model()
 
@@ -285,7 +286,7 @@ class PaymentIntent(models.Model):
         return self.amount - self.platform_fee
 
 
-class Payment(models.Model):
+class Payment(FieldTrackerMixin, models.Model):
     """
     Model representing a completed payment transaction.
     """
@@ -431,6 +432,8 @@ class Payment(models.Model):
         help_text=_('When the payment was processed')
     )
     
+    tracked_fields = ('status',)
+    
     class Meta:
         db_table = 'payments'
         verbose_name = _('Payment')
@@ -618,7 +621,7 @@ class Refund(models.Model):
         return self.status == self.RefundStatus.SUCCEEDED
 
 
-class Payout(models.Model):
+class Payout(FieldTrackerMixin, models.Model):
     """
     Model representing payouts to hosts.
     """
@@ -731,6 +734,8 @@ class Payout(models.Model):
         help_text=_('Expected arrival date of funds')
     )
     
+    tracked_fields = ('status',)
+    
     class Meta:
         db_table = 'payouts'
         verbose_name = _('Payout')
@@ -1156,6 +1161,9 @@ class RefundRequest(models.Model):
 class WebhookEvent(models.Model):
     """
     Model to track Stripe webhook events.
+    
+    Webhook views only store events; they are processed in the background
+    by payments.webhook_events, in order per Stripe object.
     """
     
     class EventStatus(models.TextChoices):
@@ -1164,6 +1172,11 @@ class WebhookEvent(models.Model):
         PROCESSED = 'processed', _('Processed')
         FAILED = 'failed', _('Failed')
         IGNORED = 'ignored', _('Ignored')
+        DEAD = 'dead', _('Dead')
+    
+    class Source(models.TextChoices):
+        STRIPE = 'stripe', _('Stripe webhook')
+        LEGACY = 'legacy', _('Legacy Stripe webhook')
     
     # Event details
     stripe_event_id = models.CharField(
@@ -1183,6 +1196,25 @@ class WebhookEvent(models.Model):
         max_length=20,
         help_text=_('Stripe API version')
     )
+    object_id = models.CharField(
+        _('object ID'),
+        max_length=255,
+        blank=True,
+        help_text=_('Stripe object the event is about; events of one object are processed in order')
+    )
+    stripe_created = models.DateTimeField(
+        _('Stripe created at'),
+        null=True,
+        blank=True,
+        help_text=_('When Stripe created the event')
+    )
+    source = models.CharField(
+        _('source'),
+        max_length=10,
+        choices=Source.choices,
+        default=Source.STRIPE,
+        help_text=_('Endpoint that received the event, which decides its handlers')
+    )
     
     # Processing status
     status = models.CharField(
@@ -1216,6 +1248,18 @@ class WebhookEvent(models.Model):
         default=0,
         help_text=_('Number of processing attempts')
     )
+    next_attempt_at = models.DateTimeField(
+        _('next attempt at'),
+        null=True,
+        blank=True,
+        help_text=_('When the event is due to be processed (again)')
+    )
+    claimed_at = models.DateTimeField(
+        _('claimed at'),
+        null=True,
+        blank=True,
+        help_text=_('When a worker started processing the event')
+    )
     
     # Timestamps
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
@@ -1230,6 +1274,8 @@ class WebhookEvent(models.Model):
             models.Index(fields=['stripe_event_id']),
             models.Index(fields=['event_type', 'status']),
             models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['object_id', 'stripe_created']),
         ]
     
     def __str__(self):
@@ -1238,4 +1284,126 @@ class WebhookEvent(models.Model):
     @property
     def is_processed(self):
         """Check if event was successfully processed."""
-        return self.status == self.EventStatus.PROCESSED
\ No newline at end of file
+        return self.status == self.EventStatus.PROCESSED
+
+class HostLedgerEntry(models.Model):
+    """
+    One movement of a host's money, never updated once written.
+    
+    Each entry carries its change to every HostBalance column, so a host's
+    balance is the sum of their entries (see payments.ledger).
+    """
+    
+    class Kind(models.TextChoices):
+        PAYMENT = 'payment', _('Payment succeeded')
+        REFUND = 'refund', _('Payment refunded')
+        PAYOUT = 'payout', _('Payments added to payout')
+        PAYOUT_RELEASED = 'payout_released', _('Payments released from payout')
+        PAYOUT_PAID = 'payout_paid', _('Payout paid')
+        PAYOUT_REVERSED = 'payout_reversed', _('Payout no longer paid')
+    
+    host = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='ledger_entries',
+        help_text=_('Host whose balance the entry changes')
+    )
+    kind = models.CharField(
+        _('kind'),
+        max_length=20,
+        choices=Kind.choices,
+        help_text=_('What moved the money')
+    )
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        help_text=_('Payment the entry is about, if any')
+    )
+    payout = models.ForeignKey(
+        Payout,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        help_text=_('Payout the entry is about, if any')
+    )
+    
+    # Changes to the host's balance
+    earnings_change = models.DecimalField(
+        _('earnings change'), max_digits=12, decimal_places=2, default=0
+    )
+    bookings_change = models.IntegerField(_('bookings change'), default=0)
+    pending_change = models.DecimalField(
+        _('pending payout change'), max_digits=12, decimal_places=2, default=0
+    )
+    paid_out_change = models.DecimalField(
+        _('paid out change'), max_digits=12, decimal_places=2, default=0
+    )
+    
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+    
+    class Meta:
+        db_table = 'host_ledger_entries'
+        verbose_name = _('Host Ledger Entry')
+        verbose_name_plural = _('Host Ledger Entries')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['host', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} for host {self.host_id}"
+
+
+class HostBalance(models.Model):
+    """
+    Running totals of a host's ledger entries, behind the earnings endpoint.
+    
+    Updated in the same transaction as each entry and rebuilt by the
+    ``rebuild_host_balances`` command.
+    """
+    
+    host = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='host_balance',
+        help_text=_('Host the balance belongs to')
+    )
+    total_earnings = models.DecimalField(
+        _('total earnings'),
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text=_('Host share of succeeded payments')
+    )
+    total_bookings = models.IntegerField(
+        _('total bookings'),
+        default=0,
+        help_text=_('Number of succeeded payments')
+    )
+    pending_payout = models.DecimalField(
+        _('pending payout'),
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text=_('Host share of succeeded payments not in any payout')
+    )
+    paid_out = models.DecimalField(
+        _('paid out'),
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text=_('Total of paid payouts')
+    )
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        db_table = 'host_balances'
+        verbose_name = _('Host Balance')
+        verbose_name_plural = _('Host Balances')
+    
+    def __str__(self):
+        return f"Balance for host {self.host_id}"
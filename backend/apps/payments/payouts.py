@@ -0,0 +1,312 @@
+"""
+Set-based host payouts.
+
+The ``process_payouts`` command used to load every unpaid payment, group
+them by host in Python and create each Stripe payout inside a transaction
+that stayed open for the network call, so the weekly run took hours and
+held locks the whole time. It now runs in two phases:
+
+- ``create_payouts`` claims the unpaid payments with ``SELECT ... FOR
+  UPDATE SKIP LOCKED`` (a concurrent run skips them instead of waiting),
+  totals them per host and currency with one GROUP BY, and inserts the
+  payouts and their payment links with ``bulk_create``. A payment linked
+  to a payout is no longer unpaid, so the transaction ends here, before
+  any call to Stripe;
+- ``submit_payouts`` sends the pending payouts to Stripe from a bounded
+  thread pool, spaced by a shared rate limiter, with the payout ID as
+  idempotency key so a resubmitted payout is never paid twice. Results
+  are written back with one ``bulk_update``. Payouts hit by transient
+  Stripe errors stay pending for the next run; payouts Stripe rejects are
+  marked failed and their payments released for a later payout.
+
+Neither phase sends model signals, so both record their changes in the
+hosts' balance ledger (payments.ledger) themselves.
+
+Stripe is reached through a transport object: StripePayoutTransport calls
+the API through payments.stripe_gateway, and FakePayoutTransport stands in
+for it in tests.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Sum
+from django.utils import timezone
+
+from . import ledger, stripe_gateway
+from .models import Payment, Payout
+
+logger = logging.getLogger(__name__)
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+DEFAULT_MIN_AMOUNT = Decimal('10.00')
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE_LIMIT = 25  # Stripe requests per second
+BULK_BATCH_SIZE = 1000
+
+PayoutStatus = Payout.PayoutStatus
+PayoutPayment = Payout.payments.through
+
+# Stripe payout status -> Payout status; 'pending' and 'in_transit' are processing
+STRIPE_PAYOUT_STATUSES = {
+    'paid': PayoutStatus.PAID,
+    'failed': PayoutStatus.FAILED,
+    'canceled': PayoutStatus.CANCELED,
+}
+
+# Errors still worth retrying on the next run, with the same idempotency key
+RETRYABLE_ERRORS = stripe_gateway.RETRYABLE_ERRORS
+
+
+class StripePayoutTransport:
+    """Creates payouts on hosts' connected accounts through the Stripe API."""
+
+    def create_payout(self, amount, currency, stripe_account, metadata, idempotency_key):
+        payout = stripe_gateway.call(
+            'payout.create', stripe.Payout.create,
+            amount=amount,
+            currency=currency,
+            metadata=metadata,
+            stripe_account=stripe_account,
+            idempotency_key=idempotency_key,
+        )
+        return {'id': payout.id, 'status': payout.status}
+
+
+class FakePayoutTransport:
+    """
+    In-memory stand-in for StripePayoutTransport.
+
+    Records every request, replays the first result for a repeated
+    idempotency key as Stripe does, and raises ``errors[stripe_account]``
+    for accounts set up to fail.
+    """
+
+    def __init__(self, errors=None, status='pending'):
+        self.errors = errors or {}
+        self.status = status
+        self.requests = []
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def create_payout(self, amount, currency, stripe_account, metadata, idempotency_key):
+        with self._lock:
+            self.requests.append({
+                'amount': amount,
+                'currency': currency,
+                'stripe_account': stripe_account,
+                'metadata': metadata,
+                'idempotency_key': idempotency_key,
+            })
+            if idempotency_key in self._results:
+                return self._results[idempotency_key]
+            if stripe_account in self.errors:
+                raise self.errors[stripe_account]
+            result = {'id': f'po_fake_{len(self._results) + 1}', 'status': self.status}
+            self._results[idempotency_key] = result
+            return result
+
+
+class RateLimiter:
+    """Spaces calls from any number of threads at least 1/``rate`` seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def unpaid_payments():
+    """Succeeded payments not in any payout, of hosts with a Stripe account."""
+    linked = PayoutPayment.objects.filter(payment_id=OuterRef('pk'))
+    return Payment.objects.filter(
+        status=Payment.PaymentStatus.SUCCEEDED,
+        booking__parking_space__host__stripe_account_id__isnull=False,
+    ).exclude(
+        booking__parking_space__host__stripe_account_id=''
+    ).exclude(Exists(linked))
+
+
+def host_totals(payments, min_amount=DEFAULT_MIN_AMOUNT):
+    """
+    One row per host and currency of ``payments`` owed at least
+    ``min_amount``: host_id, host_email, currency, total, payment_count,
+    period_start and period_end.
+    """
+    return payments.values(
+        'currency',
+        host_id=F('booking__parking_space__host_id'),
+        host_email=F('booking__parking_space__host__email'),
+    ).annotate(
+        total=Sum('host_payout_amount'),
+        payment_count=Count('pk'),
+        period_start=Min('created_at'),
+        period_end=Max('created_at'),
+    ).filter(total__gte=min_amount).order_by('host_id', 'currency')
+
+
+@transaction.atomic
+def create_payouts(min_amount=DEFAULT_MIN_AMOUNT):
+    """
+    Claim the unpaid payments and create one pending payout per host and
+    currency. Returns the new payouts.
+    """
+    # Lock only the payment rows, not the joined bookings and hosts
+    payment_ids = [
+        payment.pk for payment in
+        unpaid_payments().select_for_update(skip_locked=True, of=('self',)).only('pk')
+    ]
+    # The locking query may have read the links from before a concurrent run
+    # committed; check again in a new statement, which sees those links
+    payment_ids = list(unpaid_payments().filter(pk__in=payment_ids).values_list('pk', flat=True))
+    if not payment_ids:
+        return []
+    claimed = Payment.objects.filter(pk__in=payment_ids)
+
+    payouts = []
+    for row in host_totals(claimed, min_amount):
+        payout = Payout(
+            host_id=row['host_id'],
+            amount=row['total'],
+            currency=row['currency'],
+            period_start=row['period_start'],
+            period_end=row['period_end'],
+            description=f"Payout for {row['payment_count']} bookings",
+        )
+        # bulk_create skips save(), which assigns the ID
+        payout.payout_id = payout.generate_payout_id()
+        payouts.append(payout)
+    if not payouts:
+        return []
+
+    Payout.objects.bulk_create(payouts, batch_size=BULK_BATCH_SIZE)
+    if payouts[0].pk is None:
+        # Backends that can't return IDs from a bulk insert
+        payouts = list(Payout.objects.filter(payout_id__in=[payout.payout_id for payout in payouts]))
+
+    payout_ids = {(payout.host_id, payout.currency): payout.pk for payout in payouts}
+    links = [
+        PayoutPayment(payout_id=payout_ids[(host_id, currency)], payment_id=payment_id)
+        for payment_id, host_id, currency in claimed.values_list(
+            'pk', 'booking__parking_space__host_id', 'currency'
+        )
+        if (host_id, currency) in payout_ids
+    ]
+    # bulk_create sends no m2m_changed, so update the hosts' balances here
+    ledger.record_payout_links((link.payout_id, link.payment_id) for link in links)
+    PayoutPayment.objects.bulk_create(links, batch_size=BULK_BATCH_SIZE)
+
+    logger.info(f"Created {len(payouts)} payouts for {len(payment_ids)} claimed payments")
+    return payouts
+
+
+def pending_payouts():
+    """Payouts created by ``create_payouts`` that Stripe has not accepted yet."""
+    linked = PayoutPayment.objects.filter(payout_id=OuterRef('pk'))
+    return Payout.objects.filter(
+        Exists(linked), status=PayoutStatus.PENDING, stripe_payout_id=''
+    ).select_related('host').order_by('pk')
+
+
+def _payout_request(payout):
+    return {
+        'amount': int(payout.amount * 100),  # Convert to cents
+        'currency': payout.currency.lower(),
+        'stripe_account': payout.host.stripe_account_id,
+        'metadata': {'payout_id': payout.payout_id, 'host_id': payout.host_id},
+        'idempotency_key': f'payout-{payout.payout_id}',
+    }
+
+
+def submit_payouts(payouts, transport=None, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE_LIMIT):
+    """
+    Send ``payouts`` to Stripe and record the results.
+
+    Only the Stripe calls run on the worker threads; the database is read
+    before and written after. Returns a dict of counts per outcome.
+    """
+    payouts = list(payouts)
+    counts = {'submitted': 0, 'retry': 0, 'failed': 0}
+    if not payouts:
+        return counts
+
+    transport = transport or StripePayoutTransport()
+    limiter = RateLimiter(rate)
+    requests = [_payout_request(payout) for payout in payouts]
+
+    def submit(request):
+        limiter.wait()
+        try:
+            return transport.create_payout(**request), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(submit, requests))
+
+    now = timezone.now()
+    failed_ids = []
+    for payout, (result, error) in zip(payouts, results):
+        if error is None:
+            payout.stripe_payout_id = result['id']
+            payout.status = STRIPE_PAYOUT_STATUSES.get(result['status'], PayoutStatus.PROCESSING)
+            payout.processed_at = now
+            payout.failure_code = ''
+            payout.failure_message = ''
+            counts['submitted'] += 1
+        elif isinstance(error, RETRYABLE_ERRORS):
+            # Stays pending; the next run resubmits with the same idempotency key
+            payout.failure_message = str(error)
+            counts['retry'] += 1
+        else:
+            logger.error(f"Stripe rejected payout {payout.payout_id} for host {payout.host_id}: {str(error)}")
+            payout.status = PayoutStatus.FAILED
+            payout.failure_code = (getattr(error, 'code', None) or type(error).__name__)[:50]
+            payout.failure_message = str(error)
+            failed_ids.append(payout.pk)
+            counts['failed'] += 1
+        payout.updated_at = now
+
+    with transaction.atomic():
+        Payout.objects.bulk_update(payouts, [
+            'stripe_payout_id', 'status', 'processed_at',
+            'failure_code', 'failure_message', 'updated_at',
+        ], batch_size=BULK_BATCH_SIZE)
+        # Neither bulk_update nor a queryset delete sends signals, so the
+        # hosts' balances are updated here
+        ledger.record_payout_status_changes(
+            (payout, payout.original_value('status'), payout.status) for payout in payouts
+        )
+        # Release the payments of rejected payouts for a later payout
+        released = PayoutPayment.objects.filter(payout_id__in=failed_ids)
+        ledger.record_payout_links(released.values_list('payout_id', 'payment_id'), removing=True)
+        released.delete()
+
+    logger.info(f"Submitted payouts: {counts}")
+    return counts
+
+
+def run_payouts(min_amount=DEFAULT_MIN_AMOUNT, transport=None,
+                concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE_LIMIT):
+    """
+    Create payouts for everything unpaid, then submit every pending payout
+    (including ones left over from an earlier run). Returns counts.
+    """
+    created = create_payouts(min_amount)
+    counts = submit_payouts(pending_payouts(), transport, concurrency, rate)
+    counts['created'] = len(created)
+    return counts
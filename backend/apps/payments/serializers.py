@@ -111,8 +111,13 @@ class CreatePaymentIntentSerializer(serializers.Serializer):
     """
     booking_id = serializers.CharField(
         max_length=20,
+        required=False,
         help_text="Booking ID to create payment for"
     )
+    hold_id = serializers.UUIDField(
+        required=False,
+        help_text="Booking hold to pay for; the booking is created when payment succeeds"
+    )
     payment_method_id = serializers.IntegerField(
         required=False,
         help_text="Payment method ID to use (optional)"
@@ -121,6 +126,11 @@ class CreatePaymentIntentSerializer(serializers.Serializer):
         default=False,
         help_text="Save payment method for future use"
     )
+    
+    def validate(self, data):
+        if bool(data.get('booking_id')) == bool(data.get('hold_id')):
+            raise serializers.ValidationError("Provide either booking_id or hold_id.")
+        return data
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -312,13 +322,15 @@ class WebhookEventSerializer(serializers.ModelSerializer):
         model = WebhookEvent
         fields = [
             'id', 'stripe_event_id', 'event_type', 'api_version',
+            'object_id', 'source', 'stripe_created',
             'status', 'processed_at', 'error_message', 'retry_count',
-            'created_at', 'updated_at'
+            'next_attempt_at', 'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'stripe_event_id', 'event_type', 'api_version',
+            'object_id', 'source', 'stripe_created',
             'status', 'processed_at', 'error_message', 'retry_count',
-            'created_at', 'updated_at'
+            'next_attempt_at', 'created_at', 'updated_at'
         ]
 
 
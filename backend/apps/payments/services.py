@@ -7,8 +7,11 @@ from decimal import Decimal
 from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
+from . import stripe_gateway
 from .models import Payment, Payout, Refund
-from ..bookings.models import Booking
+from ..bookings.conflicts import BookingConflict
+from ..bookings.holds import HoldUnavailable, convert_hold
+from ..bookings.models import Booking, BookingHold
 from ..users.models import User
 
 logger = logging.getLogger(__name__)
@@ -46,7 +49,8 @@ class PaymentService:
             stripe.api_key = settings.STRIPE_SECRET_KEY
             
             # Create real Stripe payment intent
-            payment_intent = stripe.PaymentIntent.create(
+            payment_intent = stripe_gateway.call(
+                'payment_intent.create', stripe.PaymentIntent.create,
                 amount=amount,
                 currency='usd',
                 metadata={
@@ -102,7 +106,8 @@ class PaymentService:
             # Create customer if doesn't exist
             user = User.objects.get(id=booking_data['user_id'])
             if not user.stripe_customer_id:
-                customer = stripe.Customer.create(
+                customer = stripe_gateway.call(
+                    'customer.create', stripe.Customer.create,
                     email=user.email,
                     name=f"{user.first_name} {user.last_name}",
                     metadata={'user_id': user.id}
@@ -111,7 +116,8 @@ class PaymentService:
                 user.save()
             
             # Create price for recurring booking
-            price = stripe.Price.create(
+            price = stripe_gateway.call(
+                'price.create', stripe.Price.create,
                 unit_amount=int(booking_data['amount'] * 100),
                 currency='usd',
                 recurring={'interval': booking_data.get('frequency', 'week')},
@@ -121,7 +127,8 @@ class PaymentService:
             )
             
             # Create subscription
-            subscription = stripe.Subscription.create(
+            subscription = stripe_gateway.call(
+                'subscription.create', stripe.Subscription.create,
                 customer=user.stripe_customer_id,
                 items=[{'price': price.id}],
                 application_fee_percent=10,  # 10% platform fee from hosts
@@ -157,7 +164,8 @@ class PaymentService:
                 raise ValueError("No refund amount available")
             
             # Create Stripe refund
-            refund = stripe.Refund.create(
+            refund = stripe_gateway.call(
+                'refund.create', stripe.Refund.create,
                 payment_intent=payment.stripe_payment_intent_id,
                 amount=int(refund_amount * 100),  # Convert to cents
                 metadata={
@@ -195,8 +203,12 @@ class PayoutService:
         """Initiate payout to host after successful booking payment"""
         try:
             with transaction.atomic():
+                # Reload: the caller's instance may hold unsaved Python values
+                # (e.g. a float total_amount) rather than the stored decimals
+                booking = Booking.objects.select_related('parking_space__host').get(pk=booking.pk)
+                
                 # Calculate payout amount (keep 10% for platform)
-                platform_fee = booking.total_amount * Decimal('0.10')  # 10% platform fee from hosts
+                platform_fee = (booking.total_amount * Decimal('0.10')).quantize(Decimal('0.01'))  # 10% platform fee from hosts
                 payout_amount = booking.total_amount - platform_fee
                 
                 # Get host's Stripe account
@@ -206,19 +218,23 @@ class PayoutService:
                 
                 # Create payout record
                 payout = Payout.objects.create(
-                    booking=booking,
                     host=host,
                     amount=payout_amount,
-                    platform_fee=platform_fee,
-                    currency='usd',
-                    status='pending'
+                    period_start=booking.start_time,
+                    period_end=booking.end_time,
+                    description=f"Payout for booking {booking.booking_id}",
+                    status=Payout.PayoutStatus.PENDING
                 )
+                # Linking the payment keeps it out of the periodic payout run
+                payment = Payment.objects.filter(booking=booking).first()
+                if payment:
+                    payout.payments.add(payment)
                 
-                # Check if immediate payout is enabled for host
-                if host.profile.instant_payout_enabled:
+                # Check if immediate payout is enabled for host; otherwise the
+                # next payout run submits the pending payout
+                profile = getattr(host, 'profile', None)
+                if getattr(profile, 'instant_payout_enabled', False):
                     PayoutService._process_instant_payout(payout)
-                else:
-                    PayoutService._schedule_payout(payout)
                 
                 return payout
                 
@@ -230,28 +246,30 @@ class PayoutService:
     def _process_instant_payout(payout):
         """Process instant payout to host"""
         try:
-            # Create Stripe transfer
-            transfer = stripe.Transfer.create(
+            # Create Stripe transfer (keyed on the payout, so a rerun never pays twice)
+            transfer = stripe_gateway.call(
+                'transfer.create', stripe.Transfer.create,
                 amount=int(payout.amount * 100),  # Convert to cents
-                currency=payout.currency,
+                currency=payout.currency.lower(),
                 destination=payout.host.stripe_account_id,
                 metadata={
-                    'booking_id': payout.booking.id,
-                    'payout_id': payout.id
-                }
+                    'payout_id': payout.payout_id,
+                    'host_id': payout.host_id
+                },
+                idempotency_key=f'payout-transfer-{payout.payout_id}'
             )
             
-            payout.stripe_transfer_id = transfer.id
-            payout.status = 'processing'
+            payout.stripe_payout_id = transfer.id
+            payout.status = Payout.PayoutStatus.PROCESSING
             payout.processed_at = timezone.now()
             payout.save()
             
-            logger.info(f"Instant payout initiated for booking {payout.booking.id}")
+            logger.info(f"Instant payout initiated: {payout.payout_id}")
             
         except Exception as e:
             logger.error(f"Error processing instant payout: {str(e)}")
-            payout.status = 'failed'
-            payout.failure_reason = str(e)
+            payout.status = Payout.PayoutStatus.FAILED
+            payout.failure_message = str(e)
             payout.save()
             raise e
     
@@ -365,6 +383,76 @@ class RefundService:
         }[policy]
 
 
+class HoldPaymentService:
+    """Settle the payment intents of booking holds (see bookings.holds)"""
+    
+    @staticmethod
+    def convert_paid_hold(hold_id, payment_intent_id):
+        """
+        Book a paid hold. If the hold is gone or its slot was taken, refund
+        the payment instead and return None.
+        """
+        try:
+            return convert_hold(hold_id, payment_intent_id)
+        except (HoldUnavailable, BookingConflict):
+            HoldPaymentService.refund_unbookable_hold(hold_id, payment_intent_id)
+            return None
+    
+    @staticmethod
+    def refund_unbookable_hold(hold_id, payment_intent_id):
+        """
+        Refund a payment whose hold could not be booked and drop the hold.
+        Keyed on the payment intent, so webhook retries refund only once.
+        """
+        try:
+            refund = stripe_gateway.call(
+                'refund.create', stripe.Refund.create,
+                payment_intent=payment_intent_id,
+                metadata={
+                    'hold_id': str(hold_id),
+                    'reason': 'hold_unavailable'
+                },
+                idempotency_key=f'hold-refund-{payment_intent_id}'
+            )
+        except stripe.error.InvalidRequestError as e:
+            if e.code != 'charge_already_refunded':
+                raise
+            refund = None
+        
+        BookingHold.objects.filter(hold_id=hold_id, booking__isnull=True).delete()
+        logger.warning(
+            f"Payment {payment_intent_id} succeeded but hold {hold_id} could not be booked; "
+            f"refunded ({refund.id if refund else 'already refunded'})"
+        )
+        return refund
+    
+    @staticmethod
+    def cancel_hold_payment(hold):
+        """
+        Cancel the payment intent of an expired hold. Returns True once the
+        hold can no longer be charged.
+        
+        A payment that already went through cannot be cancelled: the hold
+        is then left for the payment webhook, which books or refunds it.
+        """
+        try:
+            try:
+                stripe_gateway.call(
+                    'payment_intent.cancel', stripe.PaymentIntent.cancel,
+                    hold.stripe_payment_intent_id,
+                    cancellation_reason='abandoned'
+                )
+                return True
+            except stripe.error.InvalidRequestError:
+                intent = stripe_gateway.call(
+                    'payment_intent.retrieve', stripe.PaymentIntent.retrieve, hold.stripe_payment_intent_id
+                )
+                return intent.status == 'canceled'
+        except stripe.error.StripeError as e:
+            logger.error(f"Error cancelling payment intent for hold {hold.hold_id}: {str(e)}")
+            return False
+
+
 class NotificationService:
     """Handle payment-related notifications"""
     
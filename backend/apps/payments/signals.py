@@ -2,11 +2,12 @@
 Signals for payments app.
 """
 import logging
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import m2m_changed, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from apps.bookings.models import Booking
-from .models import PaymentIntent, Payment, Refund
+from . import ledger
+from .models import PaymentIntent, Payment, Payout, Refund
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +64,42 @@ def payment_status_changed(sender, instance, created, **kwargs):
             logger.error(f"Error handling failed payment: {e}")
 
 
+@receiver(post_save, sender=Payment)
+def update_ledger_for_payment(sender, instance, created, **kwargs):
+    """
+    Credit or debit the host's balance when a payment enters or leaves
+    the succeeded status.
+    """
+    if created or instance.has_changed('status'):
+        old_status = None if created else instance.original_value('status')
+        ledger.record_payment_status_change(instance, old_status, instance.status)
+
+
+@receiver(post_save, sender=Payout)
+def update_ledger_for_payout(sender, instance, created, **kwargs):
+    """
+    Move the host's paid-out total when a payout is paid (or no longer is).
+    """
+    if created or instance.has_changed('status'):
+        old_status = None if created else instance.original_value('status')
+        ledger.record_payout_status_changes([(instance, old_status, instance.status)])
+
+
+@receiver(m2m_changed, sender=Payout.payments.through)
+def update_ledger_for_payout_payments(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Move payments in and out of the host's pending payout as they are
+    added to or removed from payouts.
+    """
+    if action not in ('pre_add', 'pre_remove', 'pre_clear'):
+        return
+    if action == 'pre_clear':
+        links = instance.payouts if reverse else instance.payments
+        pk_set = set(links.values_list('pk', flat=True))
+    links = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+    ledger.record_payout_links(links, removing=action != 'pre_add')
+
+
 @receiver(post_save, sender=Refund)
 def refund_status_changed(sender, instance, created, **kwargs):
     """
@@ -93,11 +130,8 @@ def booking_status_changed(sender, instance, **kwargs):
     """
     if instance.pk:
         try:
-            # Get the old booking status
-            old_booking = Booking.objects.get(pk=instance.pk)
-            
             # If booking is being cancelled and payment exists, consider refund
-            if (old_booking.status in ['confirmed', 'active'] and 
+            if (instance.original_value('status') in ['confirmed', 'active'] and 
                 instance.status == 'cancelled' and 
                 hasattr(instance, 'payment')):
                 
@@ -107,9 +141,6 @@ def booking_status_changed(sender, instance, **kwargs):
                     # You could automatically create a refund request here
                     # or flag it for admin review
             
-        except Booking.DoesNotExist:
-            # New booking, nothing to do
-            pass
         except Exception as e:
             logger.error(f"Error handling booking status change: {e}")
 
@@ -0,0 +1,366 @@
+"""
+Shared gateway for calls to the Stripe API.
+
+Every call site used the module-level ``stripe`` client with its default
+networking: a lazily created session per thread, an 80 second timeout and
+no retries, so TLS handshakes and the odd stalled connection showed up in
+the p95 of payment intent creation. Calls now go through ``call``:
+
+    intent = stripe_gateway.call('payment_intent.create', stripe.PaymentIntent.create, **params)
+
+- one ``requests`` session with a sized connection pool serves every
+  thread (PooledRequestsClient, installed by PaymentsConfig.ready), so
+  connections are reused across requests and across the payout workers;
+- each call gets a timeout (connect + read; shorter for reads) unless the
+  caller passes one;
+- connection errors, rate limiting and Stripe 5xx are retried with
+  jittered exponential backoff. Writes carry one idempotency key for all
+  attempts, so a retried create never creates twice;
+- latency, retries and errors are recorded per operation in ``metrics``
+  (per process; see ``metrics.snapshot()`` and the stripe-metrics
+  endpoint).
+
+Timeouts and idempotency keys reach the HTTP client through a context
+variable, so call sites keep the usual ``stripe`` resource methods.
+FakeStripeHTTPClient answers the API in-process for tests and benchmarks
+(``with stripe_gateway.fake_stripe() as fake: ...``).
+"""
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = 20
+CONNECT_TIMEOUT = 3.05
+WRITE_TIMEOUT = 20
+READ_TIMEOUT = 10
+MAX_RETRIES = 2
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 2.0
+SLOW_CALL_SECONDS = 2.0
+LATENCY_SAMPLES = 1000
+
+# Operations ('<object>.<action>') that only read and need no idempotency key
+READ_ACTIONS = ('retrieve', 'list')
+
+RETRYABLE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
+_call_options = contextvars.ContextVar('stripe_call_options', default=None)
+
+
+class OperationMetrics:
+    """Counters and recent latencies of one operation."""
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.errors = Counter()
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self):
+        samples = sorted(self.samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'errors': dict(self.errors),
+            'avg_ms': round(self.total_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+            'p95_ms': round(p95 * 1000, 1),
+            'max_ms': round(self.max_seconds * 1000, 1),
+        }
+
+
+class StripeMetrics:
+    """Per-operation latency, retry and error metrics of this process."""
+
+    def __init__(self):
+        self._operations = defaultdict(OperationMetrics)
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, retries=0, error=None):
+        with self._lock:
+            metrics = self._operations[operation]
+            metrics.calls += 1
+            metrics.retries += retries
+            metrics.total_seconds += seconds
+            metrics.max_seconds = max(metrics.max_seconds, seconds)
+            metrics.samples.append(seconds)
+            if error:
+                metrics.errors[error] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {operation: metrics.snapshot() for operation, metrics in sorted(self._operations.items())}
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
+metrics = StripeMetrics()
+
+
+def _apply_call_options(headers):
+    """The request headers with the current call's idempotency key."""
+    options = _call_options.get()
+    if not options or not options['idempotency_key'] or headers is None:
+        return headers
+    headers = dict(headers)
+    if 'Idempotency-Key' in headers:
+        # Replace the per-attempt key stripe generates with the per-call one
+        headers['Idempotency-Key'] = options['idempotency_key']
+    return headers
+
+
+class PooledRequestsClient(stripe.http_client.RequestsClient):
+    """RequestsClient on one pooled session shared by all threads."""
+
+    def __init__(self, pool_size=POOL_SIZE, timeout=WRITE_TIMEOUT):
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        super().__init__(timeout=timeout, session=session)
+
+    @property
+    def _timeout(self):
+        options = _call_options.get()
+        return options['timeout'] if options else (CONNECT_TIMEOUT, self._default_timeout)
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self._default_timeout = value
+
+    def request(self, method, url, headers, post_data=None):
+        return super().request(method, url, _apply_call_options(headers), post_data)
+
+
+def install_http_client(client=None):
+    """
+    Make ``client`` (a new PooledRequestsClient by default) serve every
+    Stripe request. Returns the previous client.
+    """
+    previous = stripe.default_http_client
+    stripe.default_http_client = client or PooledRequestsClient()
+    # Retries happen in ``call``, where the idempotency key is kept stable
+    stripe.max_network_retries = 0
+    return previous
+
+
+def retry_delay(attempt):
+    """Full-jitter backoff before retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def call(operation, method, *args, idempotency_key=None, timeout=None, max_retries=MAX_RETRIES, **params):
+    """
+    Call the stripe resource ``method`` as ``operation`` (e.g.
+    'customer.create') and return its result.
+
+    Writes get a fresh idempotency key unless ``idempotency_key`` is given.
+    ``timeout`` is the read timeout in seconds. Transient failures are
+    retried up to ``max_retries`` times; the last error is raised.
+    """
+    reading = operation.rsplit('.', 1)[-1] in READ_ACTIONS
+    if idempotency_key is None and not reading:
+        idempotency_key = f'{operation}-{uuid.uuid4()}'
+    token = _call_options.set({
+        'timeout': (CONNECT_TIMEOUT, timeout or (READ_TIMEOUT if reading else WRITE_TIMEOUT)),
+        'idempotency_key': idempotency_key,
+    })
+    started = time.monotonic()
+    attempt = 0
+    try:
+        while True:
+            try:
+                result = method(*args, **params)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt >= max_retries:
+                    raise
+                attempt += 1
+                logger.warning(f"Retrying Stripe {operation} (attempt {attempt + 1}): {str(e)}")
+                time.sleep(retry_delay(attempt))
+    except Exception as e:
+        metrics.record(operation, time.monotonic() - started, attempt, type(e).__name__)
+        raise
+    finally:
+        _call_options.reset(token)
+
+    elapsed = time.monotonic() - started
+    metrics.record(operation, elapsed, attempt)
+    if elapsed > SLOW_CALL_SECONDS:
+        logger.warning(f"Slow Stripe {operation}: {elapsed:.2f}s after {attempt} retries")
+    return result
+
+
+def _decode_form(post_data):
+    """Stripe's form encoding (``metadata[user_id]=1``) back into a dict."""
+    data = {}
+    for key, value in parse_qsl(post_data or '', keep_blank_values=True):
+        parts = key.replace(']', '').split('[')
+        target = data
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return data
+
+
+class FakeStripeHTTPClient(stripe.http_client.HTTPClient):
+    """
+    In-process stand-in for the Stripe API.
+
+    Keeps created objects in memory and answers create, retrieve, update
+    and action (confirm, cancel, attach, detach) requests for them.
+    Repeated idempotency keys replay the first response, as Stripe does.
+    ``fail_next`` makes the next requests fail with a status code; for
+    benchmarks, ``latency`` delays every request and ``failure_rate``
+    answers that fraction of requests with a 503.
+    """
+    name = 'fake'
+
+    ID_PREFIXES = {
+        'customers': 'cus',
+        'payment_intents': 'pi',
+        'payment_methods': 'pm',
+        'payouts': 'po',
+        'prices': 'price',
+        'refunds': 're',
+        'subscriptions': 'sub',
+        'transfers': 'tr',
+    }
+    CREATE_DEFAULTS = {
+        'payment_intents': {'status': 'requires_payment_method'},
+        'payouts': {'status': 'pending'},
+        'refunds': {'status': 'succeeded'},
+        'subscriptions': {'status': 'active'},
+    }
+    ACTION_UPDATES = {
+        'confirm': {'status': 'succeeded'},
+        'cancel': {'status': 'canceled'},
+        'detach': {'customer': None},
+    }
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        super().__init__()
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.objects = {}
+        self.requests = []
+        self._failures = deque()
+        self._responses = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def fail_next(self, count=1, status=503):
+        """Answer the next ``count`` requests with HTTP ``status``."""
+        self._failures.extend([status] * count)
+
+    def add(self, resource, **fields):
+        """Store an object as if it already existed in Stripe."""
+        with self._lock:
+            return self._store(resource, fields)
+
+    def _store(self, resource, fields):
+        self._counter += 1
+        obj = {
+            'id': f"{self.ID_PREFIXES.get(resource, resource[:3])}_fake_{self._counter}",
+            'object': resource[:-1],
+            'created': int(time.time()),
+            'livemode': False,
+            'metadata': {},
+            **self.CREATE_DEFAULTS.get(resource, {}),
+            **fields,
+        }
+        if resource == 'payment_intents':
+            obj.setdefault('client_secret', f"{obj['id']}_secret_fake")
+        self.objects[obj['id']] = obj
+        return obj
+
+    def _respond(self, status, body):
+        headers = CaseInsensitiveDict({'Request-Id': f'req_fake_{uuid.uuid4().hex[:12]}'})
+        return json.dumps(body), status, headers
+
+    def _error(self, status, message, error_type='api_error', code=None):
+        return self._respond(status, {'error': {'type': error_type, 'message': message, 'code': code}})
+
+    def request(self, method, url, headers, post_data=None):
+        headers = _apply_call_options(headers) or {}
+        if self.latency:
+            time.sleep(self.latency)
+        path = urlsplit(url).path
+        parts = path.split('/')[2:]  # drop '' and 'v1'
+        params = _decode_form(post_data if method == 'post' else urlsplit(url).query)
+        key = headers.get('Idempotency-Key')
+
+        with self._lock:
+            self.requests.append({'method': method, 'path': path, 'params': params, 'idempotency_key': key})
+            if key and key in self._responses:
+                return self._responses[key]
+            if self._failures:
+                return self._error(self._failures.popleft(), 'Simulated Stripe failure')
+            if self.failure_rate and random.random() < self.failure_rate:
+                return self._error(503, 'Simulated Stripe failure')
+            response = self._handle(method, parts, params)
+            if key and method == 'post' and response[1] < 500:
+                self._responses[key] = response
+            return response
+
+    def _handle(self, method, parts, params):
+        resource = parts[0] if parts else ''
+        if len(parts) == 1 and method == 'post':
+            return self._respond(200, self._store(resource, params))
+        if len(parts) == 1 and method == 'get':
+            data = [obj for obj in self.objects.values() if obj['object'] == resource[:-1]]
+            return self._respond(200, {'object': 'list', 'data': data, 'has_more': False, 'url': f'/v1/{resource}'})
+
+        obj = self.objects.get(parts[1]) if len(parts) > 1 else None
+        if obj is None:
+            return self._error(
+                404, f'No such {resource[:-1]}', error_type='invalid_request_error', code='resource_missing'
+            )
+        if method == 'post':
+            obj.update(params)
+            if len(parts) > 2:
+                obj.update(self.ACTION_UPDATES.get(parts[2], {}))
+        elif method == 'delete':
+            obj['deleted'] = True
+        return self._respond(200, obj)
+
+    def request_stream(self, method, url, headers, post_data=None):
+        raise NotImplementedError('FakeStripeHTTPClient does not stream responses')
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def fake_stripe(latency=0.0, failure_rate=0.0):
+    """Serve Stripe requests from a FakeStripeHTTPClient inside the block."""
+    client = FakeStripeHTTPClient(latency=latency, failure_rate=failure_rate)
+    previous = install_http_client(client)
+    api_key = stripe.api_key
+    stripe.api_key = stripe.api_key or settings.STRIPE_SECRET_KEY
+    try:
+        yield client
+    finally:
+        stripe.default_http_client = previous
+        stripe.api_key = api_key
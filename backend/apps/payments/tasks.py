@@ -0,0 +1,20 @@
+"""
+Celery tasks for payment processing.
+"""
+from celery import shared_task
+from .webhook_events import process_pending_events
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_webhook_events():
+    """
+    Process stored Stripe webhook events.
+    Queued after each new event and run every minute via celery beat;
+    safe to run on several workers at once.
+    """
+    counts = process_pending_events()
+    logger.info(f'Webhook event processing completed: {counts}')
+    return counts
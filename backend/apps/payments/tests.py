@@ -295,4 +295,485 @@ class PaymentSignalsTest(TestCase):
         
         pm1.refresh_from_db()
         self.assertFalse(pm1.is_default)
-        self.assertTrue(pm2.is_default)
\ No newline at end of file
+        self.assertTrue(pm2.is_default)
+
+class WebhookEventProcessingTest(TestCase):
+    """Test that webhooks are stored, then processed in the background."""
+    
+    def event(self, event_id, event_type, object_id, created):
+        return {
+            'id': event_id,
+            'type': event_type,
+            'api_version': '2023-10-16',
+            'created': created,
+            'data': {'object': {'id': object_id}},
+        }
+    
+    def post(self, event):
+        import json
+        import stripe
+        
+        verified = stripe.Event.construct_from(event, 'sk_test')
+        with patch('stripe.Webhook.construct_event', return_value=verified):
+            return self.client.post(
+                '/api/v1/payments/webhooks/stripe/',
+                data=json.dumps(event),
+                content_type='application/json',
+                HTTP_STRIPE_SIGNATURE='t=1,v1=test',
+            )
+    
+    def test_webhook_stores_event_once_without_processing(self):
+        """The view acknowledges at once and ignores resent events."""
+        from .models import WebhookEvent
+        from .webhook_handlers import StripeWebhookView
+        
+        event = self.event('evt_1', 'payout.paid', 'po_1', 1700000000)
+        with patch.object(StripeWebhookView, 'handle_event') as handle_event:
+            self.assertEqual(self.post(event).status_code, 200)
+            self.assertEqual(self.post(event).status_code, 200)
+        
+        handle_event.assert_not_called()
+        stored = WebhookEvent.objects.get()
+        self.assertEqual(stored.stripe_event_id, 'evt_1')
+        self.assertEqual(stored.object_id, 'po_1')
+        self.assertEqual(stored.status, WebhookEvent.EventStatus.RECEIVED)
+    
+    def test_events_processed_in_order_per_object(self):
+        """Events of one object run oldest first; failures retry, then go dead."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import WebhookEvent
+        from .webhook_events import MAX_ATTEMPTS, process_pending_events, record_event
+        from .webhook_handlers import StripeWebhookView
+        
+        # Received out of order
+        record_event(self.event('evt_2', 'payout.failed', 'po_1', 1700000002))
+        record_event(self.event('evt_1', 'payout.paid', 'po_1', 1700000001))
+        record_event(self.event('evt_3', 'payout.paid', 'po_2', 1700000003))
+        
+        handled = []
+        
+        def handle_event(view, event):
+            if event['id'] == 'evt_3':
+                raise RuntimeError('Stripe unavailable')
+            handled.append(event['id'])
+            return event['type'] == 'payout.paid'
+        
+        with patch.object(StripeWebhookView, 'handle_event', handle_event):
+            counts = process_pending_events()
+            self.assertEqual(handled, ['evt_1', 'evt_2'])
+            self.assertEqual(counts, {'processed': 1, 'ignored': 1, 'retried': 1, 'dead': 0})
+            self.assertEqual(
+                WebhookEvent.objects.get(stripe_event_id='evt_3').status, WebhookEvent.EventStatus.FAILED
+            )
+            
+            later = timezone.now() + timedelta(days=1)
+            for _ in range(MAX_ATTEMPTS - 1):
+                process_pending_events(now=later)
+        
+        failed = WebhookEvent.objects.get(stripe_event_id='evt_3')
+        self.assertEqual(failed.status, WebhookEvent.EventStatus.DEAD)
+        self.assertEqual(failed.retry_count, MAX_ATTEMPTS)
+        self.assertEqual(failed.error_message, 'Stripe unavailable')
+    
+    def test_permanent_errors_dead_at_once(self):
+        """Errors that would fail every attempt are not retried."""
+        from django.core.exceptions import FieldError
+        from .models import WebhookEvent
+        from .webhook_events import process_pending_events, record_event
+        from .webhook_handlers import StripeWebhookView
+        
+        record_event(self.event('evt_1', 'payout.paid', 'po_1', 1700000001))
+        with patch.object(StripeWebhookView, 'handle_event', side_effect=FieldError('Cannot resolve keyword')):
+            counts = process_pending_events()
+        
+        self.assertEqual(counts, {'processed': 0, 'ignored': 0, 'retried': 0, 'dead': 1})
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.EventStatus.DEAD)
+
+
+class PayoutEngineTest(TestCase):
+    """Test set-based payout creation and submission."""
+    
+    def setUp(self):
+        self.hosts = {}
+        for name, account in [('paid', 'acct_paid'), ('rejected', 'acct_rejected'), ('small', 'acct_small')]:
+            self.hosts[name] = User.objects.create_user(
+                email=f'{name}@example.com',
+                username=name,
+                password='testpass123',
+                stripe_account_id=account,
+            )
+        self.guest = User.objects.create_user(
+            email='guest@example.com',
+            username='guest',
+            password='testpass123'
+        )
+        self.create_payment('paid', Decimal('30.00'))
+        self.create_payment('paid', Decimal('20.00'))
+        self.create_payment('rejected', Decimal('40.00'))
+        self.create_payment('small', Decimal('5.00'))
+    
+    def create_payment(self, host_name, amount):
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.bookings.models import Booking
+        from apps.listings.models import ParkingListing
+        from .models import Payment, PaymentIntent
+        
+        listing = ParkingListing.objects.create(
+            host=self.hosts[host_name],
+            title='Test Parking',
+            address='123 Test St',
+            borough='Manhattan',
+            space_type='driveway',
+            hourly_rate=Decimal('10.00'),
+            daily_rate=Decimal('50.00'),
+            weekly_rate=Decimal('300.00'),
+        )
+        start = timezone.now() - timedelta(days=2)
+        booking = Booking.objects.create(
+            user=self.guest,
+            parking_space=listing,
+            start_time=start,
+            end_time=start + timedelta(hours=2),
+            hourly_rate=Decimal('10.00'),
+            vehicle_license_plate='ABC123',
+        )
+        payment_intent = PaymentIntent.objects.create(
+            booking=booking,
+            user=self.guest,
+            stripe_payment_intent_id=f'pi_{booking.pk}',
+            client_secret=f'pi_{booking.pk}_secret',
+            amount=amount,
+        )
+        return Payment.objects.create(
+            payment_intent=payment_intent,
+            user=self.guest,
+            booking=booking,
+            stripe_charge_id=f'ch_{booking.pk}',
+            amount=amount,
+            status='succeeded',
+            payment_method_type='card',
+        )
+    
+    def test_payouts_grouped_submitted_once_and_failures_released(self):
+        """One payout per host; rejected payouts free their payments; reruns never pay twice."""
+        import stripe
+        from .models import Payout
+        from .payouts import FakePayoutTransport, run_payouts, unpaid_payments
+        
+        transport = FakePayoutTransport(errors={
+            'acct_rejected': stripe.error.InvalidRequestError('Account closed', None, code='account_closed'),
+        })
+        counts = run_payouts(transport=transport, concurrency=2, rate=0)
+        
+        self.assertEqual(counts, {'submitted': 1, 'retry': 0, 'failed': 1, 'created': 2})
+        paid = Payout.objects.get(host=self.hosts['paid'])
+        self.assertEqual(paid.amount, Decimal('50.00'))
+        self.assertEqual(paid.status, Payout.PayoutStatus.PROCESSING)
+        self.assertEqual(paid.payments.count(), 2)
+        self.assertEqual(
+            {request['idempotency_key'] for request in transport.requests},
+            {f'payout-{payout.payout_id}' for payout in Payout.objects.all()}
+        )
+        
+        rejected = Payout.objects.get(host=self.hosts['rejected'])
+        self.assertEqual(rejected.status, Payout.PayoutStatus.FAILED)
+        self.assertEqual(rejected.failure_code, 'account_closed')
+        self.assertEqual(
+            sorted(unpaid_payments().values_list('amount', flat=True)),
+            [Decimal('5.00'), Decimal('40.00')]
+        )
+        
+        # A transient error leaves the payout pending; the next run resubmits it
+        transport.errors['acct_rejected'] = stripe.error.APIConnectionError('Timed out')
+        self.assertEqual(run_payouts(transport=transport, rate=0)['retry'], 1)
+        del transport.errors['acct_rejected']
+        counts = run_payouts(transport=transport, rate=0)
+        self.assertEqual(counts, {'submitted': 1, 'retry': 0, 'failed': 0, 'created': 0})
+        self.assertEqual(Payout.objects.filter(host=self.hosts['paid']).count(), 1)
+    
+    def test_payments_linked_by_a_concurrent_run_not_claimed_again(self):
+        """Payments another run linked after the locking query read them are skipped."""
+        from .models import Payment
+        from . import payouts
+        
+        unpaid = payouts.unpaid_payments
+        first = payouts.create_payouts()
+        self.assertEqual(len(first), 2)
+        
+        # The locking query's snapshot predates the other run's links
+        stale = [Payment.objects.all()]
+        with patch.object(payouts, 'unpaid_payments', side_effect=lambda: stale.pop() if stale else unpaid()):
+            self.assertEqual(payouts.create_payouts(), [])
+    
+    def test_host_balances_follow_payments_and_payouts(self):
+        """Ledger balances match the earnings aggregates through payouts, refunds and a rebuild."""
+        import stripe
+        from django.db.models import Sum
+        from .ledger import get_host_earnings, rebuild_host_balances
+        from .models import Payment, Payout
+        from .payouts import FakePayoutTransport, run_payouts
+        
+        def aggregated(host):
+            payments = Payment.objects.filter(booking__parking_space__host=host, status='succeeded')
+            return {
+                'total_earnings': payments.aggregate(total=Sum('host_payout_amount'))['total'] or Decimal('0.00'),
+                'total_bookings': payments.count(),
+                'pending_payout': payments.filter(payouts__isnull=True).aggregate(
+                    total=Sum('host_payout_amount'))['total'] or Decimal('0.00'),
+                'paid_out': Payout.objects.filter(host=host, status='paid').aggregate(
+                    total=Sum('amount'))['total'] or Decimal('0.00'),
+            }
+        
+        def assert_balances():
+            for host in self.hosts.values():
+                self.assertEqual(get_host_earnings(host), aggregated(host))
+        
+        assert_balances()
+        run_payouts(transport=FakePayoutTransport(errors={
+            'acct_rejected': stripe.error.InvalidRequestError('Account closed', None),
+        }), rate=0)
+        assert_balances()
+        
+        payout = Payout.objects.get(host=self.hosts['paid'])
+        payout.status = Payout.PayoutStatus.PAID
+        payout.save()
+        refunded = Payment.objects.filter(booking__parking_space__host=self.hosts['paid']).first()
+        refunded.status = Payment.PaymentStatus.REFUNDED
+        refunded.save()
+        self.create_payment('small', Decimal('7.00')).payouts.add(payout)
+        assert_balances()
+        self.assertEqual(get_host_earnings(self.hosts['paid'])['paid_out'], Decimal('50.00'))
+        
+        self.assertEqual(rebuild_host_balances(), 3)
+        assert_balances()
+    
+    def test_exports_stream_with_a_fixed_number_of_queries(self):
+        """Payout request and payout exports don't query per row; XLSX is a valid workbook."""
+        import csv
+        import io
+        import zipfile
+        from .exports import export_response
+        from .models import Payment, Payout, PayoutRequest
+        from .payouts import FakePayoutTransport, run_payouts
+        
+        run_payouts(transport=FakePayoutTransport(), rate=0)
+        for host in self.hosts.values():
+            payout_request = PayoutRequest.objects.create(
+                host=host,
+                requested_amount=Decimal('25.00'),
+                status=PayoutRequest.RequestStatus.APPROVED,
+                account_number='123456789',
+            )
+            payout_request.payments.set(Payment.objects.filter(booking__parking_space__host=host))
+        
+        response = export_response('payout_requests', PayoutRequest.objects.order_by('pk'), 'csv')
+        with self.assertNumQueries(1):
+            content = b''.join(chunk if isinstance(chunk, bytes) else chunk.encode()
+                               for chunk in response.streaming_content)
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual([row[12] for row in rows[1:]], ['2', '1', '1'])
+        self.assertEqual(rows[1][10], '****6789')
+        
+        response = export_response('payouts', Payout.objects.order_by('pk'), 'xlsx')
+        self.assertEqual(
+            response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        with self.assertNumQueries(2):  # Payouts with hosts, then one prefetch of their payments
+            content = b''.join(response.streaming_content)
+        workbook = zipfile.ZipFile(io.BytesIO(content))
+        self.assertIsNone(workbook.testzip())
+        self.assertEqual(workbook.read('xl/worksheets/sheet1.xml').count(b'<row>'), 3)
+
+
+class StripeGatewayTest(TestCase):
+    """Test the shared Stripe gateway against the in-process fake."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+    
+    @patch('apps.payments.stripe_gateway.time.sleep')
+    def test_retries_reuse_idempotency_key_and_record_metrics(self, mock_sleep):
+        """A transient failure is retried once with the same key; reads carry no key."""
+        import stripe
+        from . import stripe_gateway
+        from .utils import create_stripe_customer
+        
+        stripe_gateway.metrics.reset()
+        with stripe_gateway.fake_stripe() as fake:
+            fake.fail_next(1, status=503)
+            customer_id = create_stripe_customer(self.user)
+            
+            customer = stripe_gateway.call('customer.retrieve', stripe.Customer.retrieve, customer_id)
+            self.assertEqual(customer.email, self.user.email)
+            self.assertEqual(customer.metadata['user_id'], str(self.user.id))
+            
+            with self.assertRaises(stripe.error.InvalidRequestError):
+                stripe_gateway.call('payment_method.retrieve', stripe.PaymentMethod.retrieve, 'pm_missing')
+        
+        create_requests = [request for request in fake.requests if request['method'] == 'post']
+        self.assertEqual(len(create_requests), 2)
+        self.assertEqual(create_requests[0]['idempotency_key'], create_requests[1]['idempotency_key'])
+        self.assertIsNone(fake.requests[2]['idempotency_key'])
+        mock_sleep.assert_called_once()
+        
+        snapshot = stripe_gateway.metrics.snapshot()
+        self.assertEqual(snapshot['customer.create']['calls'], 1)
+        self.assertEqual(snapshot['customer.create']['retries'], 1)
+        self.assertEqual(snapshot['payment_method.retrieve']['errors'], {'InvalidRequestError': 1})
+
+
+class HoldPaymentTest(TestCase):
+    """Test that hold payments are cancelled or refunded when no booking comes of them."""
+    
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.listings.models import ParkingListing
+        
+        self.host = User.objects.create_user(
+            email='host@example.com',
+            username='host',
+            password='testpass123'
+        )
+        self.guest = User.objects.create_user(
+            email='guest@example.com',
+            username='guest',
+            password='testpass123'
+        )
+        self.listing = ParkingListing.objects.create(
+            host=self.host,
+            title='Test Parking',
+            address='123 Test St',
+            borough='Manhattan',
+            space_type='driveway',
+            hourly_rate=Decimal('10.00'),
+            daily_rate=Decimal('50.00'),
+            weekly_rate=Decimal('300.00'),
+        )
+        self.start = timezone.now() + timedelta(days=1)
+    
+    def create_hold(self, offset_hours, payment_intent_id=''):
+        from datetime import timedelta
+        from apps.bookings.holds import create_hold
+        
+        start = self.start + timedelta(hours=offset_hours)
+        return create_hold(
+            self.guest, self.listing, start, start + timedelta(hours=1),
+            vehicle_license_plate='ABC123', stripe_payment_intent_id=payment_intent_id,
+        )
+    
+    def test_expired_holds_cancel_their_payment_intents(self):
+        """Expiry cancels checkout payments and keeps converted holds."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.bookings.holds import convert_hold, expire_holds
+        from apps.bookings.models import BookingHold
+        from . import stripe_gateway
+        
+        with stripe_gateway.fake_stripe() as fake:
+            abandoned = fake.add('payment_intents', amount=1000)
+            paid = fake.add('payment_intents', amount=1000, status='succeeded')
+            self.create_hold(0)
+            self.create_hold(2, paid['id'])
+            self.create_hold(4, abandoned['id'])
+            converted = self.create_hold(6)
+            convert_hold(converted.hold_id, 'pi_converted')
+            
+            later = timezone.now() + timedelta(hours=1)
+            fake.fail_next(1, status=400)  # Stripe refuses to cancel a succeeded payment
+            self.assertEqual(expire_holds(now=later), 2)
+        
+        self.assertEqual(fake.objects[abandoned['id']]['status'], 'canceled')
+        self.assertEqual(fake.objects[paid['id']]['status'], 'succeeded')
+        self.assertEqual(
+            set(BookingHold.objects.values_list('stripe_payment_intent_id', flat=True)),
+            {paid['id'], 'pi_converted'}
+        )
+    
+    def test_paid_hold_booked_when_side_effects_fail(self):
+        """The booking and payment are kept even if the host payout fails."""
+        from .models import Payment, WebhookEvent
+        from .webhook_events import process_pending_events, record_event
+        
+        hold = self.create_hold(0, 'pi_paid')
+        record_event({
+            'id': 'evt_paid',
+            'type': 'payment_intent.succeeded',
+            'created': 1700000000,
+            'data': {'object': {
+                'id': 'pi_paid',
+                'amount_received': 1000,
+                'currency': 'usd',
+                'latest_charge': 'ch_paid',
+                'metadata': {'hold_id': str(hold.hold_id), 'platform_fee': '0.50'},
+            }},
+        })
+        
+        # Initiating the host payout fails here (the host has no Stripe account either)
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = process_pending_events()
+        
+        self.assertEqual(counts['processed'], 1)
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.EventStatus.PROCESSED)
+        hold.refresh_from_db()
+        payment = Payment.objects.get()
+        self.assertEqual(payment.booking, hold.booking)
+        self.assertEqual(payment.amount, Decimal('10.00'))
+        self.assertEqual(payment.stripe_charge_id, 'ch_paid')
+    
+    def test_paid_hold_creates_host_payout(self):
+        """A paid hold leaves a pending payout for the host, linked to the payment."""
+        from .models import Payment, Payout
+        from .payouts import unpaid_payments
+        from .webhook_events import process_pending_events, record_event
+        
+        self.host.stripe_account_id = 'acct_host'
+        self.host.save()
+        hold = self.create_hold(0, 'pi_paid')
+        record_event({
+            'id': 'evt_paid',
+            'type': 'payment_intent.succeeded',
+            'created': 1700000000,
+            'data': {'object': {
+                'id': 'pi_paid',
+                'amount_received': 1000,
+                'currency': 'usd',
+                'latest_charge': 'ch_paid',
+                'metadata': {'hold_id': str(hold.hold_id), 'platform_fee': '0.50'},
+            }},
+        })
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            process_pending_events()
+        
+        hold.refresh_from_db()
+        payout = Payout.objects.get()
+        self.assertEqual(payout.host, self.host)
+        self.assertEqual(payout.status, Payout.PayoutStatus.PENDING)
+        self.assertEqual(payout.amount, Decimal('9.00'))  # $10 less the 10% platform fee
+        self.assertEqual(list(payout.payments.all()), [Payment.objects.get()])
+        self.assertFalse(unpaid_payments().exists())
+    
+    def test_unbookable_hold_refunded_once(self):
+        """A payment for a purged hold is refunded, and retries don't refund twice."""
+        from .services import HoldPaymentService
+        from . import stripe_gateway
+        
+        with stripe_gateway.fake_stripe() as fake:
+            intent = fake.add('payment_intents', amount=1000, status='succeeded')
+            hold = self.create_hold(0, intent['id'])
+            hold.delete()
+            
+            self.assertIsNone(HoldPaymentService.convert_paid_hold(hold.hold_id, intent['id']))
+            self.assertIsNone(HoldPaymentService.convert_paid_hold(hold.hold_id, intent['id']))
+        
+        refunds = [obj for obj in fake.objects.values() if obj['object'] == 'refund']
+        self.assertEqual(len(refunds), 1)
+        self.assertEqual(refunds[0]['payment_intent'], intent['id'])
@@ -107,6 +107,7 @@ urlpatterns = [
     path('v2/host-payouts/', api_views.get_host_payouts, name='host-payouts'),
     path('v2/earnings-summary/', api_views.get_earnings_summary, name='earnings-summary'),
     path('v2/request-instant-payout/', api_views.request_instant_payout, name='request-instant-payout'),
+    path('v2/stripe-metrics/', api_views.get_stripe_metrics, name='stripe-metrics'),
     
     # Mobile payment endpoints
     path('mobile/validate/', api_views.validate_mobile_payment, name='mobile-payment-validate'),
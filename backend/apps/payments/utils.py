@@ -6,6 +6,7 @@ import logging
 from decimal import Decimal
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from . import stripe_gateway
 from .models import PaymentMethod, PaymentIntent
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -27,7 +28,8 @@ def create_stripe_customer(user):
         return user.stripe_customer_id
     
     try:
-        customer = stripe.Customer.create(
+        customer = stripe_gateway.call(
+            'customer.create', stripe.Customer.create,
             email=user.email,
             name=user.get_full_name(),
             phone=user.phone_number if user.phone_number else None,
@@ -126,7 +128,9 @@ def sync_payment_method_from_stripe(user, stripe_payment_method_id):
     """
     try:
         # Retrieve from Stripe
-        stripe_pm = stripe.PaymentMethod.retrieve(stripe_payment_method_id)
+        stripe_pm = stripe_gateway.call(
+            'payment_method.retrieve', stripe.PaymentMethod.retrieve, stripe_payment_method_id
+        )
         
         # Get or create local payment method
         payment_method, created = PaymentMethod.objects.get_or_create(
@@ -16,6 +16,8 @@ from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 
 from apps.bookings.models import Booking
+from apps.bookings.holds import active_holds
+from . import stripe_gateway
 from .models import (
     PaymentMethod,
     PaymentIntent,
@@ -37,6 +39,9 @@ from .serializers import (
     PaymentStatsSerializer,
     ConfirmPaymentSerializer
 )
+from .ledger import get_host_earnings
+from .services import HoldPaymentService
+from .webhook_events import record_event
 from .filters import (
     PaymentMethodFilter,
     PaymentIntentFilter,
@@ -83,12 +88,15 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         
         try:
             # Retrieve payment method from Stripe
-            stripe_pm = stripe.PaymentMethod.retrieve(stripe_pm_id)
+            stripe_pm = stripe_gateway.call(
+                'payment_method.retrieve', stripe.PaymentMethod.retrieve, stripe_pm_id
+            )
             
             # Attach to customer if not already attached
             if not request.user.stripe_customer_id:
                 # Create Stripe customer
-                stripe_customer = stripe.Customer.create(
+                stripe_customer = stripe_gateway.call(
+                    'customer.create', stripe.Customer.create,
                     email=request.user.email,
                     name=request.user.get_full_name(),
                     metadata={'user_id': request.user.id}
@@ -97,7 +105,8 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
                 request.user.save()
             
             # Attach payment method to customer
-            stripe.PaymentMethod.attach(
+            stripe_gateway.call(
+                'payment_method.attach', stripe.PaymentMethod.attach,
                 stripe_pm_id,
                 customer=request.user.stripe_customer_id
             )
@@ -156,7 +165,9 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         """
         try:
             # Detach from Stripe customer
-            stripe.PaymentMethod.detach(instance.stripe_payment_method_id)
+            stripe_gateway.call(
+                'payment_method.detach', stripe.PaymentMethod.detach, instance.stripe_payment_method_id
+            )
             
             # Mark as inactive instead of deleting
             instance.is_active = False
@@ -193,6 +204,9 @@ class PaymentIntentViewSet(viewsets.ReadOnlyModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
+        if serializer.validated_data.get('hold_id'):
+            return self._create_intent_for_hold(request, serializer.validated_data)
+        
         booking_id = serializer.validated_data['booking_id']
         payment_method_id = serializer.validated_data.get('payment_method_id')
         save_payment_method = serializer.validated_data['save_payment_method']
@@ -218,14 +232,7 @@ class PaymentIntentViewSet(viewsets.ReadOnlyModelViewSet):
             platform_fee = booking.platform_fee
             
             # Create Stripe customer if needed
-            if not request.user.stripe_customer_id:
-                stripe_customer = stripe.Customer.create(
-                    email=request.user.email,
-                    name=request.user.get_full_name(),
-                    metadata={'user_id': request.user.id}
-                )
-                request.user.stripe_customer_id = stripe_customer.id
-                request.user.save()
+            self._ensure_stripe_customer(request.user)
             
             # Get payment method if specified
             payment_method = None
@@ -261,7 +268,9 @@ class PaymentIntentViewSet(viewsets.ReadOnlyModelViewSet):
                 if not save_payment_method:
                     stripe_intent_data['confirmation_method'] = 'manual'
             
-            stripe_intent = stripe.PaymentIntent.create(**stripe_intent_data)
+            stripe_intent = stripe_gateway.call(
+                'payment_intent.create', stripe.PaymentIntent.create, **stripe_intent_data
+            )
             
             # Create payment intent record
             payment_intent = PaymentIntent.objects.create(
@@ -298,6 +307,94 @@ class PaymentIntentViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def _ensure_stripe_customer(self, user):
+        """Create the user's Stripe customer if they don't have one yet."""
+        if not user.stripe_customer_id:
+            stripe_customer = stripe_gateway.call(
+                'customer.create', stripe.Customer.create,
+                email=user.email,
+                name=user.get_full_name(),
+                metadata={'user_id': user.id}
+            )
+            user.stripe_customer_id = stripe_customer.id
+            user.save()
+    
+    def _create_intent_for_hold(self, request, validated_data):
+        """
+        Create a Stripe payment intent for a booking hold.
+        
+        No Booking or PaymentIntent row exists yet: the hold is converted
+        into a booking (and the PaymentIntent recorded) when Stripe reports
+        the payment succeeded.
+        """
+        hold = active_holds().filter(
+            hold_id=validated_data['hold_id'], user=request.user
+        ).select_related('parking_space').first()
+        if hold is None:
+            return Response(
+                {'error': 'Hold not found or expired'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            if hold.stripe_payment_intent_id:
+                stripe_intent = stripe_gateway.call(
+                    'payment_intent.retrieve', stripe.PaymentIntent.retrieve, hold.stripe_payment_intent_id
+                )
+            else:
+                self._ensure_stripe_customer(request.user)
+                
+                total_amount = Decimal(str(hold.total_amount))
+                platform_fee = (total_amount * Decimal('0.05')).quantize(Decimal('0.01'))
+                stripe_intent_data = {
+                    'amount': int(total_amount * 100),  # Convert to cents
+                    'currency': 'usd',
+                    'customer': request.user.stripe_customer_id,
+                    'description': f'Parking at {hold.parking_space.title}',
+                    'receipt_email': request.user.email,
+                    'metadata': {
+                        'hold_id': str(hold.hold_id),
+                        'user_id': request.user.id,
+                        'platform_fee': str(platform_fee),
+                    },
+                    'automatic_payment_methods': {
+                        'enabled': True,
+                    },
+                }
+                payment_method_id = validated_data.get('payment_method_id')
+                if payment_method_id:
+                    payment_method = get_object_or_404(
+                        PaymentMethod,
+                        id=payment_method_id,
+                        user=request.user,
+                        is_active=True
+                    )
+                    stripe_intent_data['payment_method'] = payment_method.stripe_payment_method_id
+                
+                stripe_intent = stripe_gateway.call(
+                    'payment_intent.create', stripe.PaymentIntent.create,
+                    idempotency_key=f'hold-{hold.hold_id}',
+                    **stripe_intent_data
+                )
+                hold.stripe_payment_intent_id = stripe_intent.id
+                hold.save(update_fields=['stripe_payment_intent_id'])
+            
+            return Response({
+                'hold_id': str(hold.hold_id),
+                'stripe_payment_intent_id': stripe_intent.id,
+                'client_secret': stripe_intent.client_secret,
+                'amount': hold.total_amount,
+                'status': stripe_intent.status,
+                'expires_at': hold.expires_at,
+            }, status=status.HTTP_201_CREATED)
+            
+        except stripe.error.StripeError as e:
+            logger.error(f"Stripe error creating payment intent for hold {hold.hold_id}: {e}")
+            return Response(
+                {'error': 'Failed to create payment intent'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         """
@@ -310,7 +407,8 @@ class PaymentIntentViewSet(viewsets.ReadOnlyModelViewSet):
         
         try:
             # Confirm with Stripe
-            stripe_intent = stripe.PaymentIntent.confirm(
+            stripe_intent = stripe_gateway.call(
+                'payment_intent.confirm', stripe.PaymentIntent.confirm,
                 payment_intent.stripe_payment_intent_id
             )
             
@@ -345,7 +443,8 @@ class PaymentIntentViewSet(viewsets.ReadOnlyModelViewSet):
         
         try:
             # Cancel with Stripe
-            stripe_intent = stripe.PaymentIntent.cancel(
+            stripe_intent = stripe_gateway.call(
+                'payment_intent.cancel', stripe.PaymentIntent.cancel,
                 payment_intent.stripe_payment_intent_id
             )
             
@@ -488,7 +587,8 @@ class RefundViewSet(viewsets.ModelViewSet):
             
             with transaction.atomic():
                 # Create Stripe refund
-                stripe_refund = stripe.Refund.create(
+                stripe_refund = stripe_gateway.call(
+                    'refund.create', stripe.Refund.create,
                     charge=payment.stripe_charge_id,
                     amount=int(amount * 100),  # Convert to cents
                     reason=reason if reason in ['duplicate', 'fraudulent', 'requested_by_customer'] else 'requested_by_customer',
@@ -571,31 +671,8 @@ class PayoutViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Get all successful payments for host's listings
-        from apps.bookings.models import Booking
-        
-        host_payments = Payment.objects.filter(
-            booking__parking_space__host=request.user,
-            status='succeeded'
-        )
-        
-        earnings = {
-            'total_earnings': host_payments.aggregate(
-                total=Sum('host_payout_amount')
-            )['total'] or Decimal('0.00'),
-            'total_bookings': host_payments.count(),
-            'pending_payout': host_payments.filter(
-                payouts__isnull=True
-            ).aggregate(
-                total=Sum('host_payout_amount')
-            )['total'] or Decimal('0.00'),
-            'paid_out': Payout.objects.filter(
-                host=request.user,
-                status='paid'
-            ).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00'),
-        }
+        # Kept current by payments.ledger
+        earnings = get_host_earnings(request.user)
         
         return Response(earnings)
 
@@ -624,48 +701,15 @@ class StripeWebhookView(APIView):
             logger.error("Invalid signature in Stripe webhook")
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
-        # Store webhook event
-        webhook_event, created = WebhookEvent.objects.get_or_create(
-            stripe_event_id=event['id'],
-            defaults={
-                'event_type': event['type'],
-                'api_version': event['api_version'],
-                'data': event['data'],
-                'status': WebhookEvent.EventStatus.RECEIVED,
-            }
-        )
-        
-        if not created and webhook_event.is_processed:
-            return Response({'status': 'already processed'})
-        
-        # Process event
-        try:
-            webhook_event.status = WebhookEvent.EventStatus.PROCESSING
-            webhook_event.save()
-            
-            self._process_webhook_event(event)
-            
-            webhook_event.status = WebhookEvent.EventStatus.PROCESSED
-            webhook_event.processed_at = timezone.now()
-            webhook_event.save()
-            
-        except Exception as e:
-            logger.error(f"Error processing webhook event {event['id']}: {e}")
-            webhook_event.status = WebhookEvent.EventStatus.FAILED
-            webhook_event.error_message = str(e)
-            webhook_event.retry_count += 1
-            webhook_event.save()
-            
-            return Response(
-                {'error': 'Failed to process event'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        # Store the event and acknowledge; handlers run in the background
+        record_event(event.to_dict_recursive(), WebhookEvent.Source.LEGACY)
         
         return Response({'status': 'success'})
     
-    def _process_webhook_event(self, event):
+    def handle_event(self, event):
         """
-        Process specific webhook event types.
+        Process a stored webhook event (see payments.webhook_events).
+        Returns False for event types without a handler.
         """
         event_type = event['type']
         data = event['data']['object']
@@ -686,6 +730,8 @@ class StripeWebhookView(APIView):
             self._handle_payout_failed(data)
         else:
             logger.info(f"Unhandled webhook event type: {event_type}")
+            return False
+        return True
     
     def _handle_payment_intent_succeeded(self, data):
         """Handle successful payment intent."""
@@ -704,7 +750,33 @@ class StripeWebhookView(APIView):
             booking.save()
             
         except PaymentIntent.DoesNotExist:
-            logger.warning(f"PaymentIntent not found for {data['id']}")
+            hold_id = data.get('metadata', {}).get('hold_id')
+            if hold_id:
+                self._convert_paid_hold(hold_id, data)
+            else:
+                logger.warning(f"PaymentIntent not found for {data['id']}")
+    
+    def _convert_paid_hold(self, hold_id, data):
+        """Turn a paid booking hold into a booking and record its payment intent."""
+        booking = HoldPaymentService.convert_paid_hold(hold_id, data['id'])
+        if booking is None:
+            # The slot was lost before payment completed; the charge was refunded
+            return
+        
+        PaymentIntent.objects.get_or_create(
+            stripe_payment_intent_id=data['id'],
+            defaults={
+                'booking': booking,
+                'user': booking.user,
+                'amount': Decimal(str(data['amount'])) / 100,
+                'platform_fee': Decimal(data.get('metadata', {}).get('platform_fee', '0')),
+                'currency': data.get('currency', 'usd'),
+                'status': 'succeeded',
+                'client_secret': data.get('client_secret') or '',
+                'description': data.get('description') or '',
+                'confirmed_at': timezone.now(),
+            }
+        )
     
     def _handle_payment_intent_failed(self, data):
         """Handle failed payment intent."""
@@ -0,0 +1,200 @@
+"""
+Background processing of Stripe webhook events.
+
+The webhook views used to run every handler (booking updates, payouts,
+Stripe transfers, notifications) before answering Stripe, so slow
+handlers at peak times made Stripe time out and resend events that were
+then processed twice. Now a view only verifies the signature and calls
+``record_event``, which stores the event as a WebhookEvent keyed by its
+Stripe event ID (a resent event is ignored), and answers 200 at once.
+
+``process_pending_events`` (the ``process_webhook_events`` task, started
+after each new event and every minute from beat) then works through the
+stored events:
+
+- events are claimed in batches with ``SELECT ... FOR UPDATE SKIP
+  LOCKED``, so any number of workers can run it side by side;
+- events about the same Stripe object (a payment intent and its charges,
+  a payout, ...) are processed in the order Stripe created them: an event
+  is not claimed while an earlier one for its object is unfinished;
+- each event runs in its own transaction. A failure is retried with
+  exponential backoff, and after MAX_ATTEMPTS the event is marked dead
+  and no longer holds back later events of its object. Errors that fail
+  the same way on every attempt (PERMANENT_ERRORS: bad field lookups,
+  bad data) mark the event dead at once. Dead events can be requeued
+  from the admin;
+- claims older than CLAIM_TIMEOUT are picked up again, so a worker dying
+  mid-batch delays its events rather than losing them.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.exceptions import FieldError
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+PROCESS_BATCH_SIZE = 50
+CLAIM_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 8
+RETRY_BASE_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+# Errors that retrying cannot fix
+PERMANENT_ERRORS = (FieldError, ValueError, TypeError, KeyError, AttributeError)
+
+EventStatus = WebhookEvent.EventStatus
+
+# Events that still have to run, and so hold back later events of their object
+UNFINISHED_STATUSES = (EventStatus.RECEIVED, EventStatus.PROCESSING, EventStatus.FAILED)
+
+# source -> view whose ``handle_event`` processes the event
+EVENT_HANDLERS = {
+    WebhookEvent.Source.STRIPE: 'apps.payments.webhook_handlers.StripeWebhookView',
+    WebhookEvent.Source.LEGACY: 'apps.payments.views.StripeWebhookView',
+}
+
+
+def ordering_key(event):
+    """
+    The Stripe object whose events must be processed in order: the payment
+    intent for charges and intents, otherwise the event's own object.
+    """
+    data = event.get('data', {}).get('object', {})
+    return data.get('payment_intent') or data.get('id') or event['id']
+
+
+def record_event(event, source=WebhookEvent.Source.STRIPE):
+    """
+    Store a verified Stripe event (a dict) for processing. Returns
+    (webhook_event, created); an event already stored is left alone.
+    """
+    now = timezone.now()
+    created_at = event.get('created')
+    webhook_event, created = WebhookEvent.objects.get_or_create(
+        stripe_event_id=event['id'],
+        defaults={
+            'event_type': event['type'],
+            'api_version': event.get('api_version') or '',
+            'data': event['data'],
+            'object_id': ordering_key(event),
+            'stripe_created': (
+                datetime.fromtimestamp(created_at, tz=dt_timezone.utc) if created_at else now
+            ),
+            'source': source,
+            'status': EventStatus.RECEIVED,
+            'next_attempt_at': now,
+        }
+    )
+    if created:
+        transaction.on_commit(_start_worker)
+    return webhook_event, created
+
+
+def _start_worker():
+    from .tasks import process_webhook_events
+
+    try:
+        process_webhook_events.delay()
+    except Exception as e:
+        # The beat schedule picks the event up within a minute
+        logger.warning(f"Could not queue webhook processing: {str(e)}")
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt after ``attempts`` failed ones."""
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+
+
+def claim_events(now=None, batch_size=PROCESS_BATCH_SIZE):
+    """
+    Claim up to ``batch_size`` due events for this worker and return them
+    in processing order. At most one event per object is claimed.
+    """
+    now = now or timezone.now()
+    due = Q(status__in=[EventStatus.RECEIVED, EventStatus.FAILED], next_attempt_at__lte=now) | Q(
+        status=EventStatus.PROCESSING, claimed_at__lt=now - CLAIM_TIMEOUT
+    )
+    earlier_unfinished = WebhookEvent.objects.filter(
+        Q(stripe_created__lt=OuterRef('stripe_created'))
+        | Q(stripe_created=OuterRef('stripe_created'), pk__lt=OuterRef('pk')),
+        object_id=OuterRef('object_id'),
+        status__in=UNFINISHED_STATUSES,
+    )
+    with transaction.atomic():
+        events = WebhookEvent.objects.select_for_update(skip_locked=True).filter(due).exclude(
+            Exists(earlier_unfinished)
+        )
+        event_ids = list(events.order_by('stripe_created', 'pk').values_list('pk', flat=True)[:batch_size])
+        if not event_ids:
+            return []
+        WebhookEvent.objects.filter(pk__in=event_ids).update(
+            status=EventStatus.PROCESSING, claimed_at=now, retry_count=F('retry_count') + 1
+        )
+    return list(WebhookEvent.objects.filter(pk__in=event_ids).order_by('stripe_created', 'pk'))
+
+
+def process_event(webhook_event):
+    """
+    Run the handler for one claimed event and record the outcome
+    ('processed', 'ignored', 'retried' or 'dead').
+    """
+    handler = import_string(EVENT_HANDLERS[webhook_event.source])()
+    event = {
+        'id': webhook_event.stripe_event_id,
+        'type': webhook_event.event_type,
+        'api_version': webhook_event.api_version,
+        'data': webhook_event.data,
+    }
+    try:
+        with transaction.atomic():
+            handled = handler.handle_event(event)
+    except Exception as e:
+        logger.error(f"Error processing webhook event {webhook_event.stripe_event_id}: {str(e)}")
+        if isinstance(e, PERMANENT_ERRORS) or webhook_event.retry_count >= MAX_ATTEMPTS:
+            outcome, updates = 'dead', {'status': EventStatus.DEAD, 'next_attempt_at': None}
+        else:
+            outcome, updates = 'retried', {
+                'status': EventStatus.FAILED,
+                'next_attempt_at': timezone.now() + retry_delay(webhook_event.retry_count),
+            }
+        WebhookEvent.objects.filter(pk=webhook_event.pk).update(error_message=str(e), **updates)
+        return outcome
+
+    outcome = 'processed' if handled else 'ignored'
+    WebhookEvent.objects.filter(pk=webhook_event.pk).update(
+        status=EventStatus.PROCESSED if handled else EventStatus.IGNORED,
+        processed_at=timezone.now(),
+        next_attempt_at=None,
+        error_message='',
+    )
+    return outcome
+
+
+def process_pending_events(now=None, batch_size=PROCESS_BATCH_SIZE):
+    """
+    Process every due event, a batch at a time.
+
+    Returns a dict of counts per outcome.
+    """
+    now = now or timezone.now()
+    counts = {'processed': 0, 'ignored': 0, 'retried': 0, 'dead': 0}
+
+    while True:
+        events = claim_events(now, batch_size)
+        if not events:
+            return counts
+        for webhook_event in events:
+            counts[process_event(webhook_event)] += 1
+
+
+def requeue_events(queryset):
+    """Put failed or dead events back in line for an immediate attempt."""
+    return queryset.filter(status__in=[EventStatus.FAILED, EventStatus.DEAD]).update(
+        status=EventStatus.RECEIVED, retry_count=0, next_attempt_at=timezone.now()
+    )
@@ -4,22 +4,39 @@ Stripe Webhook Handlers for Payment Processing
 import json
 import logging
 import stripe
+from decimal import Decimal
 from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
 from django.views import View
-from .models import Payment, Payout, Refund
+from django.utils import timezone
+from .models import Payment, PaymentIntent, Payout, Refund, WebhookEvent
 from ..bookings.models import Booking
 from ..users.models import User
-from .services import PayoutService, NotificationService
+from .services import HoldPaymentService, PayoutService, NotificationService
+from .webhook_events import record_event
 
 logger = logging.getLogger(__name__)
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
+def run_side_effect(description, func, *args):
+    """
+    Run a secondary side effect of an event (records, payouts,
+    notifications) in a savepoint, logging a failure instead of failing
+    the event.
+    """
+    try:
+        with transaction.atomic():
+            func(*args)
+    except Exception as e:
+        logger.error(f"Error {description}: {str(e)}")
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class StripeWebhookView(View):
     """
@@ -42,86 +59,113 @@ class StripeWebhookView(View):
             logger.error("Invalid signature in Stripe webhook")
             return HttpResponseBadRequest("Invalid signature")
         
-        # Handle the event
-        try:
-            if event['type'] == 'payment_intent.succeeded':
-                self.handle_payment_succeeded(event['data']['object'])
-            
-            elif event['type'] == 'payment_intent.payment_failed':
-                self.handle_payment_failed(event['data']['object'])
-            
-            elif event['type'] == 'customer.subscription.created':
-                self.handle_subscription_created(event['data']['object'])
-            
-            elif event['type'] == 'customer.subscription.updated':
-                self.handle_subscription_updated(event['data']['object'])
-            
-            elif event['type'] == 'invoice.payment_succeeded':
-                self.handle_recurring_payment_succeeded(event['data']['object'])
-            
-            elif event['type'] == 'transfer.created':
-                self.handle_transfer_created(event['data']['object'])
-            
-            elif event['type'] == 'payout.paid':
-                self.handle_payout_paid(event['data']['object'])
-            
-            elif event['type'] == 'charge.dispute.created':
-                self.handle_dispute_created(event['data']['object'])
-            
-            else:
-                logger.info(f"Unhandled event type: {event['type']}")
-                
-        except Exception as e:
-            logger.error(f"Error handling Stripe webhook: {str(e)}")
-            return HttpResponseBadRequest(f"Webhook handling failed: {str(e)}")
+        # Store the event and acknowledge; handlers run in the background
+        record_event(event.to_dict_recursive(), WebhookEvent.Source.STRIPE)
         
         return HttpResponse(json.dumps({'received': True}), content_type='application/json')
     
+    def handle_event(self, event):
+        """
+        Run the handler for a stored event (see payments.webhook_events).
+        Returns False for event types without a handler.
+        """
+        handlers = {
+            'payment_intent.succeeded': self.handle_payment_succeeded,
+            'payment_intent.payment_failed': self.handle_payment_failed,
+            'customer.subscription.created': self.handle_subscription_created,
+            'customer.subscription.updated': self.handle_subscription_updated,
+            'invoice.payment_succeeded': self.handle_recurring_payment_succeeded,
+            'transfer.created': self.handle_transfer_created,
+            'payout.paid': self.handle_payout_paid,
+            'charge.dispute.created': self.handle_dispute_created,
+        }
+        handler = handlers.get(event['type'])
+        if handler is None:
+            logger.info(f"Unhandled event type: {event['type']}")
+            return False
+        
+        handler(event['data']['object'])
+        return True
+    
     def handle_payment_succeeded(self, payment_intent):
-        """Handle successful payment"""
+        """
+        Handle successful payment.
+        
+        Booking the slot (converting the hold or confirming the booking) is
+        the event's own step and is retried if it fails. The payment record
+        is written in a savepoint, and the host payout and notifications run
+        once the booking is committed, so none of them can undo it.
+        """
         try:
-            booking_id = payment_intent.get('metadata', {}).get('booking_id')
-            if not booking_id:
+            metadata = payment_intent.get('metadata', {})
+            booking_id = metadata.get('booking_id')
+            if metadata.get('hold_id'):
+                # Checkout paid for a hold: book the held slot now, or refund
+                booking = HoldPaymentService.convert_paid_hold(metadata['hold_id'], payment_intent['id'])
+                if booking is None:
+                    return
+                booking_id = booking.id
+            elif not booking_id:
                 logger.error("No booking_id found in payment_intent metadata")
                 return
+            else:
+                booking = Booking.objects.get(id=booking_id)
+                
+                # Update booking status
+                booking.status = 'confirmed'
+                booking.save()
             
-            booking = Booking.objects.get(id=booking_id)
-            
-            # Update payment record
-            payment, created = Payment.objects.get_or_create(
-                stripe_payment_intent_id=payment_intent['id'],
-                defaults={
-                    'booking': booking,
-                    'amount': payment_intent['amount_received'] / 100,  # Convert from cents
-                    'currency': payment_intent['currency'],
-                    'status': 'completed',
-                    'stripe_payment_method_id': payment_intent.get('payment_method')
-                }
-            )
-            
-            if not created:
-                payment.status = 'completed'
-                payment.amount = payment_intent['amount_received'] / 100
-                payment.save()
-            
-            # Update booking status
-            booking.status = 'confirmed'
-            booking.paid_at = payment.created_at
-            booking.save()
-            
-            # Trigger host payout
-            PayoutService.initiate_host_payout(booking)
-            
-            # Send notifications
-            NotificationService.notify_booking_confirmed(booking)
-            NotificationService.notify_host_new_booking(booking)
+            run_side_effect('recording payment', self._record_payment, booking, payment_intent)
+            transaction.on_commit(lambda: self._after_booking_paid(booking))
             
             logger.info(f"Payment succeeded for booking {booking_id}")
             
         except Booking.DoesNotExist:
             logger.error(f"Booking not found for payment_intent {payment_intent['id']}")
-        except Exception as e:
-            logger.error(f"Error handling payment success: {str(e)}")
+    
+    def _record_payment(self, booking, payment_intent):
+        """Create or update the payment intent and payment rows of a paid booking"""
+        amount = Decimal(payment_intent['amount_received']) / 100  # Convert from cents
+        intent, _ = PaymentIntent.objects.get_or_create(
+            stripe_payment_intent_id=payment_intent['id'],
+            defaults={
+                'booking': booking,
+                'user': booking.user,
+                'amount': amount,
+                'platform_fee': Decimal(payment_intent.get('metadata', {}).get('platform_fee', '0')),
+                'currency': payment_intent['currency'],
+                'status': PaymentIntent.PaymentStatus.SUCCEEDED,
+                'client_secret': payment_intent.get('client_secret') or '',
+                'description': payment_intent.get('description') or '',
+                'confirmed_at': timezone.now(),
+            }
+        )
+        
+        payment, created = Payment.objects.get_or_create(
+            payment_intent=intent,
+            defaults={
+                'user': booking.user,
+                'booking': booking,
+                'stripe_charge_id': payment_intent.get('latest_charge') or payment_intent['id'],
+                'amount': amount,
+                'platform_fee': intent.platform_fee,
+                'currency': payment_intent['currency'],
+                'status': Payment.PaymentStatus.SUCCEEDED,
+                'payment_method_type': (payment_intent.get('payment_method_types') or ['card'])[0],
+                'processed_at': timezone.now(),
+            }
+        )
+        
+        if not created:
+            payment.status = Payment.PaymentStatus.SUCCEEDED
+            payment.amount = amount
+            payment.save()
+    
+    def _after_booking_paid(self, booking):
+        """Host payout and notifications for a paid booking"""
+        run_side_effect(f"initiating host payout for booking {booking.id}", PayoutService.initiate_host_payout, booking)
+        run_side_effect("sending booking confirmation", NotificationService.notify_booking_confirmed, booking)
+        run_side_effect("notifying host of new booking", NotificationService.notify_host_new_booking, booking)
     
     def handle_payment_failed(self, payment_intent):
         """Handle failed payment"""
@@ -131,22 +175,15 @@ class StripeWebhookView(View):
                 return
             
             booking = Booking.objects.get(id=booking_id)
+            failure_reason = (payment_intent.get('last_payment_error') or {}).get('message', 'Unknown error')
             
-            # Update payment record
-            payment, created = Payment.objects.get_or_create(
-                stripe_payment_intent_id=payment_intent['id'],
-                defaults={
-                    'booking': booking,
-                    'amount': payment_intent['amount'] / 100,
-                    'currency': payment_intent['currency'],
-                    'status': 'failed',
-                    'failure_reason': payment_intent.get('last_payment_error', {}).get('message', 'Unknown error')
-                }
+            # Update payment records (a failed charge has no payment to create)
+            PaymentIntent.objects.filter(stripe_payment_intent_id=payment_intent['id']).update(
+                status=payment_intent.get('status') or PaymentIntent.PaymentStatus.REQUIRES_PAYMENT_METHOD
             )
-            
-            if not created:
-                payment.status = 'failed'
-                payment.failure_reason = payment_intent.get('last_payment_error', {}).get('message', 'Unknown error')
+            for payment in Payment.objects.filter(payment_intent__stripe_payment_intent_id=payment_intent['id']):
+                payment.status = Payment.PaymentStatus.FAILED
+                payment.failure_message = failure_reason
                 payment.save()
             
             # Update booking status
@@ -154,14 +191,14 @@ class StripeWebhookView(View):
             booking.save()
             
             # Send failure notification
-            NotificationService.notify_payment_failed(booking, payment.failure_reason)
+            transaction.on_commit(lambda: run_side_effect(
+                "sending payment failure notification", NotificationService.notify_payment_failed, booking, failure_reason
+            ))
             
             logger.info(f"Payment failed for booking {booking_id}")
             
         except Booking.DoesNotExist:
             logger.error(f"Booking not found for failed payment_intent {payment_intent['id']}")
-        except Exception as e:
-            logger.error(f"Error handling payment failure: {str(e)}")
     
     def handle_subscription_created(self, subscription):
         """Handle new recurring booking subscription"""
@@ -177,14 +214,12 @@ class StripeWebhookView(View):
             booking.save()
             
             # Send subscription confirmation
-            NotificationService.notify_subscription_created(booking)
+            run_side_effect("sending subscription confirmation", NotificationService.notify_subscription_created, booking)
             
             logger.info(f"Subscription created for booking {booking_id}")
             
         except Booking.DoesNotExist:
             logger.error(f"Booking not found for subscription {subscription['id']}")
-        except Exception as e:
-            logger.error(f"Error handling subscription creation: {str(e)}")
     
     def handle_subscription_updated(self, subscription):
         """Handle subscription updates"""
@@ -194,19 +229,21 @@ class StripeWebhookView(View):
             if subscription['status'] == 'canceled':
                 booking.recurring_status = 'canceled'
                 booking.save()
-                NotificationService.notify_subscription_canceled(booking)
+                run_side_effect(
+                    "sending subscription cancellation", NotificationService.notify_subscription_canceled, booking
+                )
             
             elif subscription['status'] == 'past_due':
                 booking.recurring_status = 'past_due'
                 booking.save()
-                NotificationService.notify_subscription_past_due(booking)
+                run_side_effect(
+                    "sending subscription past due notice", NotificationService.notify_subscription_past_due, booking
+                )
             
             logger.info(f"Subscription updated: {subscription['id']}")
             
         except Booking.DoesNotExist:
             logger.error(f"Booking not found for subscription {subscription['id']}")
-        except Exception as e:
-            logger.error(f"Error handling subscription update: {str(e)}")
     
     def handle_recurring_payment_succeeded(self, invoice):
         """Handle successful recurring payment"""
@@ -235,18 +272,20 @@ class StripeWebhookView(View):
                 stripe_invoice_id=invoice['id']
             )
             
-            # Trigger host payout
-            PayoutService.initiate_host_payout(new_booking)
-            
-            # Send notifications
-            NotificationService.notify_recurring_booking_confirmed(new_booking)
+            # Trigger host payout and send notifications once the booking is committed
+            transaction.on_commit(lambda: self._after_recurring_booking_paid(new_booking))
             
             logger.info(f"Recurring payment succeeded for booking {booking.id}")
             
         except Booking.DoesNotExist:
             logger.error(f"Booking not found for subscription {subscription_id}")
-        except Exception as e:
-            logger.error(f"Error handling recurring payment: {str(e)}")
+    
+    def _after_recurring_booking_paid(self, booking):
+        """Host payout and notification for a recurring booking instance"""
+        run_side_effect(f"initiating host payout for booking {booking.id}", PayoutService.initiate_host_payout, booking)
+        run_side_effect(
+            "sending recurring booking confirmation", NotificationService.notify_recurring_booking_confirmed, booking
+        )
     
     def handle_transfer_created(self, transfer):
         """Handle host payout transfer"""
@@ -266,30 +305,24 @@ class StripeWebhookView(View):
             
         except Payout.DoesNotExist:
             logger.error(f"Payout not found for transfer {transfer['id']}")
-        except Exception as e:
-            logger.error(f"Error handling transfer creation: {str(e)}")
     
     def handle_payout_paid(self, payout_data):
         """Handle successful payout to host"""
-        try:
-            # Find payout by arrival_date or other identifier
-            payouts = Payout.objects.filter(
-                status='processing',
-                scheduled_date=payout_data['arrival_date']
-            )
-            
-            for payout in payouts:
-                payout.status = 'completed'
-                payout.completed_at = payout_data['arrival_date']
-                payout.save()
-                
-                # Notify host
-                NotificationService.notify_payout_completed(payout)
-            
-            logger.info(f"Payout completed: {payout_data['id']}")
+        # Find payout by arrival_date or other identifier
+        payouts = Payout.objects.filter(
+            status='processing',
+            scheduled_date=payout_data['arrival_date']
+        )
+        
+        for payout in payouts:
+            payout.status = 'completed'
+            payout.completed_at = payout_data['arrival_date']
+            payout.save()
             
-        except Exception as e:
-            logger.error(f"Error handling payout completion: {str(e)}")
+            # Notify host
+            run_side_effect("sending payout notification", NotificationService.notify_payout_completed, payout)
+        
+        logger.info(f"Payout completed: {payout_data['id']}")
     
     def handle_dispute_created(self, charge):
         """Handle payment dispute/chargeback"""
@@ -300,14 +333,12 @@ class StripeWebhookView(View):
             payment.save()
             
             # Notify admin and host
-            NotificationService.notify_dispute_created(payment)
+            run_side_effect("sending dispute notification", NotificationService.notify_dispute_created, payment)
             
             logger.info(f"Dispute created for payment {payment.id}")
             
         except Payment.DoesNotExist:
             logger.error(f"Payment not found for disputed charge {charge['id']}")
-        except Exception as e:
-            logger.error(f"Error handling dispute: {str(e)}")
 
 
 # URL configuration for webhook
@@ -8,6 +8,7 @@ from django.contrib.contenttypes.models import ContentType
 
 from .models import Review, ReviewVote, ReviewFlag, ReviewType, ReviewStatus
 from apps.listings.models import ParkingListing
+from apps.listings.response_cache import bump_listing_version
 from apps.users.models import User
 
 
@@ -145,6 +146,8 @@ def update_listing_ratings(listing):
     }
     
     ParkingListing.objects.filter(id=listing.id).update(**update_data)
+    # update() skips post_save, so expire cached listing responses here
+    bump_listing_version(listing.id)
 
 
 def update_user_host_ratings(user):
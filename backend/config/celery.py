@@ -19,13 +19,17 @@ app.autodiscover_tasks()
 
 # Celery Beat configuration for periodic tasks
 app.conf.beat_schedule = {
-    'process-checkin-reminders-every-minute': {
-        'task': 'apps.bookings.tasks.process_checkin_reminders',
-        'schedule': 60.0,  # Run every 60 seconds to catch bookings starting soon
+    'dispatch-scheduled-jobs-every-minute': {
+        'task': 'apps.bookings.tasks.dispatch_scheduled_jobs',
+        'schedule': 60.0,  # Sends due check-in reminders and expiration warnings
     },
-    'process-expiration-warnings-every-5-minutes': {
-        'task': 'apps.bookings.tasks.process_expiration_warnings',
-        'schedule': 300.0,  # Run every 5 minutes to catch bookings expiring soon
+    'expire-booking-holds-every-minute': {
+        'task': 'apps.bookings.tasks.expire_booking_holds',
+        'schedule': 60.0,  # Expired holds no longer block; this just purges them
+    },
+    'process-webhook-events-every-minute': {
+        'task': 'apps.payments.tasks.process_webhook_events',
+        'schedule': 60.0,  # Backstop for events whose processing task was not queued, and retries
     },
 }
 app.conf.timezone = settings.TIME_ZONE
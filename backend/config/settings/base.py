@@ -259,6 +259,9 @@ STRIPE_PUBLIC_KEY = env('STRIPE_PUBLISHABLE_KEY', default='pk_test_your_stripe_p
 STRIPE_SECRET_KEY = env('STRIPE_SECRET_KEY', default='sk_test_your_stripe_secret_key_here')
 STRIPE_WEBHOOK_SECRET = env('STRIPE_WEBHOOK_SECRET', default='')
 
+# Booking holds: how long a checkout reserves its slot while the guest pays
+BOOKING_HOLD_TTL_MINUTES = env.int('BOOKING_HOLD_TTL_MINUTES', default=10)
+
 # API Documentation
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Parking in a Pinch API',
@@ -268,10 +271,12 @@ SPECTACULAR_SETTINGS = {
 }
 
 # Cache Configuration
+# Set CACHE_URL (e.g. rediscache://localhost:6379/1) to enable shared caching,
+# including the anonymous listing response cache. Per-process caches such as
+# locmemcache:// are not suitable with several workers: invalidations would
+# only reach the worker that handled the write.
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
+    'default': env.cache('CACHE_URL', default='dummycache://'),
 }
 
 # Session Configuration